@@ -0,0 +1,117 @@
+"""
+Время запуска: импорт модулей парсера в новом процессе.
+
+Каждый модуль импортируется в отдельном процессе (python -X importtime) несколько
+раз, выводится медиана времени импорта и самые тяжелые зависимости. Процессы
+запускаются в пустом каталоге: импорт не должен читать или создавать файлы
+конфигурации. Дополнительно проверяется, что при импорте parse не загружаются
+зависимости, нужные только отдельным режимам (Telethon, pyarrow, numpy, bs4).
+
+    python bench/bench_import.py
+    python bench/bench_import.py --max-ms 500   # код возврата 1, если parse импортируется дольше
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Tuple
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# parse - запуск CLI, html_extract - процессы пула разбора, остальные - отдельные утилиты
+MODULES = ('parse', 'html_extract', 'channel_index', 'postprocess', 'telethon_config')
+
+# Зависимости, которые загружаются только при использовании соответствующего режима
+LAZY_DEPENDENCIES = ('telethon', 'pyarrow', 'numpy', 'bs4', 'aiohttp.web')
+
+
+def run_python(code: str, directory: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    """Запуск кода в новом процессе интерпретатора с репозиторием в sys.path"""
+    env = dict(os.environ, PYTHONPATH=REPO_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+    return subprocess.run(command, cwd=directory, env=env, capture_output=True, text=True, check=True)
+
+
+def parse_importtime(stderr: str) -> List[Tuple[int, int, str]]:
+    """Строки вывода -X importtime: (накопленное время в мкс, глубина вложенности, модуль)"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(cumulative), depth, name.strip()))
+    return rows
+
+
+def measure(module: str, repeat: int, directory: str) -> Tuple[float, List[Tuple[int, int, str]]]:
+    """Медиана времени импорта модуля в миллисекундах и строки importtime последнего запуска"""
+    timings = []
+    rows = []
+    for _ in range(repeat):
+        rows = parse_importtime(run_python(f"import {module}", directory, importtime=True).stderr)
+        timings.append(next(cumulative for cumulative, _, name in rows if name == module) / 1000)
+    return statistics.median(timings), rows
+
+
+def heaviest(rows: List[Tuple[int, int, str]], module: str, top: int) -> List[Tuple[float, str]]:
+    """Самые тяжелые прямые зависимости модуля"""
+    # Зависимости выводятся перед модулем, до предыдущей строки верхнего уровня
+    # (модули, загруженные при старте интерпретатора, сюда не попадают)
+    end = next(i for i, (_, depth, name) in enumerate(rows) if depth == 0 and name == module)
+    start = end
+    while start > 0 and rows[start - 1][1] > 0:
+        start -= 1
+    direct = [(cumulative / 1000, name) for cumulative, depth, name in rows[start:end] if depth == 1]
+    return sorted(direct, reverse=True)[:top]
+
+
+def loaded_lazy_dependencies(directory: str) -> List[str]:
+    """Какие из LAZY_DEPENDENCIES оказались загружены после import parse"""
+    code = (
+        "import json, sys, parse; "
+        f"print(json.dumps([name for name in {list(LAZY_DEPENDENCIES)!r} if name in sys.modules]))"
+    )
+    return json.loads(run_python(code, directory).stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время импорта модулей парсера")
+    parser.add_argument('modules', nargs='*', default=list(MODULES), help="модули для замера")
+    parser.add_argument('--repeat', type=int, default=5, help="запусков на модуль")
+    parser.add_argument('--top', type=int, default=5, help="сколько тяжелых зависимостей показывать")
+    parser.add_argument('--max-ms', type=float, help="допустимое время импорта parse в миллисекундах")
+    args = parser.parse_args()
+
+    failed = False
+    results: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for module in args.modules:
+            median, rows = measure(module, args.repeat, directory)
+            results[module] = median
+            print(f"{module}: {median:.1f} мс (медиана из {args.repeat})")
+            for duration, name in heaviest(rows, module, args.top):
+                print(f"    {name}: {duration:.1f} мс")
+
+        created = os.listdir(directory)
+        if created:
+            print(f"Импорт создал файлы в рабочем каталоге: {', '.join(sorted(created))}")
+            failed = True
+
+        loaded = loaded_lazy_dependencies(directory)
+        if loaded:
+            print(f"При импорте parse загружены необязательные при запуске зависимости: {', '.join(loaded)}")
+            failed = True
+
+    if args.max_ms is not None and results.get('parse', 0) > args.max_ms:
+        print(f"Импорт parse дольше допустимого: {results['parse']:.1f} мс > {args.max_ms:.0f} мс")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
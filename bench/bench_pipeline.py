@@ -0,0 +1,259 @@
+"""
+Пропускная способность парсера без сети: по этапам и для всего конвейера main().
+
+Запросы к tgstat обслуживает локальная замена (fake_tgstat.py), проверку
+комментариев - замена TelegramClient (fake_telethon.py). Сценарии:
+
+    parse  - разбор HTML страниц выдачи в текущем процессе
+    fetch  - загрузка страниц через TgstatClient (с повторами при 429)
+    check  - проверка комментариев через check_channels_comments
+    e2e    - весь конвейер main(): поиск, разбор в пуле процессов, проверка, запись
+    all    - все сценарии, каждый в отдельном процессе
+
+Для каждого сценария выводятся страницы/с, каналы/с, задержка p50/p99 и пик
+RSS процесса. Запуск из корня репозитория:
+
+    python bench/bench_pipeline.py all
+    python bench/bench_pipeline.py e2e --pages 50 --latency 0.1 --error-rate 0.05 --flood-rate 0.01
+    python bench/bench_pipeline.py parse --backend bs4 --recorded cache/responses.sqlite
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+try:
+    import resource
+except ImportError:  # resource есть только в Unix
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import parse  # noqa: E402
+import telethon_config  # noqa: E402
+import tgstat_client  # noqa: E402
+from channel_record import ChannelRecord  # noqa: E402
+from fake_telethon import make_client  # noqa: E402
+from fake_tgstat import FakeTgstatServer  # noqa: E402
+from html_extract import parse_search_payload  # noqa: E402
+from metrics import METRICS  # noqa: E402
+
+SCENARIOS = ('parse', 'fetch', 'check', 'e2e')
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Пик RSS текущего процесса в мегабайтах (None, если недоступно)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux возвращает килобайты, macOS - байты
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль q (0..100) по точным значениям"""
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method='inclusive')[min(98, max(0, int(q) - 1))]
+
+
+def report(name: str, elapsed: float, pages: int, channels: int, p50: float, p99: float, extra: List[str] = ()):
+    """Вывод результатов сценария"""
+    rss = peak_rss_mb()
+    print(f"Сценарий {name}: {elapsed:.2f} с")
+    if pages:
+        print(f"  страниц/с: {pages / elapsed:.1f} (всего {pages})")
+    print(f"  каналов/с: {channels / elapsed:.1f} (всего {channels})")
+    print(f"  задержка p50: {p50 * 1000:.1f} мс, p99: {p99 * 1000:.1f} мс")
+    print(f"  пик RSS: {rss:.0f} МБ" if rss is not None else "  пик RSS: недоступно")
+    for line in extra:
+        print(f"  {line}")
+
+
+def stage_latency(stage: str):
+    """p50 и p99 этапа по гистограмме метрик (оценка по корзинам)"""
+    histogram = METRICS.histogram('tgstat_stage_seconds', stage=stage)
+    if histogram is None:
+        return 0.0, 0.0
+    return histogram.quantile(0.5), histogram.quantile(0.99)
+
+
+def patch_telethon(args, directory: str):
+    """Подстановка замены TelegramClient и настроек проверки без задержек"""
+    parse.TelegramClient = make_client(args.tg_latency, args.flood_rate, args.flood_seconds, args.seed)
+    telethon_config.use_settings({
+        'sessions': [
+            {'session_name': f"bench_{i}", 'api_id': 1, 'api_hash': 'bench'} for i in range(args.sessions)
+        ],
+        'check_comments': True,
+        'request_delay': args.check_delay,
+        'min_request_delay': args.check_delay,
+        'comments_cache_path': os.path.join(directory, 'comments.sqlite'),
+        'entity_cache_path': os.path.join(directory, 'entities.sqlite'),
+    })
+
+
+def bench_parse(args):
+    server = FakeTgstatServer(total=args.pages * 30, recorded=args.recorded)
+    pages = [server.page(page * 30, 'bench') for page in range(args.pages)]
+
+    durations = []
+    channels = 0
+    started = time.perf_counter()
+    for data in pages:
+        page_started = time.perf_counter()
+        channels += len(parse_search_payload(data, args.backend)['channels'])
+        durations.append(time.perf_counter() - page_started)
+    elapsed = time.perf_counter() - started
+
+    report('parse', elapsed, len(pages), channels, percentile(durations, 50), percentile(durations, 99),
+           [f"бэкенд: {args.backend}"])
+
+
+def bench_fetch(args):
+    async def run(server: FakeTgstatServer):
+        semaphore = asyncio.Semaphore(args.concurrency)
+        durations = []
+
+        async with tgstat_client.TgstatClient(
+            pool_size=args.concurrency, url=server.url, retries=args.retries, backoff_base=0.01, backoff_max=0.1
+        ) as client:
+            template = parse.PayloadTemplate(q='bench')
+
+            async def fetch(page: int):
+                async with semaphore:
+                    page_started = time.perf_counter()
+                    try:
+                        await client.search(template.body(page + 1, page * 30))
+                    except Exception:
+                        return
+                    durations.append(time.perf_counter() - page_started)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(fetch(page) for page in range(args.pages)))
+            return time.perf_counter() - started, durations, client.retried
+
+    with FakeTgstatServer(total=args.pages * 30, latency=args.latency, error_rate=args.error_rate,
+                          recorded=args.recorded, seed=args.seed) as server:
+        elapsed, durations, retried = asyncio.run(run(server))
+
+    report('fetch', elapsed, len(durations), len(durations) * 30,
+           percentile(durations, 50), percentile(durations, 99),
+           [f"ответов 429: {server.errors}, повторов: {retried}, не загружено: {args.pages - len(durations)}"])
+
+
+def bench_check(args):
+    with tempfile.TemporaryDirectory() as directory:
+        patch_telethon(args, directory)
+        channels = [
+            ChannelRecord(f"Канал {i}", f"@bench_check_{i}", 1000 + i) for i in range(args.channels)
+        ]
+        started = time.perf_counter()
+        checked = asyncio.run(parse.check_channels_comments(channels, {}))
+        elapsed = time.perf_counter() - started
+
+    p50, p99 = stage_latency('get_full_channel')
+    report('check', elapsed, 0, len(channels), p50, p99, [
+        f"сессий: {args.sessions}, с комментариями: {sum(1 for channel in checked if channel.has_comments)}",
+        f"FloodWait: {METRICS.counter_total('tgstat_flood_waits_total'):.0f}",
+    ])
+
+
+def bench_e2e(args):
+    with tempfile.TemporaryDirectory() as directory, \
+            FakeTgstatServer(total=args.pages * 30, latency=args.latency, error_rate=args.error_rate,
+                             recorded=args.recorded, seed=args.seed) as server:
+        tgstat_client.SEARCH_URL = server.url
+        if args.no_check:
+            telethon_config.use_settings({'check_comments': False})
+        else:
+            patch_telethon(args, directory)
+
+        config = {
+            'query': [f"bench {i}" for i in range(args.queries)],
+            'start_offset': 0,
+            'offset_step': 30,
+            'max_pages': None,
+            'concurrency': args.concurrency,
+            'delay_seconds': 0,
+            'cache_enabled': False,
+            'html_parser': args.backend,
+            'parse_workers': args.workers,
+            'request_retries': args.retries,
+            'retry_backoff_base': 0.01,
+            'retry_backoff_max': 0.1,
+            'retry_pass_delay': 0,
+            'output_legacy_json': False,
+            'state_path': os.path.join(directory, 'crawl_state.sqlite'),
+        }
+        with open(os.path.join(directory, 'search_config.json'), 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False)
+
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+                parse.main([])
+            elapsed = time.perf_counter() - started
+            output_file = max(name for name in os.listdir('output') if name.endswith('.ndjson'))
+            with open(os.path.join('output', output_file), encoding='utf-8') as f:
+                channels = sum(1 for _ in f)
+        finally:
+            os.chdir(cwd)
+
+    p50, p99 = stage_latency('fetch')
+    report('e2e', elapsed, server.requests - server.errors, channels, p50, p99,
+           [f"запросов: {args.queries}, ответов 429: {server.errors}", "по этапам:"] +
+           [f"  {line}" for line in METRICS.summary_lines()])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк парсера на локальных заменах tgstat и Telegram")
+    parser.add_argument('scenario', choices=SCENARIOS + ('all',), nargs='?', default='all')
+    parser.add_argument('--pages', type=int, default=40, help="страниц выдачи на запрос")
+    parser.add_argument('--queries', type=int, default=3, help="поисковых запросов (e2e)")
+    parser.add_argument('--channels', type=int, default=500, help="каналов для проверки (check)")
+    parser.add_argument('--concurrency', type=int, default=5, help="одновременных запросов к tgstat")
+    parser.add_argument('--latency', type=float, default=0.05, help="задержка ответа tgstat в секундах")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument('--retries', type=int, default=3, help="повторов запроса к tgstat")
+    parser.add_argument('--recorded', help="база кэша ответов с записанными страницами tgstat")
+    parser.add_argument('--backend', default='auto', help="бэкенд разбора HTML")
+    parser.add_argument('--workers', type=int, default=None, help="процессов разбора (e2e)")
+    parser.add_argument('--sessions', type=int, default=1, help="сессий Telegram")
+    parser.add_argument('--tg-latency', type=float, default=0.01, help="задержка ответа Telegram в секундах")
+    parser.add_argument('--flood-rate', type=float, default=0.0, help="доля запросов GetFullChannel с FloodWait")
+    parser.add_argument('--flood-seconds', type=int, default=1, help="длительность FloodWait в секундах")
+    parser.add_argument('--check-delay', type=float, default=0.0, help="задержка между проверками в секундах")
+    parser.add_argument('--no-check', action='store_true', help="e2e без проверки комментариев")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verbose', action='store_true', help="показывать вывод парсера (e2e)")
+    args = parser.parse_args()
+
+    # Журнал парсера не нужен в выводе бенчмарка
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    if args.scenario == 'all':
+        # Каждый сценарий в отдельном процессе, чтобы пик RSS не накапливался
+        options = [arg for arg in sys.argv[1:] if arg != 'all']
+        for scenario in SCENARIOS:
+            subprocess.run([sys.executable, os.path.abspath(__file__), scenario] + options, check=True)
+        return
+
+    globals()[f"bench_{args.scenario}"](args)
+
+
+if __name__ == '__main__':
+    main()
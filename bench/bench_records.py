@@ -0,0 +1,61 @@
+"""
+Сравнение расхода памяти на канал: модель Channel и запись ChannelRecord.
+
+Запуск из корня репозитория:
+
+    python bench/bench_records.py [количество каналов]
+"""
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from channel_record import ChannelRecord  # noqa: E402
+from html_extract import CHANNEL_FIELDS  # noqa: E402
+from parse import Channel  # noqa: E402
+
+CATEGORIES = ["Новости и СМИ", "Спорт", "Криптовалюты", "Технологии", "Юмор и развлечения"]
+
+
+def make_values(i: int) -> tuple:
+    """Значения полей канала в порядке CHANNEL_FIELDS, как их возвращает разбор страницы"""
+    # Строки собираются заново для каждой записи, как при разборе HTML
+    return (
+        f"Канал номер {i}",
+        f"@channel_{i}",
+        1000 + i * 7,
+        f"{i % 100}.{i % 10}k",
+        f"{i % 50}.{i % 7}",
+        "".join(CATEGORIES[i % len(CATEGORIES)]),
+        f"https://static.tgstat.ru/channels/_0/{i:02x}/{i}.jpg",
+        i % 13 == 0,
+        (i % 100) * 1000 + (i % 10) * 100,
+        (i % 50) + (i % 7) / 10,
+    )
+
+
+def measure(factory, count: int) -> float:
+    """Средний прирост памяти в байтах на одну запись"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    items = [factory(make_values(i)) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del items
+    return (after - before) / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    channel_bytes = measure(lambda values: Channel(**dict(zip(CHANNEL_FIELDS, values))), count)
+    record_bytes = measure(lambda values: ChannelRecord(*values), count)
+
+    print(f"Каналов: {count}")
+    print(f"Channel:       {channel_bytes:8.0f} байт на запись")
+    print(f"ChannelRecord: {record_bytes:8.0f} байт на запись")
+    print(f"Экономия:      {channel_bytes - record_bytes:8.0f} байт ({1 - record_bytes / channel_bytes:.0%})")
+
+
+if __name__ == '__main__':
+    main()
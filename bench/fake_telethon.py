@@ -0,0 +1,88 @@
+"""
+Замена TelegramClient для бенчмарков проверки комментариев без сети.
+
+Клиент поддерживает только то, что использует проверка комментариев:
+start/disconnect, get_input_entity и вызов GetFullChannelRequest. Задержка
+ответа, частота FloodWait и его длительность настраиваются через make_client.
+
+Как и Telethon, клиент сам пережидает FloodWait не длиннее flood_sleep_threshold
+(по умолчанию 60 с) и повторяет запрос; FloodWaitError выбрасывается только
+для более длинных пауз.
+"""
+import asyncio
+import random
+import zlib
+from types import SimpleNamespace
+
+from telethon import errors
+from telethon.tl.types import InputPeerChannel
+
+
+class FakeTelegramClient:
+    """
+    Имитация TelegramClient с настраиваемыми задержкой и FloodWait.
+
+    Параметры задаются атрибутами класса (см. make_client). У канала открыты
+    комментарии, если его числовой id нечетный.
+    """
+
+    latency = 0.01
+    flood_rate = 0.0
+    flood_seconds = 1
+    seed = 0
+
+    def __init__(self, session, api_id=None, api_hash=None, flood_sleep_threshold=60, **kwargs):
+        self.session_name = session
+        self.flood_sleep_threshold = flood_sleep_threshold
+        self.requests = 0
+        self.flood_waits = 0
+        # Паузы FloodWait, пережитые внутри запроса без исключения
+        self.flood_sleeps = 0
+        self._random = random.Random(f"{self.seed}:{session}")
+
+    async def start(self):
+        return self
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def get_input_entity(self, peer: str):
+        await asyncio.sleep(self.latency)
+        username = peer.lstrip('@').lower()
+        return InputPeerChannel(zlib.crc32(username.encode('utf-8')) & 0x7fffffff, 1)
+
+    async def __call__(self, request):
+        while True:
+            self.requests += 1
+            await asyncio.sleep(self.latency)
+            if not self.flood_rate or self._random.random() >= self.flood_rate:
+                break
+            self.flood_waits += 1
+            if self.flood_seconds > self.flood_sleep_threshold:
+                raise errors.FloodWaitError(request=request, capture=self.flood_seconds)
+            # Короткий FloodWait Telethon пережидает сам и повторяет запрос
+            self.flood_sleeps += 1
+            await asyncio.sleep(self.flood_seconds)
+        channel_id = request.channel.channel_id
+        return SimpleNamespace(full_chat=SimpleNamespace(linked_chat_id=channel_id if channel_id % 2 else None))
+
+
+def make_client(latency: float = 0.01, flood_rate: float = 0.0, flood_seconds: int = 1, seed: int = 0) -> type:
+    """
+    Класс клиента с заданным поведением для подстановки вместо TelegramClient
+
+    Args:
+        latency: задержка каждого запроса в секундах
+        flood_rate: доля запросов GetFullChannel, завершающихся FloodWait
+        flood_seconds: пауза, которую запрашивает FloodWait
+        seed: зерно генератора FloodWait
+    """
+    return type('FakeTelegramClient', (FakeTelegramClient,), {
+        'latency': latency,
+        'flood_rate': flood_rate,
+        'flood_seconds': flood_seconds,
+        'seed': seed,
+    })
@@ -0,0 +1,224 @@
+"""
+Локальная замена tgstat для бенчмарков: отдает страницы поиска без сети.
+
+Страницы берутся из базы кэша ответов (cache/responses.sqlite, см. ResponseCache),
+если она указана, иначе генерируются в разметке выдачи tgstat. Задержка ответа
+и доля ответов 429 настраиваются.
+
+Отдельный запуск (для ручной проверки парсера):
+
+    python bench/fake_tgstat.py --port 8765 --latency 0.05 --error-rate 0.1
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+import urllib.parse
+import zlib
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from html_extract import (  # noqa: E402
+    AVATAR_CLASS_MARK, CARD_CLASS, CATEGORY_CLASS, METRIC_CLASS, NAME_CLASS, NO_RESULTS_MARK, VERIFIED_CLASS_MARK
+)
+
+CATEGORIES = ["Новости и СМИ", "Спорт", "Криптовалюты", "Технологии", "Юмор и развлечения"]
+
+EMPTY_HTML = f'<div class="text-center"><p class="lead">{NO_RESULTS_MARK}</p></div>'
+
+
+def card_html(i: int, subscribers: int, prefix: str = 'bench') -> str:
+    """Карточка канала в разметке выдачи tgstat (юзернейм - {prefix}_{i})"""
+    verified = f' {VERIFIED_CLASS_MARK}' if i % 11 == 0 else ''
+    subscribers_text = f"{subscribers:,}".replace(',', ' ')
+    return (
+        f'<div class="{CARD_CLASS}">'
+        f'<a href="/channel/@{prefix}_{i}/stat" class="text-body">'
+        f'<div class="media"><img src="//static.tgstat.ru/channels/_0/{i % 256:02x}/{i}.jpg" '
+        f'class="{AVATAR_CLASS_MARK} rounded-circle{verified}"></div>'
+        f'<div class="{NAME_CLASS}">Канал &amp; номер {i}</div></a>'
+        f'<span class="{CATEGORY_CLASS}">{CATEGORIES[i % len(CATEGORIES)]}</span>'
+        f'<div class="row">'
+        f'<div class="{METRIC_CLASS}"><h4 class="mb-0">{subscribers_text}</h4></div>'
+        f'<div class="{METRIC_CLASS}"><h4>{subscribers // 1000 % 100}.{i % 10}k</h4></div>'
+        f'<div class="{METRIC_CLASS}"><h4>{i % 50}.{i % 7}</h4></div>'
+        f'</div></div>'
+    )
+
+
+def load_recorded(path: str) -> List[Dict[str, Any]]:
+    """Ответы с карточками из базы кэша ответов tgstat"""
+    db = sqlite3.connect(path)
+    try:
+        bodies = [json.loads(body) for body, in db.execute("SELECT body FROM responses ORDER BY created_at")]
+    finally:
+        db.close()
+    return [body for body in bodies if NO_RESULTS_MARK not in (body.get('html') or '')]
+
+
+class FakeTgstatServer:
+    """
+    HTTP-сервер, имитирующий эндпоинт поиска tgstat.
+
+    Выдача каждого запроса состоит из total каналов по per_page на странице,
+    число подписчиков убывает со смещением (как при сортировке по подписчикам).
+    Фильтр participantsCountFrom/To сужает выдачу до каналов из этого диапазона.
+    С вероятностью error_rate вместо страницы отдается 429 с Retry-After: 0.
+    Сервер работает в отдельном потоке со своим циклом событий, поэтому
+    парсер можно запускать обычным asyncio.run.
+
+        with FakeTgstatServer(total=600, latency=0.05) as server:
+            tgstat_client.SEARCH_URL = server.url
+    """
+
+    def __init__(
+        self,
+        total: int = 300,
+        per_page: int = 30,
+        latency: float = 0.05,
+        error_rate: float = 0.0,
+        recorded: Optional[str] = None,
+        seed: int = 0,
+        port: int = 0
+    ):
+        """
+        Args:
+            total: каналов в выдаче одного запроса
+            per_page: каналов на странице
+            latency: задержка ответа в секундах
+            error_rate: доля ответов 429
+            recorded: база кэша ответов с записанными страницами (None - генерировать страницы)
+            seed: зерно генератора случайных ошибок
+            port: порт (0 - любой свободный)
+        """
+        self.total = total
+        self.per_page = per_page
+        self.latency = latency
+        self.error_rate = error_rate
+        self.port = port
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._recorded = load_recorded(recorded) if recorded else []
+        # Подписчики канала с номером i (по убыванию) со знаком минус - для поиска границ фильтра
+        self._negative_subscribers = [-self.subscribers(i) for i in range(total)]
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/channels/search"
+
+    @staticmethod
+    def subscribers(i: int) -> int:
+        """Число подписчиков канала с номером i в выдаче"""
+        return 10_000_000 // (i + 1)
+
+    def page(self, offset: int, query: str = '', low: int = 0, high: int = 1_000_000_000) -> Dict[str, Any]:
+        """
+        Ответ на запрос страницы со смещением offset (у каждого запроса свои каналы)
+
+        low и high - границы фильтра подписчиков (записанные страницы не фильтруются)
+        """
+        if self._recorded:
+            index = offset // self.per_page
+            if offset >= self.total:
+                return {'status': 'ok', 'hasMore': False, 'html': EMPTY_HTML}
+            body = dict(self._recorded[index % len(self._recorded)])
+            body['hasMore'] = offset + self.per_page < self.total
+            return body
+
+        first = bisect.bisect_left(self._negative_subscribers, -high)
+        last = bisect.bisect_right(self._negative_subscribers, -low)
+        start = first + offset
+        count = max(0, min(self.per_page, last - start))
+        if count == 0:
+            return {'status': 'ok', 'hasMore': False, 'html': EMPTY_HTML}
+        prefix = f"bench_{zlib.crc32(query.encode('utf-8')):08x}"
+        cards = ''.join(card_html(i, self.subscribers(i), prefix) for i in range(start, start + count))
+        return {'status': 'ok', 'hasMore': start + count < last, 'html': f'<div class="row">{cards}</div>'}
+
+    async def handle(self, request: web.Request) -> web.Response:
+        params = dict(urllib.parse.parse_qsl(await request.text()))
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=429, headers={'Retry-After': '0'})
+        return web.json_response(self.page(
+            int(params.get('offset', 0)),
+            params.get('q', ''),
+            int(params.get('participantsCountFrom', 0)),
+            int(params.get('participantsCountTo', 1_000_000_000))
+        ))
+
+    def start(self):
+        """Запуск сервера в фоновом потоке"""
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            app = web.Application()
+            app.router.add_post('/channels/search', self.handle)
+            self._runner = web.AppRunner(app, access_log=None)
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, '127.0.0.1', self.port)
+            self._loop.run_until_complete(site.start())
+            self.port = self._runner.addresses[0][1]
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self._runner.cleanup())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self):
+        """Остановка сервера"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная замена эндпоинта поиска tgstat")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--total', type=int, default=300, help="каналов в выдаче одного запроса")
+    parser.add_argument('--latency', type=float, default=0.05, help="задержка ответа в секундах")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument('--recorded', help="база кэша ответов с записанными страницами")
+    args = parser.parse_args()
+
+    with FakeTgstatServer(args.total, latency=args.latency, error_rate=args.error_rate,
+                          recorded=args.recorded, port=args.port) as server:
+        print(f"Сервер запущен: {server.url} (Ctrl+C - остановка)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,383 @@
+import argparse
+import glob
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from postprocess import SORT_KEYS, read_records
+
+# Файл индекса по умолчанию
+DEFAULT_INDEX_PATH = 'cache/channel_index.sqlite'
+
+# Выражения для сортировки по ключам result_sort_by (по убыванию, каналы без значения - в конце)
+SORT_COLUMNS = {
+    'subscribers_count': 'c.subscribers_count',
+    'avg_post_reach': 'c.avg_post_reach_value',
+    'citation_index': 'c.citation_index_value',
+    'reach_ratio': 'CAST(c.avg_post_reach_value AS REAL) / NULLIF(c.subscribers_count, 0)',
+}
+
+
+def _key(username: str) -> str:
+    return username.lstrip('@').lower()
+
+
+def _match_expression(text: str) -> Optional[str]:
+    """Запрос FTS5 из произвольного текста: все слова должны встретиться (как префиксы)"""
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+class ChannelIndex:
+    """
+    Локальный индекс каналов, накопленных за все запуски.
+
+    Для каждого канала хранятся последняя запись, числовые метрики, категория,
+    результат проверки комментариев и все запросы, по которым он находился.
+    Название, юзернейм, категория и запросы индексируются полнотекстовым
+    индексом SQLite FTS5, числовые поля - обычными индексами, поэтому отбор
+    вида "каналы о X от N подписчиков с открытыми комментариями" выполняется
+    за миллисекунды без обращения к tgstat.
+
+    Индекс обновляется инкрементально: более новая запись канала заменяет
+    прежнюю, запросы объединяются, а известный результат проверки комментариев
+    не затирается записью без проверки. Если SQLite собран без FTS5, поиск по
+    тексту выполняется через LIKE.
+
+        index = ChannelIndex('cache/channel_index.sqlite')
+        index.update(sink.records())
+        index.search('крипто', min_subscribers=10000, has_comments=True)
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        """
+        Args:
+            path: путь к файлу базы SQLite
+        """
+        self.path = path
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS channels ("
+            " id INTEGER PRIMARY KEY,"
+            " username TEXT NOT NULL UNIQUE,"
+            " name TEXT,"
+            " category TEXT,"
+            " subscribers_count INTEGER NOT NULL,"
+            " avg_post_reach_value INTEGER,"
+            " citation_index_value REAL,"
+            " is_verified INTEGER NOT NULL,"
+            " has_comments INTEGER,"
+            " queries TEXT NOT NULL,"
+            " record TEXT NOT NULL,"
+            " first_seen REAL NOT NULL,"
+            " seen_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS channels_subscribers ON channels (subscribers_count)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS channels_category ON channels (category, subscribers_count)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS channels_comments ON channels (has_comments, subscribers_count)")
+
+        # Полнотекстовый индекс хранит только токены, строки берутся из channels
+        try:
+            self._db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS channels_fts USING fts5("
+                " name, username, category, queries,"
+                " content='channels', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+            )
+            self._db.executescript(
+                "CREATE TRIGGER IF NOT EXISTS channels_ai AFTER INSERT ON channels BEGIN"
+                "  INSERT INTO channels_fts (rowid, name, username, category, queries)"
+                "  VALUES (new.id, new.name, new.username, new.category, new.queries);"
+                " END;"
+                "CREATE TRIGGER IF NOT EXISTS channels_ad AFTER DELETE ON channels BEGIN"
+                "  INSERT INTO channels_fts (channels_fts, rowid, name, username, category, queries)"
+                "  VALUES ('delete', old.id, old.name, old.username, old.category, old.queries);"
+                " END;"
+                "CREATE TRIGGER IF NOT EXISTS channels_au AFTER UPDATE ON channels BEGIN"
+                "  INSERT INTO channels_fts (channels_fts, rowid, name, username, category, queries)"
+                "  VALUES ('delete', old.id, old.name, old.username, old.category, old.queries);"
+                "  INSERT INTO channels_fts (rowid, name, username, category, queries)"
+                "  VALUES (new.id, new.name, new.username, new.category, new.queries);"
+                " END;"
+            )
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite собран без FTS5
+            self.fts = False
+        self._db.commit()
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM channels").fetchone()[0]
+
+    def update(self, records: Iterable[Dict[str, Any]], seen_at: Optional[float] = None) -> int:
+        """
+        Добавление или обновление каналов
+
+        Args:
+            records: каналы в виде словарей с полями Channel
+            seen_at: время получения записей (по умолчанию - текущее); запись канала
+                заменяет сохраненную, только если она не старее ее
+
+        Returns:
+            Количество обработанных каналов
+        """
+        if seen_at is None:
+            seen_at = time.time()
+
+        count = 0
+        for record in records:
+            username = record.get('username')
+            if not username or username == "unknown":
+                continue
+            key = _key(username)
+            has_comments = record.get('has_comments')
+            row = self._db.execute("SELECT queries, seen_at FROM channels WHERE username = ?", (key,)).fetchone()
+
+            queries = list(record.get('queries') or ())
+            if row is not None:
+                queries = list(dict.fromkeys(json.loads(row[0]) + queries))
+                if row[1] > seen_at:
+                    # Запись старее сохраненной - добавляем только запросы
+                    self._db.execute("UPDATE channels SET queries = ? WHERE username = ?",
+                                     (json.dumps(queries, ensure_ascii=False), key))
+                    count += 1
+                    continue
+
+            self._db.execute(
+                "INSERT INTO channels (username, name, category, subscribers_count, avg_post_reach_value,"
+                " citation_index_value, is_verified, has_comments, queries, record, first_seen, seen_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (username) DO UPDATE SET"
+                " name = excluded.name, category = excluded.category,"
+                " subscribers_count = excluded.subscribers_count,"
+                " avg_post_reach_value = excluded.avg_post_reach_value,"
+                " citation_index_value = excluded.citation_index_value,"
+                " is_verified = excluded.is_verified,"
+                " has_comments = COALESCE(excluded.has_comments, channels.has_comments),"
+                " queries = excluded.queries, record = excluded.record, seen_at = excluded.seen_at",
+                (
+                    key, record.get('name'), record.get('category'), int(record.get('subscribers_count') or 0),
+                    record.get('avg_post_reach_value'), record.get('citation_index_value'),
+                    int(bool(record.get('is_verified'))), None if has_comments is None else int(has_comments),
+                    json.dumps(queries, ensure_ascii=False), json.dumps(record, ensure_ascii=False),
+                    seen_at, seen_at
+                )
+            )
+            count += 1
+
+        self._db.commit()
+        return count
+
+    def import_files(self, paths: Iterable[str]) -> int:
+        """
+        Загрузка каналов из результатов прошлых запусков
+
+        Время получения записей - время изменения файла, поэтому файлы можно
+        загружать в любом порядке.
+
+        Args:
+            paths: файлы channels_*.ndjson / channels_*.json или директории с ними
+
+        Returns:
+            Количество обработанных каналов
+        """
+        files = []
+        for path in paths:
+            if not os.path.isdir(path):
+                files.append(path)
+                continue
+            # Из запуска с NDJSON берем только его: JSON прежнего формата содержит те же каналы
+            found = sorted(glob.glob(os.path.join(path, 'channels_*.ndjson')))
+            stems = {re.sub(r'_\d{4}$', '', os.path.splitext(name)[0]) for name in found}
+            found += [
+                name for name in sorted(glob.glob(os.path.join(path, 'channels_*.json')))
+                if os.path.splitext(name)[0] not in stems
+            ]
+            files.extend(name for name in found if not name.endswith('_filtered.ndjson'))
+
+        count = 0
+        for path in files:
+            count += self.update(read_records(path), os.path.getmtime(path))
+        return count
+
+    def search(
+        self,
+        text: Optional[str] = None,
+        min_subscribers: Optional[int] = None,
+        max_subscribers: Optional[int] = None,
+        category: Optional[str] = None,
+        has_comments: Optional[bool] = None,
+        is_verified: Optional[bool] = None,
+        min_avg_post_reach: Optional[int] = None,
+        min_citation_index: Optional[float] = None,
+        query: Optional[str] = None,
+        sort_by: str = 'subscribers_count',
+        limit: Optional[int] = 50
+    ) -> List[Dict[str, Any]]:
+        """
+        Отбор каналов из индекса
+
+        Args:
+            text: слова, которые должны встретиться в названии, юзернейме, категории или запросах
+                (совпадение по началу слова, без учета регистра)
+            min_subscribers: минимальное количество подписчиков
+            max_subscribers: максимальное количество подписчиков
+            category: категория (точное совпадение)
+            has_comments: результат проверки комментариев (None - не отбирать)
+            is_verified: верифицирован ли канал (None - не отбирать)
+            min_avg_post_reach: минимальный средний охват поста
+            min_citation_index: минимальный индекс цитирования
+            query: поисковый запрос, по которому канал находился
+            sort_by: ключ сортировки из SORT_KEYS (по убыванию) или 'rank' - по релевантности text
+            limit: максимальное количество каналов (None - без ограничения)
+
+        Returns:
+            Записи каналов с объединенными запросами и последним известным has_comments
+
+        Raises:
+            ValueError: если sort_by неизвестен
+        """
+        if sort_by != 'rank' and sort_by not in SORT_KEYS:
+            raise ValueError(f"Неизвестный ключ сортировки: {sort_by} (допустимы: rank, {', '.join(SORT_KEYS)})")
+
+        sql = "SELECT c.record, c.has_comments, c.queries FROM channels c"
+        where = []
+        params: List[Any] = []
+
+        match = _match_expression(text) if text else None
+        if match is not None and self.fts:
+            sql += " JOIN channels_fts f ON f.rowid = c.id"
+            where.append("channels_fts MATCH ?")
+            params.append(match)
+        elif match is not None:
+            for word in re.findall(r'\w+', text):
+                where.append("(c.name LIKE ? OR c.username LIKE ? OR c.category LIKE ? OR c.queries LIKE ?)")
+                params.extend([f"%{word}%"] * 4)
+
+        conditions = [
+            ("c.subscribers_count >= ?", min_subscribers),
+            ("c.subscribers_count <= ?", max_subscribers),
+            ("c.category = ?", category),
+            ("c.has_comments = ?", None if has_comments is None else int(has_comments)),
+            ("c.is_verified = ?", None if is_verified is None else int(is_verified)),
+            ("c.avg_post_reach_value >= ?", min_avg_post_reach),
+            ("c.citation_index_value >= ?", min_citation_index),
+            ("EXISTS (SELECT 1 FROM json_each(c.queries) WHERE value = ?)", query),
+        ]
+        for condition, value in conditions:
+            if value is not None:
+                where.append(condition)
+                params.append(value)
+
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if sort_by == 'rank' and match is not None and self.fts:
+            sql += " ORDER BY bm25(channels_fts)"
+        else:
+            column = SORT_COLUMNS.get(sort_by, SORT_COLUMNS['subscribers_count'])
+            sql += f" ORDER BY {column} IS NULL, {column} DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        results = []
+        for record, known_comments, queries in self._db.execute(sql, params):
+            record = json.loads(record)
+            record['has_comments'] = None if known_comments is None else bool(known_comments)
+            record['queries'] = json.loads(queries)
+            results.append(record)
+        return results
+
+    def categories(self) -> List[Tuple[Optional[str], int]]:
+        """Категории и количество каналов в них (по убыванию)"""
+        return self._db.execute(
+            "SELECT category, COUNT(*) FROM channels GROUP BY category ORDER BY COUNT(*) DESC"
+        ).fetchall()
+
+    def close(self):
+        """Закрытие базы"""
+        self._db.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    """Загрузка результатов в локальный индекс и поиск по нему"""
+    parser = argparse.ArgumentParser(description="Локальный индекс найденных каналов")
+    parser.add_argument('-i', '--index', default=DEFAULT_INDEX_PATH, help="файл индекса")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    load = commands.add_parser('import', help="загрузить результаты прошлых запусков")
+    load.add_argument('paths', nargs='*', default=['output'], help="файлы channels_* или директории (по умолчанию output)")
+
+    find = commands.add_parser('search', help="отбор каналов")
+    find.add_argument('text', nargs='?', help="слова в названии, юзернейме, категории или запросах")
+    find.add_argument('--min-subscribers', type=int)
+    find.add_argument('--max-subscribers', type=int)
+    find.add_argument('--category')
+    find.add_argument('--comments', dest='has_comments', action='store_true', default=None,
+                      help="только каналы с открытыми комментариями")
+    find.add_argument('--no-comments', dest='has_comments', action='store_false',
+                      help="только каналы без открытых комментариев")
+    find.add_argument('--verified', dest='is_verified', action='store_true', default=None)
+    find.add_argument('--min-avg-post-reach', type=int)
+    find.add_argument('--min-citation-index', type=float)
+    find.add_argument('--query', help="поисковый запрос, по которому канал находился")
+    find.add_argument('--sort', default='subscribers_count', choices=('rank',) + SORT_KEYS)
+    find.add_argument('--limit', type=int, default=50)
+    find.add_argument('--json', action='store_true', help="вывод в NDJSON")
+
+    commands.add_parser('stats', help="количество каналов по категориям")
+    args = parser.parse_args(argv)
+
+    index = ChannelIndex(args.index)
+    try:
+        if args.command == 'import':
+            count = index.import_files(args.paths)
+            print(f"Загружено каналов: {count}, всего в индексе: {len(index)}")
+
+        elif args.command == 'search':
+            started = time.perf_counter()
+            results = index.search(
+                args.text,
+                min_subscribers=args.min_subscribers,
+                max_subscribers=args.max_subscribers,
+                category=args.category,
+                has_comments=args.has_comments,
+                is_verified=args.is_verified,
+                min_avg_post_reach=args.min_avg_post_reach,
+                min_citation_index=args.min_citation_index,
+                query=args.query,
+                sort_by=args.sort,
+                limit=args.limit
+            )
+            elapsed = time.perf_counter() - started
+            for record in results:
+                if args.json:
+                    print(json.dumps(record, ensure_ascii=False))
+                    continue
+                comments = {True: 'комментарии', False: 'без комментариев', None: '-'}[record['has_comments']]
+                print(f"{record['username']:<32} {record['subscribers_count']:>10} "
+                      f"{record.get('category') or '-':<24} {comments:<16} {record.get('name') or ''}")
+            print(f"Найдено каналов: {len(results)} ({elapsed * 1000:.1f} мс)", file=sys.stderr if args.json else sys.stdout)
+
+        else:
+            print(f"Каналов в индексе: {len(index)}")
+            for category, count in index.categories():
+                print(f"  {category or '-'}: {count}")
+    finally:
+        index.close()
+
+
+if __name__ == '__main__':
+    main()
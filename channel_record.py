@@ -0,0 +1,107 @@
+import sys
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+# Биты поля _flags
+_VERIFIED = 1
+_CHECKED = 2
+_HAS_COMMENTS = 4
+
+
+class ChannelRecord:
+    """
+    Компактное представление канала внутри конвейера обхода.
+
+    Поля те же, что у модели Channel, но запись хранится в __slots__ без
+    словаря атрибутов и без валидации Pydantic: числовые метрики - int/float,
+    is_verified и has_comments упакованы в одно целое, повторяющиеся
+    строки (категории, запросы) интернируются. В модель Channel запись
+    преобразуется только на границах: при выводе и в публичных функциях.
+    """
+
+    __slots__ = (
+        'name',
+        'username',
+        'subscribers_count',
+        'avg_post_reach',
+        'avg_post_reach_value',
+        'citation_index',
+        'citation_index_value',
+        'category',
+        'avatar_url',
+        'queries',
+        '_flags',
+    )
+
+    def __init__(
+        self,
+        name: str,
+        username: str,
+        subscribers_count: int,
+        avg_post_reach: Optional[str] = None,
+        citation_index: Optional[str] = None,
+        category: Optional[str] = None,
+        avatar_url: Optional[str] = None,
+        is_verified: bool = False,
+        avg_post_reach_value: Optional[int] = None,
+        citation_index_value: Optional[float] = None,
+        has_comments: Optional[bool] = None,
+        queries: Sequence[str] = ()
+    ):
+        self.name = name
+        self.username = username
+        self.subscribers_count = int(subscribers_count)
+        self.avg_post_reach = avg_post_reach
+        self.avg_post_reach_value = avg_post_reach_value
+        self.citation_index = citation_index
+        self.citation_index_value = citation_index_value
+        self.category = sys.intern(category) if category else category
+        self.avatar_url = avatar_url
+        self.queries: Tuple[str, ...] = tuple(sys.intern(query) for query in queries)
+        self._flags = _VERIFIED if is_verified else 0
+        self.has_comments = has_comments
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ChannelRecord':
+        """Создание записи из словаря с полями Channel (например, из журнала или NDJSON)"""
+        return cls(**data)
+
+    @property
+    def is_verified(self) -> bool:
+        return bool(self._flags & _VERIFIED)
+
+    @is_verified.setter
+    def is_verified(self, value: bool):
+        self._flags = self._flags | _VERIFIED if value else self._flags & ~_VERIFIED
+
+    @property
+    def has_comments(self) -> Optional[bool]:
+        if not self._flags & _CHECKED:
+            return None
+        return bool(self._flags & _HAS_COMMENTS)
+
+    @has_comments.setter
+    def has_comments(self, value: Optional[bool]):
+        flags = self._flags & _VERIFIED
+        if value is not None:
+            flags |= _CHECKED | (_HAS_COMMENTS if value else 0)
+        self._flags = flags
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Словарь с полями в порядке модели Channel (совпадает с Channel.model_dump())"""
+        return {
+            'name': self.name,
+            'username': self.username,
+            'subscribers_count': self.subscribers_count,
+            'avg_post_reach': self.avg_post_reach,
+            'avg_post_reach_value': self.avg_post_reach_value,
+            'citation_index': self.citation_index,
+            'citation_index_value': self.citation_index_value,
+            'category': self.category,
+            'avatar_url': self.avatar_url,
+            'is_verified': self.is_verified,
+            'has_comments': self.has_comments,
+            'queries': list(self.queries),
+        }
+
+    def __repr__(self) -> str:
+        return f"ChannelRecord(username={self.username!r}, subscribers_count={self.subscribers_count})"
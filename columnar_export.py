@@ -0,0 +1,134 @@
+import importlib.util
+import logging
+import os
+import typing
+from typing import Any, Dict, Iterable, Optional
+
+# pyarrow - необязательная зависимость; импортируется при первом экспорте,
+# так как импорт занимает около 0.1 с, а колоночный экспорт обычно выключен
+pa = None
+
+logger = logging.getLogger(__name__)
+
+# Поддерживаемые форматы и расширения файлов
+FORMATS = {
+    'parquet': '.parquet',
+    'arrow': '.arrow',
+}
+
+
+def is_available() -> bool:
+    """Установлен ли pyarrow (без его импорта)"""
+    return pa is not None or importlib.util.find_spec('pyarrow') is not None
+
+
+def _load_pyarrow():
+    """Импорт pyarrow при первом обращении"""
+    global pa
+    if pa is None:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+        pa = pyarrow
+    return pa
+
+
+def _arrow_type(annotation) -> 'pa.DataType':
+    """Тип Arrow для аннотации поля модели (Optional[X] - допускающий null X)"""
+    args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+    origin = typing.get_origin(annotation)
+
+    if origin is typing.Union and len(args) == 1:
+        return _arrow_type(args[0])
+    if origin in (list, typing.List):
+        return pa.list_(_arrow_type(args[0]))
+    if annotation is bool:
+        return pa.bool_()
+    if annotation is int:
+        return pa.int64()
+    if annotation is float:
+        return pa.float64()
+    if annotation is str:
+        return pa.string()
+    raise TypeError(f"Нет соответствия типа Arrow для {annotation!r}")
+
+
+def schema_from_model(model) -> 'pa.Schema':
+    """
+    Схема Arrow по полям модели Pydantic
+
+    Поля с аннотацией Optional[...] допускают null, остальные - нет.
+
+    Args:
+        model: класс модели (например, Channel)
+    """
+    _load_pyarrow()
+    fields = []
+    for name, field in model.model_fields.items():
+        nullable = type(None) in typing.get_args(field.annotation)
+        fields.append(pa.field(name, _arrow_type(field.annotation), nullable=nullable))
+    return pa.schema(fields)
+
+
+def export_columnar(
+    records: Iterable[Dict[str, Any]],
+    directory: str,
+    run_id: str,
+    model,
+    fmt: str = 'parquet',
+    batch_size: int = 10_000
+) -> Optional[str]:
+    """
+    Запись каналов запуска в отдельную партицию колоночного набора данных
+
+    Файл записывается в {directory}/run={run_id}/, поэтому все запуски читаются
+    вместе как один набор данных с hive-партиционированием, например
+    pyarrow.dataset.dataset(directory, partitioning='hive'). Каналы пишутся
+    пачками по batch_size без загрузки всего результата в память.
+
+    Args:
+        records: каналы в виде словарей с полями модели
+        directory: корневой каталог набора данных
+        run_id: идентификатор запуска (имя партиции)
+        model: модель, по полям которой строится схема
+        fmt: 'parquet' или 'arrow' (Arrow IPC)
+        batch_size: количество каналов в одной пачке записи
+
+    Returns:
+        Путь к записанному файлу или None, если pyarrow не установлен
+
+    Raises:
+        ValueError: если формат не поддерживается
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат экспорта: {fmt} (допустимы: {', '.join(FORMATS)})")
+    if not is_available():
+        logger.warning("pyarrow не установлен, колоночный экспорт пропущен")
+        return None
+    _load_pyarrow()
+
+    schema = schema_from_model(model)
+    partition = os.path.join(directory, f"run={run_id}")
+    os.makedirs(partition, exist_ok=True)
+    path = os.path.join(partition, f"part-0{FORMATS[fmt]}")
+    tmp_path = path + '.part'
+
+    if fmt == 'parquet':
+        writer = pa.parquet.ParquetWriter(tmp_path, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_file(tmp_path, schema)
+
+    try:
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+    finally:
+        writer.close()
+
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,115 @@
+import logging
+import os
+import sqlite3
+import time
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CommentCheck(NamedTuple):
+    """Результат проверки комментариев канала"""
+    linked_chat_id: Optional[int]
+    checked_at: float
+    error: Optional[str]
+
+    @property
+    def has_comments(self) -> Optional[bool]:
+        """True/False для успешной проверки, None если проверка завершилась ошибкой"""
+        if self.error is not None:
+            return None
+        return self.linked_chat_id is not None
+
+
+class CommentsCache:
+    """
+    Постоянное хранилище результатов проверки комментариев по юзернейму.
+
+    Кэшируются как успешные проверки (с linked_chat_id или без него), так и
+    постоянные ошибки (канал не существует, приватный и т.п.). Для них заданы
+    разные сроки жизни: ttl и negative_ttl. Устаревшие записи не отдаются,
+    и канал проверяется через Telethon заново.
+    """
+
+    def __init__(self, path: str, ttl: float = 7 * 24 * 3600, negative_ttl: float = 24 * 3600):
+        """
+        Args:
+            path: путь к файлу базы SQLite
+            ttl: время жизни успешной проверки в секундах
+            negative_ttl: время жизни ошибки проверки в секундах
+        """
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS comment_checks ("
+            " username TEXT PRIMARY KEY,"
+            " linked_chat_id INTEGER,"
+            " checked_at REAL NOT NULL,"
+            " error TEXT)"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def _key(username: str) -> str:
+        # Юзернеймы в Telegram не зависят от регистра
+        return username.lstrip('@').lower()
+
+    def get(self, username: str) -> Optional[CommentCheck]:
+        """
+        Получение актуального результата проверки
+
+        Args:
+            username: юзернейм канала (с @ или без)
+
+        Returns:
+            CommentCheck или None, если записи нет или она устарела
+        """
+        row = self._db.execute(
+            "SELECT linked_chat_id, checked_at, error FROM comment_checks WHERE username = ?",
+            (self._key(username),)
+        ).fetchone()
+
+        if row is not None:
+            entry = CommentCheck(*row)
+            ttl = self.ttl if entry.error is None else self.negative_ttl
+            if time.time() - entry.checked_at <= ttl:
+                self.hits += 1
+                return entry
+
+        self.misses += 1
+        return None
+
+    def put(self, username: str, linked_chat_id: Optional[int] = None, error: Optional[str] = None) -> CommentCheck:
+        """
+        Сохранение результата проверки
+
+        Args:
+            username: юзернейм канала (с @ или без)
+            linked_chat_id: ID связанного чата обсуждений (None - комментарии закрыты)
+            error: описание постоянной ошибки проверки
+
+        Returns:
+            Сохраненная запись
+        """
+        entry = CommentCheck(linked_chat_id, time.time(), error)
+        self._db.execute(
+            "INSERT OR REPLACE INTO comment_checks (username, linked_chat_id, checked_at, error) VALUES (?, ?, ?, ?)",
+            (self._key(username), *entry)
+        )
+        self._db.commit()
+        return entry
+
+    def close(self):
+        """Закрытие базы"""
+        self._db.close()
@@ -0,0 +1,187 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class CrawlState:
+    """
+    Журнал выполненной работы для продолжения прерванного запуска.
+
+    Для каждого запуска записываются обработанные страницы поиска (ключ -
+    канонические параметры запроса, значение - найденные каналы и hasMore)
+    и завершенные проверки комментариев. При запуске с --resume
+    обработанные страницы и проверки берутся из журнала без обращения
+    к tgstat и Telegram.
+
+    Страницы и проверки нужны только для продолжения, поэтому при успешном
+    завершении запуска они удаляются: в журнале остаются данные
+    незавершенных запусков и краткие записи о запусках.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: путь к файлу базы SQLite
+        """
+        self.path = path
+        self.run_id: Optional[str] = None
+        self.replayed_pages = 0
+        self.replayed_checks = 0
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " run_id TEXT PRIMARY KEY,"
+            " started_at REAL NOT NULL,"
+            " finished_at REAL,"
+            " config TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " run_id TEXT NOT NULL,"
+            " page_key TEXT NOT NULL,"
+            " query TEXT NOT NULL,"
+            " offset INTEGER NOT NULL,"
+            " has_more INTEGER NOT NULL,"
+            " channels TEXT NOT NULL,"
+            " PRIMARY KEY (run_id, page_key));"
+            "CREATE TABLE IF NOT EXISTS checks ("
+            " run_id TEXT NOT NULL,"
+            " username TEXT NOT NULL,"
+            " has_comments INTEGER,"
+            " PRIMARY KEY (run_id, username));"
+            "CREATE TABLE IF NOT EXISTS failures ("
+            " run_id TEXT NOT NULL,"
+            " query TEXT NOT NULL,"
+            " offset INTEGER NOT NULL,"
+            " PRIMARY KEY (run_id, query, offset));"
+        )
+        self._db.commit()
+
+    def start_run(self, run_id: str, config: Dict[str, Any]):
+        """
+        Регистрация нового запуска
+
+        Args:
+            run_id: идентификатор запуска
+            config: конфигурация поиска (сохраняется для продолжения)
+        """
+        self._db.execute(
+            "INSERT OR REPLACE INTO runs (run_id, started_at, finished_at, config) VALUES (?, ?, NULL, ?)",
+            (run_id, time.time(), json.dumps(config, ensure_ascii=False))
+        )
+        # Данные завершенных запусков, оставшиеся в журнале (например, от прежних версий)
+        self._prune("run_id IN (SELECT run_id FROM runs WHERE finished_at IS NOT NULL)")
+        self._db.commit()
+        self.run_id = run_id
+
+    def resume_run(self, run_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Продолжение незавершенного запуска
+
+        Args:
+            run_id: идентификатор запуска (None - последний незавершенный)
+
+        Returns:
+            Конфигурация продолжаемого запуска или None, если продолжать нечего
+        """
+        if run_id is None:
+            row = self._db.execute(
+                "SELECT run_id, config FROM runs WHERE finished_at IS NULL ORDER BY started_at DESC LIMIT 1"
+            ).fetchone()
+        else:
+            row = self._db.execute("SELECT run_id, config FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+
+        if row is None:
+            return None
+
+        self.run_id = row[0]
+        # Незагруженные страницы прошлой попытки будут запрошены заново
+        self._db.execute("DELETE FROM failures WHERE run_id = ?", (self.run_id,))
+        self._db.commit()
+        return json.loads(row[1])
+
+    def finish_run(self):
+        """Отметка об успешном завершении текущего запуска и удаление его страниц и проверок"""
+        self._db.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), self.run_id))
+        self._prune("run_id = ?", (self.run_id,))
+        self._db.commit()
+
+    def _prune(self, condition: str, params: Tuple = ()):
+        """Удаление страниц, проверок и неудач запусков, подходящих под условие"""
+        for table in ('pages', 'checks', 'failures'):
+            self._db.execute(f"DELETE FROM {table} WHERE {condition}", params)
+
+    def get_page(self, page_key: str) -> Optional[Tuple[bool, List[Dict[str, Any]]]]:
+        """
+        Получение обработанной страницы из журнала
+
+        Returns:
+            Кортеж (has_more, список каналов) или None, если страница не обработана
+        """
+        row = self._db.execute(
+            "SELECT has_more, channels FROM pages WHERE run_id = ? AND page_key = ?",
+            (self.run_id, page_key)
+        ).fetchone()
+        if row is None:
+            return None
+
+        self.replayed_pages += 1
+        return bool(row[0]), json.loads(row[1])
+
+    def put_page(self, page_key: str, query: str, offset: int, has_more: bool, channels: List[Dict[str, Any]]):
+        """Запись обработанной страницы в журнал"""
+        self._db.execute(
+            "INSERT OR REPLACE INTO pages (run_id, page_key, query, offset, has_more, channels) VALUES (?, ?, ?, ?, ?, ?)",
+            (self.run_id, page_key, query, offset, int(has_more), json.dumps(channels, ensure_ascii=False))
+        )
+        self._db.commit()
+
+    def get_check(self, username: str) -> Tuple[bool, Optional[bool]]:
+        """
+        Получение результата проверки комментариев из журнала
+
+        Returns:
+            Кортеж (проверка выполнена, has_comments)
+        """
+        row = self._db.execute(
+            "SELECT has_comments FROM checks WHERE run_id = ? AND username = ?",
+            (self.run_id, username.lstrip('@').lower())
+        ).fetchone()
+        if row is None:
+            return False, None
+
+        self.replayed_checks += 1
+        return True, None if row[0] is None else bool(row[0])
+
+    def put_check(self, username: str, has_comments: Optional[bool]):
+        """Запись завершенной проверки комментариев в журнал"""
+        self._db.execute(
+            "INSERT OR REPLACE INTO checks (run_id, username, has_comments) VALUES (?, ?, ?)",
+            (self.run_id, username.lstrip('@').lower(), None if has_comments is None else int(has_comments))
+        )
+        self._db.commit()
+
+    def put_failure(self, query: str, offset: int):
+        """Запись страницы, которую не удалось загрузить даже после повторного прохода"""
+        self._db.execute(
+            "INSERT OR REPLACE INTO failures (run_id, query, offset) VALUES (?, ?, ?)",
+            (self.run_id, query, offset)
+        )
+        self._db.commit()
+
+    def failures(self) -> List[Tuple[str, int]]:
+        """Незагруженные страницы текущего запуска: список (query, offset)"""
+        return self._db.execute(
+            "SELECT query, offset FROM failures WHERE run_id = ? ORDER BY query, offset", (self.run_id,)
+        ).fetchall()
+
+    def close(self):
+        """Закрытие базы"""
+        self._db.close()
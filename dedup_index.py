@@ -0,0 +1,80 @@
+import hashlib
+from array import array
+
+
+class DedupIndex:
+    """
+    Индекс уже встреченных юзернеймов для дедупликации каналов между запросами.
+
+    Юзернейм приводится к нижнему регистру без @ и хэшируется в 64 бита.
+    Хэши хранятся в хэш-таблице с открытой адресацией на базе array('Q'):
+    8 байт на ячейку вместо объекта строки и записи множества, поэтому
+    миллионы юзернеймов занимают десятки мегабайт. Вероятность совпадения
+    64-битных хэшей двух разных юзернеймов пренебрежимо мала.
+    """
+
+    # Доля заполнения, после которой таблица увеличивается вдвое
+    MAX_LOAD = 0.6
+
+    def __init__(self, capacity: int = 1024):
+        """
+        Args:
+            capacity: ожидаемое количество уникальных юзернеймов
+        """
+        size = 1024
+        while size * self.MAX_LOAD < capacity:
+            size *= 2
+        self._table = array('Q', bytes(8 * size))
+        self._mask = size - 1
+        self._count = 0
+        self.duplicates = 0
+
+    @staticmethod
+    def _hash(username: str) -> int:
+        digest = hashlib.blake2b(username.lstrip('@').lower().encode('utf-8'), digest_size=8).digest()
+        # 0 обозначает пустую ячейку
+        return int.from_bytes(digest, 'little') or 1
+
+    def _slot(self, key: int) -> int:
+        """Индекс ячейки с ключом key или первой пустой ячейки на его пути"""
+        table, mask = self._table, self._mask
+        i = key & mask
+        while True:
+            value = table[i]
+            if value == key or value == 0:
+                return i
+            i = (i + 1) & mask
+
+    def _grow(self):
+        old = self._table
+        self._table = array('Q', bytes(16 * len(old)))
+        self._mask = len(self._table) - 1
+        for key in old:
+            if key:
+                self._table[self._slot(key)] = key
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, username: str) -> bool:
+        key = self._hash(username)
+        return self._table[self._slot(key)] == key
+
+    def add(self, username: str) -> bool:
+        """
+        Добавление юзернейма в индекс
+
+        Returns:
+            True, если юзернейм встретился впервые
+        """
+        key = self._hash(username)
+        i = self._slot(key)
+        if self._table[i] == key:
+            self.duplicates += 1
+            return False
+
+        self._table[i] = key
+        self._count += 1
+        if self._count > len(self._table) * self.MAX_LOAD:
+            self._grow()
+        return True
@@ -0,0 +1,163 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+class SnapshotEntry(NamedTuple):
+    """Состояние канала в последнем снимке"""
+    subscribers_count: int
+    has_comments: Optional[bool]
+    queries: Tuple[str, ...]
+
+
+class SnapshotStore:
+    """
+    Снимок результатов прошлого запуска для инкрементального (дельта) обхода.
+
+    Для каждого канала хранится число подписчиков, результат проверки
+    комментариев, запросы, по которым он найден, и полная запись. Канал
+    считается неизменившимся, если он есть в снимке с тем же числом
+    подписчиков: такие каналы не проверяются повторно, а длинная серия
+    неизменившихся каналов останавливает обход запроса (выдача отсортирована
+    по подписчикам).
+
+    Для каждого запроса запоминается обойденный диапазон подписчиков - от
+    наименьшего до наибольшего числа среди полученных каналов (вся ось, если
+    выдача пройдена целиком). Каналы снимка, которые не встретились в этом
+    запуске, считаются удаленными, если попадают в обойденный диапазон,
+    и переносятся в результат без изменений, если лежат за его пределами.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: путь к файлу базы SQLite
+        """
+        self.path = path
+        self._seen = set()
+        self._ranges: Dict[str, List[Tuple[float, float]]] = {}
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS snapshot ("
+            " username TEXT PRIMARY KEY,"
+            " subscribers_count INTEGER NOT NULL,"
+            " has_comments INTEGER,"
+            " queries TEXT NOT NULL,"
+            " record TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+        # Для сравнения нужны только подписчики и результат проверки - полные записи остаются в базе
+        self._entries: Dict[str, SnapshotEntry] = {
+            username: SnapshotEntry(subscribers_count, None if has_comments is None else bool(has_comments),
+                                    tuple(json.loads(queries)))
+            for username, subscribers_count, has_comments, queries in self._db.execute(
+                "SELECT username, subscribers_count, has_comments, queries FROM snapshot"
+            )
+        }
+
+    @staticmethod
+    def _key(username: str) -> str:
+        return username.lstrip('@').lower()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, username: str) -> Optional[SnapshotEntry]:
+        """Состояние канала в снимке или None, если канала в снимке нет"""
+        return self._entries.get(self._key(username))
+
+    def is_unchanged(self, channel) -> bool:
+        """Есть ли канал в снимке с тем же числом подписчиков"""
+        entry = self._entries.get(self._key(channel.username))
+        return entry is not None and entry.subscribers_count == channel.subscribers_count
+
+    def observe(self, channels: Iterable):
+        """Учет каналов, полученных в этом запуске (до дедупликации между запросами)"""
+        for channel in channels:
+            self._seen.add(self._key(channel.username))
+
+    def mark_crawled(self, query: str, low: float, high: float):
+        """
+        Учет обойденного диапазона запроса (запрос может обходиться несколькими интервалами)
+
+        Args:
+            query: поисковый запрос
+            low: наименьшее число подписчиков в обойденной части выдачи
+            high: наибольшее число подписчиков в обойденной части выдачи
+        """
+        self._ranges.setdefault(query, []).append((low, high))
+
+    def carry_over(self) -> Tuple[List[Dict[str, Any]], List[Tuple[str, SnapshotEntry]]]:
+        """
+        Разделение не встреченных в этом запуске каналов снимка
+
+        Returns:
+            Кортеж (записи каналов вне обойденного диапазона - переносятся в результат,
+            список (username, SnapshotEntry) каналов, пропавших из обойденного диапазона)
+        """
+        carried_usernames = []
+        removed = []
+        for username, entry in self._entries.items():
+            if username in self._seen:
+                continue
+            crawled = [bounds for query in entry.queries for bounds in self._ranges.get(query, ())]
+            if not crawled:
+                continue
+            if any(low <= entry.subscribers_count <= high for low, high in crawled):
+                removed.append((username, entry))
+            else:
+                carried_usernames.append(username)
+
+        carried = []
+        for username in carried_usernames:
+            row = self._db.execute("SELECT record FROM snapshot WHERE username = ?", (username,)).fetchone()
+            carried.append(json.loads(row[0]))
+        return carried, removed
+
+    def save(self, channels: Iterable, removed: Iterable[str] = ()):
+        """
+        Обновление снимка по итогам запуска
+
+        Args:
+            channels: каналы результата (ChannelRecord) с заполненным has_comments
+            removed: юзернеймы каналов, которые больше не встречаются в выдаче
+        """
+        now = time.time()
+        rows = []
+        for channel in channels:
+            key = self._key(channel.username)
+            previous = self._entries.get(key)
+            # Запросы, по которым канал находили раньше, сохраняются
+            queries = tuple(dict.fromkeys((previous.queries if previous else ()) + tuple(channel.queries)))
+            has_comments = channel.has_comments
+            self._entries[key] = SnapshotEntry(channel.subscribers_count, has_comments, queries)
+            rows.append((
+                key, channel.subscribers_count, None if has_comments is None else int(has_comments),
+                json.dumps(queries, ensure_ascii=False),
+                json.dumps(channel.to_dict(), ensure_ascii=False), now
+            ))
+
+        self._db.executemany(
+            "INSERT OR REPLACE INTO snapshot (username, subscribers_count, has_comments, queries, record, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        for username in removed:
+            self._entries.pop(self._key(username), None)
+            self._db.execute("DELETE FROM snapshot WHERE username = ?", (self._key(username),))
+        self._db.commit()
+
+    def close(self):
+        """Закрытие базы"""
+        self._db.close()
@@ -0,0 +1,101 @@
+import os
+import sqlite3
+import time
+from typing import Dict, Optional, Tuple
+
+
+class EntityCache:
+    """
+    Постоянное хранилище соответствий username -> (channel_id, access_hash).
+
+    access_hash в Telegram привязан к аккаунту, поэтому записи хранятся
+    отдельно для каждой сессии. При открытии все записи сессии загружаются
+    одним запросом, дальше поиск выполняется в памяти, и канал, который уже
+    встречался, проверяется одним запросом GetFullChannel без ResolveUsername.
+    """
+
+    def __init__(self, path: str, session_name: str, ttl: float = 30 * 24 * 3600):
+        """
+        Args:
+            path: путь к файлу базы SQLite
+            session_name: имя сессии Telethon, для которой хранятся access_hash
+            ttl: время жизни записи в секундах (юзернейм может перейти к другому каналу)
+        """
+        self.path = path
+        self.session_name = session_name
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entities ("
+            " session_name TEXT NOT NULL,"
+            " username TEXT NOT NULL,"
+            " channel_id INTEGER NOT NULL,"
+            " access_hash INTEGER NOT NULL,"
+            " resolved_at REAL NOT NULL,"
+            " PRIMARY KEY (session_name, username))"
+        )
+        self._db.commit()
+
+        # Все актуальные записи сессии загружаются одним запросом
+        rows = self._db.execute(
+            "SELECT username, channel_id, access_hash FROM entities WHERE session_name = ? AND resolved_at >= ?",
+            (session_name, time.time() - ttl)
+        ).fetchall()
+        self._entities: Dict[str, Tuple[int, int]] = {
+            username: (channel_id, access_hash) for username, channel_id, access_hash in rows
+        }
+
+    @staticmethod
+    def _key(username: str) -> str:
+        return username.lstrip('@').lower()
+
+    def __len__(self) -> int:
+        return len(self._entities)
+
+    def get(self, username: str) -> Optional[Tuple[int, int]]:
+        """
+        Получение (channel_id, access_hash) по юзернейму
+
+        Returns:
+            Кортеж или None, если канал еще не разрешался этой сессией
+        """
+        entity = self._entities.get(self._key(username))
+        if entity is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entity
+
+    def put(self, username: str, channel_id: int, access_hash: int):
+        """Сохранение результата разрешения юзернейма"""
+        key = self._key(username)
+        self._entities[key] = (channel_id, access_hash)
+        self._db.execute(
+            "INSERT OR REPLACE INTO entities (session_name, username, channel_id, access_hash, resolved_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (self.session_name, key, channel_id, access_hash, time.time())
+        )
+        self._db.commit()
+
+    def discard(self, username: str):
+        """Удаление устаревшей записи (например, если access_hash больше не принимается)"""
+        key = self._key(username)
+        self._entities.pop(key, None)
+        self._db.execute(
+            "DELETE FROM entities WHERE session_name = ? AND username = ?",
+            (self.session_name, key)
+        )
+        self._db.commit()
+
+    def close(self):
+        """Закрытие базы"""
+        self._db.close()
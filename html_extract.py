@@ -0,0 +1,472 @@
+import logging
+import re
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional
+
+try:
+    import lxml.html
+except ImportError:  # lxml - необязательная зависимость
+    lxml = None
+
+logger = logging.getLogger(__name__)
+
+# Классы элементов карточки канала в выдаче tgstat
+CARD_CLASS = 'card-body py-2 position-relative'
+NAME_CLASS = 'text-truncate font-16 text-dark mt-n1'
+METRIC_CLASS = 'col col-4 pt-1'
+CATEGORY_CLASS = 'border rounded bg-light px-1'
+AVATAR_CLASS_MARK = 'img-thumbnail'
+VERIFIED_CLASS_MARK = 'border-success'
+
+USERNAME_RE = re.compile(r'/channel/([@\w]+)/stat')
+
+# Признак ответа без результатов
+NO_RESULTS_MARK = "No channel found"
+
+# Порядок полей в компактной записи канала, передаваемой между процессами
+CHANNEL_FIELDS = (
+    'name',
+    'username',
+    'subscribers_count',
+    'avg_post_reach',
+    'citation_index',
+    'category',
+    'avatar_url',
+    'is_verified',
+    'avg_post_reach_value',
+    'citation_index_value',
+)
+
+# Множители сокращений в метриках tgstat ("12.3k", "1.2m")
+METRIC_SUFFIXES = {
+    'k': 1e3, 'к': 1e3, 'т': 1e3, 'тыс': 1e3,
+    'm': 1e6, 'м': 1e6, 'млн': 1e6,
+    'b': 1e9, 'млрд': 1e9,
+}
+METRIC_RE = re.compile(r'^([+-]?\d+(?:\.\d+)?)\s*([a-zа-я]*)\.?$')
+# Запятая - разделитель разрядов, если за ней ровно три цифры ("1,234"), иначе десятичная ("7,5")
+THOUSANDS_COMMA_RE = re.compile(r',(?=\d{3}(?!\d))')
+
+# Бэкенд извлечения по умолчанию (меняется через set_backend)
+DEFAULT_BACKEND = 'auto'
+_current_backend = DEFAULT_BACKEND
+
+
+def parse_metric(text: Optional[str]) -> Optional[float]:
+    """
+    Преобразование текста метрики в число
+
+    Понимает разделители разрядов ("1 234", "1,234"), десятичную запятую ("7,5")
+    и сокращения ("12.3k", "1.2M", "5 тыс").
+
+    Args:
+        text: текст метрики из карточки
+
+    Returns:
+        Значение метрики или None, если текст не является числом (например, "-")
+    """
+    if not text:
+        return None
+
+    # Убираем пробелы, в том числе неразрывные и узкие, внутри числа
+    value = re.sub(r'[\s\u00a0\u202f]', '', text)
+    value = THOUSANDS_COMMA_RE.sub('', value).replace(',', '.').lower()
+    match = METRIC_RE.match(value)
+    if match is None:
+        return None
+
+    number, suffix = match.groups()
+    if suffix and suffix not in METRIC_SUFFIXES:
+        return None
+    return float(number) * METRIC_SUFFIXES.get(suffix, 1)
+
+
+def _make_record(
+    name: Optional[str],
+    href: Optional[str],
+    metrics: List[Optional[str]],
+    category: Optional[str],
+    avatar_src: Optional[str],
+    is_verified: bool
+) -> Dict[str, Any]:
+    """
+    Сборка записи канала из сырых значений карточки
+
+    Общая для всех бэкендов, поэтому преобразование значений одинаково
+    независимо от способа разбора HTML.
+
+    Args:
+        name: текст блока с названием (None, если блока нет)
+        href: ссылка на страницу статистики канала
+        metrics: тексты <h4> из блоков метрик (None, если в блоке нет <h4>)
+        category: текст блока категории
+        avatar_src: src аватара
+        is_verified: есть ли отметка верификации
+
+    Returns:
+        Словарь с полями модели Channel
+
+    Raises:
+        ValueError: если в карточке нет блоков метрик или число подписчиков не распознано
+    """
+    username = "unknown"
+    if href:
+        match = USERNAME_RE.search(href)
+        if match:
+            username = match.group(1)
+
+    if not metrics:
+        raise ValueError("в карточке нет блока с количеством подписчиков")
+
+    subscribers_count = 0
+    if metrics[0] is not None:
+        subscribers_count = int(metrics[0].strip().replace(' ', ''))
+
+    avg_post_reach = metrics[1].strip() if len(metrics) > 1 and metrics[1] is not None else None
+    citation_index = metrics[2].strip() if len(metrics) > 2 and metrics[2] is not None else None
+
+    # Числовые значения метрик для фильтрации и сортировки (исходный текст сохраняется)
+    avg_post_reach_value = parse_metric(avg_post_reach)
+    if avg_post_reach_value is not None:
+        avg_post_reach_value = round(avg_post_reach_value)
+    citation_index_value = parse_metric(citation_index)
+
+    avatar_url = avatar_src
+    if avatar_url is not None and avatar_url.startswith('//'):
+        avatar_url = 'https:' + avatar_url
+
+    return {
+        'name': name.strip() if name is not None else "Неизвестно",
+        'username': username,
+        'subscribers_count': subscribers_count,
+        'avg_post_reach': avg_post_reach,
+        'citation_index': citation_index,
+        'category': category.strip() if category is not None else None,
+        'avatar_url': avatar_url,
+        'is_verified': is_verified,
+        'avg_post_reach_value': avg_post_reach_value,
+        'citation_index_value': citation_index_value,
+    }
+
+
+def extract_cards_bs4(html: str) -> List[Dict[str, Any]]:
+    """Эталонный разбор карточек через BeautifulSoup (html.parser)"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    records = []
+
+    for card in soup.find_all('div', class_=CARD_CLASS):
+        try:
+            name_element = card.find('div', class_=NAME_CLASS)
+            link_element = card.find('a', href=USERNAME_RE)
+            metric_elements = card.find_all('div', class_=METRIC_CLASS)
+            category_element = card.find('span', class_=CATEGORY_CLASS)
+            avatar_element = card.find('img', class_=re.compile(AVATAR_CLASS_MARK))
+
+            metrics = []
+            for element in metric_elements:
+                h4 = element.find('h4')
+                metrics.append(h4.text if h4 else None)
+
+            records.append(_make_record(
+                name=name_element.text if name_element else None,
+                href=link_element.get('href') if link_element else None,
+                metrics=metrics,
+                category=category_element.text if category_element else None,
+                avatar_src=avatar_element.get('src') if avatar_element else None,
+                is_verified=bool(card.find('img', class_=re.compile(VERIFIED_CLASS_MARK)))
+            ))
+        except Exception as e:
+            # В случае ошибки при парсинге отдельного канала, продолжаем с следующим
+            print(f"Ошибка при парсинге канала: {e}")
+
+    return records
+
+
+def extract_cards_lxml(html: str) -> List[Dict[str, Any]]:
+    """Разбор карточек через lxml (C-парсер и XPath)"""
+    if lxml is None:
+        raise RuntimeError("lxml не установлен")
+
+    if not html.strip():
+        return []
+
+    tree = lxml.html.document_fromstring(html)
+    records = []
+
+    for card in tree.xpath(f'//div[normalize-space(@class)="{CARD_CLASS}"]'):
+        try:
+            name_elements = card.xpath(f'.//div[normalize-space(@class)="{NAME_CLASS}"]')
+            link_href = next((href for href in card.xpath('.//a/@href') if USERNAME_RE.search(href)), None)
+            category_elements = card.xpath(f'.//span[normalize-space(@class)="{CATEGORY_CLASS}"]')
+            avatar_elements = card.xpath(f'.//img[contains(@class, "{AVATAR_CLASS_MARK}")]')
+
+            metrics = []
+            for element in card.xpath(f'.//div[normalize-space(@class)="{METRIC_CLASS}"]'):
+                h4 = element.xpath('.//h4')
+                metrics.append(h4[0].text_content() if h4 else None)
+
+            records.append(_make_record(
+                name=name_elements[0].text_content() if name_elements else None,
+                href=link_href,
+                metrics=metrics,
+                category=category_elements[0].text_content() if category_elements else None,
+                avatar_src=avatar_elements[0].get('src') if avatar_elements else None,
+                is_verified=bool(card.xpath(f'.//img[contains(@class, "{VERIFIED_CLASS_MARK}")]'))
+            ))
+        except Exception as e:
+            # В случае ошибки при парсинге отдельного канала, продолжаем с следующим
+            print(f"Ошибка при парсинге канала: {e}")
+
+    return records
+
+
+class _CardTokenizer(HTMLParser):
+    """
+    Однопроходный потоковый разбор карточек без построения дерева.
+
+    Отслеживает только вложенность div/h4/span внутри карточки и собирает
+    текст нужных элементов по мере чтения документа.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.records = []
+        self._card = None
+        # Стек открытых div внутри карточки: роль элемента ('card', 'name', 'metric') или None
+        self._divs = []
+        # Активные буферы текста: [роль, части текста, тег, глубина вложенности тега]
+        self._captures = []
+        self._avatar_seen = False
+
+    def _start_card(self):
+        self._card = {
+            'name': None,
+            'href': None,
+            'metrics': [],
+            'category': None,
+            'avatar_src': None,
+            'is_verified': False,
+        }
+        self._divs = ['card']
+        self._captures = []
+        self._avatar_seen = False
+
+    def _finish_card(self):
+        card = self._card
+        self._card = None
+        self._divs = []
+        self._captures = []
+        try:
+            self.records.append(_make_record(**card))
+        except Exception as e:
+            # В случае ошибки при парсинге отдельного канала, продолжаем с следующим
+            print(f"Ошибка при парсинге канала: {e}")
+
+    def _capture(self, role: str, tag: str):
+        self._captures.append([role, [], tag, 1])
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in ('div', 'a', 'img', 'h4', 'span'):
+            return
+
+        attrs = dict(attrs)
+        css = ' '.join((attrs.get('class') or '').split())
+
+        if self._card is None:
+            if tag == 'div' and css == CARD_CLASS:
+                self._start_card()
+            return
+
+        card = self._card
+
+        # Вложенные одноименные теги внутри захватываемого элемента
+        for capture in self._captures:
+            if capture[2] == tag:
+                capture[3] += 1
+
+        if tag == 'div':
+            role = None
+            if css == NAME_CLASS and card['name'] is None:
+                role = 'name'
+                self._capture('name', 'div')
+            elif css == METRIC_CLASS:
+                role = 'metric'
+                card['metrics'].append(None)
+            self._divs.append(role)
+        elif tag == 'h4':
+            # Берется только первый <h4> в каждом блоке метрики
+            if 'metric' in self._divs and card['metrics'][-1] is None \
+                    and not any(capture[0] == 'metric' for capture in self._captures):
+                self._capture('metric', 'h4')
+        elif tag == 'span':
+            if css == CATEGORY_CLASS and card['category'] is None \
+                    and not any(capture[0] == 'category' for capture in self._captures):
+                self._capture('category', 'span')
+        elif tag == 'a':
+            href = attrs.get('href')
+            if card['href'] is None and href and USERNAME_RE.search(href):
+                card['href'] = href
+        elif tag == 'img':
+            # Как и в bs4, учитывается только первое изображение-аватар
+            if AVATAR_CLASS_MARK in css and not self._avatar_seen:
+                self._avatar_seen = True
+                card['avatar_src'] = attrs.get('src')
+            if VERIFIED_CLASS_MARK in css:
+                card['is_verified'] = True
+
+    def handle_endtag(self, tag):
+        if self._card is None or tag not in ('div', 'h4', 'span'):
+            return
+
+        for capture in list(self._captures):
+            if capture[2] != tag:
+                continue
+            capture[3] -= 1
+            if capture[3] == 0:
+                self._captures.remove(capture)
+                text = ''.join(capture[1])
+                if capture[0] == 'metric':
+                    self._card['metrics'][-1] = text
+                else:
+                    self._card[capture[0]] = text
+
+        if tag == 'div':
+            if self._divs:
+                self._divs.pop()
+            if not self._divs:
+                self._finish_card()
+
+    def handle_data(self, data):
+        for capture in self._captures:
+            capture[1].append(data)
+
+    def close(self):
+        super().close()
+        # Незакрытая карточка в конце документа
+        if self._card is not None:
+            for capture in self._captures:
+                text = ''.join(capture[1])
+                if capture[0] == 'metric':
+                    self._card['metrics'][-1] = text
+                else:
+                    self._card[capture[0]] = text
+            self._finish_card()
+
+
+def extract_cards_stream(html: str) -> List[Dict[str, Any]]:
+    """Разбор карточек однопроходным потоковым токенизатором (только stdlib)"""
+    tokenizer = _CardTokenizer()
+    tokenizer.feed(html)
+    tokenizer.close()
+    return tokenizer.records
+
+
+BACKENDS = {
+    'bs4': extract_cards_bs4,
+    'lxml': extract_cards_lxml,
+    'stream': extract_cards_stream,
+}
+
+
+def resolve_backend(name: Optional[str] = None) -> str:
+    """
+    Определение фактического бэкенда по имени из конфигурации
+
+    Args:
+        name: 'auto', 'lxml', 'stream' или 'bs4' (None - текущий бэкенд)
+
+    Returns:
+        Имя бэкенда из BACKENDS
+    """
+    name = name or _current_backend
+    if name == 'auto':
+        return 'lxml' if lxml is not None else 'stream'
+    if name == 'lxml' and lxml is None:
+        logger.warning("lxml не установлен, используется потоковый разбор")
+        return 'stream'
+    if name not in BACKENDS:
+        logger.warning(f"Неизвестный бэкенд разбора HTML '{name}', используется bs4")
+        return 'bs4'
+    return name
+
+
+def set_backend(name: str):
+    """Выбор бэкенда разбора HTML по умолчанию"""
+    global _current_backend
+    _current_backend = resolve_backend(name)
+
+
+def extract_cards(html: str, backend: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Извлечение записей каналов из HTML выдачи tgstat
+
+    Если выбранный бэкенд завершился ошибкой, страница разбирается повторно
+    эталонной реализацией на BeautifulSoup.
+
+    Args:
+        html: HTML из ответа поиска
+        backend: имя бэкенда (None - бэкенд по умолчанию)
+
+    Returns:
+        Список словарей с полями модели Channel
+    """
+    name = resolve_backend(backend)
+
+    try:
+        return BACKENDS[name](html)
+    except Exception as e:
+        if name == 'bs4':
+            raise
+        logger.warning(f"Ошибка разбора HTML бэкендом {name}, используется bs4: {e}")
+        return extract_cards_bs4(html)
+
+
+def extract_error_message(html: str) -> Optional[str]:
+    """
+    Извлечение сообщения об ошибке из HTML ответа без результатов
+
+    Returns:
+        Текст сообщения или None, если сообщения в HTML нет
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    error_element = soup.find('p', class_='lead')
+    return error_element.text.strip() if error_element else None
+
+
+def parse_search_payload(data: Dict[str, Any], backend: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Разбор JSON ответа поиска в компактный вид
+
+    Функция выполняется в процессе-обработчике, поэтому принимает и возвращает
+    только простые типы: каналы передаются кортежами в порядке CHANNEL_FIELDS,
+    а исходный HTML обратно не возвращается.
+
+    Args:
+        data: JSON-данные ответа API
+        backend: имя бэкенда разбора HTML
+
+    Returns:
+        Словарь с ключами status, hasMore, channels, no_results и error_message
+    """
+    html = data.get('html') or ''
+    result = {
+        'status': data.get('status'),
+        'hasMore': data.get('hasMore'),
+        'channels': [],
+        'no_results': NO_RESULTS_MARK in html,
+        'error_message': None,
+    }
+
+    if result['no_results']:
+        result['error_message'] = extract_error_message(html)
+    else:
+        result['channels'] = [
+            tuple(record[field] for field in CHANNEL_FIELDS)
+            for record in extract_cards(html, backend)
+        ]
+
+    return result
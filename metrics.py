@@ -0,0 +1,307 @@
+import asyncio
+import bisect
+import contextlib
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм длительности (секунды)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Описания метрик для экспорта в формате Prometheus
+METRIC_HELP = {
+    'tgstat_stage_seconds': "Длительность операций по этапам конвейера",
+    'tgstat_stage_errors_total': "Неудачные операции по этапам конвейера",
+    'tgstat_http_retries_total': "Повторы запросов к tgstat",
+    'tgstat_cache_requests_total': "Обращения к кэшам по результату (hit/miss)",
+    'tgstat_flood_waits_total': "Ответы FloodWait от Telegram",
+    'tgstat_flood_wait_seconds_total': "Суммарная пауза, запрошенная Telegram через FloodWait",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ''
+    escaped = (
+        key + '="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for key, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин (как в Prometheus)"""
+
+    __slots__ = ('bounds', 'counts', 'count', 'sum')
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        # Последняя корзина - значения больше всех границ (+Inf)
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Оценка квантиля по корзинам (линейная интерполяция внутри корзины)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                low = self.bounds[i - 1] if i > 0 else 0.0
+                if i == len(self.bounds):
+                    return low
+                return low + (self.bounds[i] - low) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.bounds[-1]
+
+
+class MetricsRegistry:
+    """
+    Счетчики и гистограммы длительности этапов конвейера.
+
+    Метрики идентифицируются именем и набором меток. Значения обновляются
+    из цикла событий без блокировок. Снимок доступен в виде словаря
+    (snapshot), текста в формате Prometheus (render_prometheus) и краткой
+    сводки для вывода в конце запуска (summary_lines).
+
+        with METRICS.time('fetch'):
+            data = await client.search(payload)
+        METRICS.inc('tgstat_cache_requests_total', cache='responses', result='hit')
+    """
+
+    def __init__(self):
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+
+    def reset(self):
+        """Сброс всех значений"""
+        self._counters.clear()
+        self._histograms.clear()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Увеличение счетчика"""
+        series = self._counters.setdefault(name, {})
+        key = _labels(labels)
+        series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """Добавление значения в гистограмму"""
+        series = self._histograms.setdefault(name, {})
+        key = _labels(labels)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram()
+        histogram.observe(value)
+
+    @contextlib.contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        """
+        Замер длительности операции этапа stage
+
+        Длительность попадает в tgstat_stage_seconds, а операция, завершившаяся
+        исключением, дополнительно учитывается в tgstat_stage_errors_total.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc('tgstat_stage_errors_total', stage=stage)
+            raise
+        finally:
+            self.observe('tgstat_stage_seconds', time.perf_counter() - started, stage=stage)
+
+    def counter(self, name: str, **labels) -> float:
+        """Текущее значение счетчика"""
+        return self._counters.get(name, {}).get(_labels(labels), 0)
+
+    def counter_total(self, name: str, **labels) -> float:
+        """Сумма счетчика по всем сериям, содержащим указанные метки"""
+        wanted = set(_labels(labels))
+        return sum(value for key, value in self._counters.get(name, {}).items() if wanted <= set(key))
+
+    def histogram(self, name: str, **labels) -> Optional[Histogram]:
+        """Гистограмма с указанными метками или None, если значений еще не было"""
+        return self._histograms.get(name, {}).get(_labels(labels))
+
+    def cache_hit_rates(self) -> Dict[str, float]:
+        """Доля попаданий по каждому кэшу"""
+        totals: Dict[str, List[float]] = {}
+        for key, value in self._counters.get('tgstat_cache_requests_total', {}).items():
+            labels = dict(key)
+            hits_total = totals.setdefault(labels.get('cache', ''), [0, 0])
+            hits_total[1] += value
+            if labels.get('result') == 'hit':
+                hits_total[0] += value
+        return {cache: hits / total for cache, (hits, total) in totals.items() if total}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Все метрики в виде словаря, пригодного для JSON"""
+        counters = {
+            name: [{'labels': dict(key), 'value': value} for key, value in series.items()]
+            for name, series in self._counters.items()
+        }
+        histograms = {
+            name: [
+                {
+                    'labels': dict(key),
+                    'count': histogram.count,
+                    'sum': histogram.sum,
+                    'p50': histogram.quantile(0.5),
+                    'p95': histogram.quantile(0.95),
+                    'buckets': dict(zip([str(bound) for bound in histogram.bounds] + ['+Inf'], histogram.counts)),
+                }
+                for key, histogram in series.items()
+            ]
+            for name, series in self._histograms.items()
+        }
+        return {
+            'timestamp': time.time(),
+            'counters': counters,
+            'histograms': histograms,
+            'cache_hit_rates': self.cache_hit_rates(),
+        }
+
+    def render_prometheus(self) -> str:
+        """Метрики в текстовом формате Prometheus"""
+        lines = []
+        for name, series in sorted(self._counters.items()):
+            if name in METRIC_HELP:
+                lines.append(f"# HELP {name} {METRIC_HELP[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in sorted(series.items()):
+                lines.append(f"{name}{_format_labels(key)} {value:g}")
+
+        for name, series in sorted(self._histograms.items()):
+            if name in METRIC_HELP:
+                lines.append(f"# HELP {name} {METRIC_HELP[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, histogram in sorted(series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.bounds + (float('inf'),), histogram.counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                    lines.append(f"{name}_bucket{_format_labels(key, (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum:g}")
+                lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def summary_lines(self) -> List[str]:
+        """Краткая сводка: время по этапам, доля попаданий в кэши, FloodWait"""
+        lines = []
+        for key, histogram in sorted(self._histograms.get('tgstat_stage_seconds', {}).items()):
+            stage = dict(key).get('stage', '')
+            errors = self.counter('tgstat_stage_errors_total', stage=stage)
+            line = (f"{stage}: операций {histogram.count}, всего {histogram.sum:.2f} с, "
+                    f"среднее {histogram.sum / histogram.count * 1000:.0f} мс, "
+                    f"p95 {histogram.quantile(0.95) * 1000:.0f} мс")
+            if errors:
+                line += f", ошибок {errors:.0f}"
+            lines.append(line)
+
+        for cache, rate in sorted(self.cache_hit_rates().items()):
+            lines.append(f"Кэш {cache}: попаданий {rate:.0%}")
+
+        flood_waits = self.counter_total('tgstat_flood_waits_total')
+        if flood_waits:
+            lines.append(f"FloodWait: {flood_waits:.0f}, "
+                         f"суммарная пауза {self.counter_total('tgstat_flood_wait_seconds_total'):.0f} с")
+        return lines
+
+
+# Общий реестр процесса
+METRICS = MetricsRegistry()
+
+
+def write_json(path: str, registry: MetricsRegistry = METRICS):
+    """Атомарная запись снимка метрик в JSON-файл"""
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    tmp_path = path + '.part'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(registry.snapshot(), f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+async def dump_periodically(path: str, interval: float, registry: MetricsRegistry = METRICS):
+    """Запись снимка метрик в JSON каждые interval секунд (до отмены задачи)"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            write_json(path, registry)
+        except OSError as e:
+            logger.warning(f"Не удалось записать метрики в {path}: {e}")
+
+
+async def serve_prometheus(host: str, port: int, registry: MetricsRegistry = METRICS):
+    """
+    Запуск HTTP-эндпоинта /metrics в текстовом формате Prometheus
+
+    Returns:
+        aiohttp.web.AppRunner - для остановки вызовите await runner.cleanup()
+    """
+    # Серверная часть aiohttp нужна только с эндпоинтом, поэтому не импортируется вместе с модулем
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(text=registry.render_prometheus(), content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+@contextlib.asynccontextmanager
+async def exporters(
+    port: Optional[int] = None,
+    host: str = '127.0.0.1',
+    json_path: Optional[str] = None,
+    interval: float = 30,
+    registry: MetricsRegistry = METRICS
+):
+    """
+    Экспорт метрик на время выполнения блока
+
+    Args:
+        port: порт эндпоинта Prometheus /metrics (None - не запускать)
+        host: адрес, на котором слушает эндпоинт
+        json_path: файл для снимков метрик в JSON (None - не записывать)
+        interval: период записи снимков в секундах (0 - только в конце)
+    """
+    runner = None
+    dump_task = None
+    if port:
+        runner = await serve_prometheus(host, port, registry)
+        logger.info(f"Метрики Prometheus доступны на http://{host}:{port}/metrics")
+    if json_path and interval > 0:
+        dump_task = asyncio.ensure_future(dump_periodically(json_path, interval, registry))
+    try:
+        yield registry
+    finally:
+        if dump_task is not None:
+            dump_task.cancel()
+        if json_path:
+            write_json(json_path, registry)
+        if runner is not None:
+            await runner.cleanup()
@@ -0,0 +1,209 @@
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from metrics import METRICS
+
+
+class ChannelSink:
+    """
+    Потоковая запись результатов в NDJSON и TXT.
+
+    Каждый канал дописывается в файл сразу после разбора или проверки
+    (пачками по batch_size записей), поэтому при падении посреди запуска
+    уже найденные каналы не теряются, а память не растет с числом результатов.
+
+    Текущий сегмент NDJSON пишется в файл с суффиксом .part и атомарно
+    переименовывается при ротации (каждые rotate_records записей) или при
+    закрытии. В конце запуска сегменты можно собрать в JSON-массив прежнего
+    формата через export_json.
+
+    Запросы, по которым канал нашелся уже после записи, добавляются через
+    add_queries и дописываются в поле queries при закрытии: сегменты
+    переписываются построчно, в памяти хранятся только дополнительные запросы.
+    """
+
+    def __init__(
+        self,
+        ndjson_path: str,
+        txt_path: Optional[str] = None,
+        batch_size: int = 100,
+        rotate_records: int = 0
+    ):
+        """
+        Args:
+            ndjson_path: путь к файлу NDJSON (при ротации к имени добавляется номер сегмента)
+            txt_path: путь к TXT-файлу с юзернеймами (None - не записывать)
+            batch_size: сколько записей накапливать перед записью на диск
+            rotate_records: количество записей в сегменте (0 - один файл без ротации)
+        """
+        self.ndjson_path = ndjson_path
+        self.txt_path = txt_path
+        self.batch_size = max(1, batch_size)
+        self.rotate_records = max(0, rotate_records)
+        self.count = 0
+        self.segments: List[str] = []
+        self._buffer: List[Dict[str, Any]] = []
+        self._segment_index = 0
+        self._segment_count = 0
+        self._segment_file = None
+        self._segment_path = None
+        self._txt_file = None
+        # Дополнительные запросы уже записанных каналов (ключ - юзернейм без @ в нижнем регистре)
+        self._extra_queries: Dict[str, List[str]] = {}
+
+        directory = os.path.dirname(ndjson_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _segment_name(self) -> str:
+        if not self.rotate_records:
+            return self.ndjson_path
+        base, ext = os.path.splitext(self.ndjson_path)
+        return f"{base}_{self._segment_index:04d}{ext}"
+
+    def _open_segment(self):
+        self._segment_index += 1
+        self._segment_count = 0
+        self._segment_path = self._segment_name()
+        self._segment_file = open(self._segment_path + '.part', 'w', encoding='utf-8')
+
+    def _close_segment(self):
+        """Закрытие текущего сегмента и атомарное переименование .part в итоговый файл"""
+        if self._segment_file is None:
+            return
+        self._segment_file.flush()
+        os.fsync(self._segment_file.fileno())
+        self._segment_file.close()
+        os.replace(self._segment_path + '.part', self._segment_path)
+        self.segments.append(self._segment_path)
+        self._segment_file = None
+
+    def write(self, channel):
+        """
+        Добавление канала в выходные файлы
+
+        Args:
+            channel: объект Channel, запись ChannelRecord или словарь с полями канала
+        """
+        if hasattr(channel, 'to_dict'):
+            record = channel.to_dict()
+        elif hasattr(channel, 'model_dump'):
+            record = channel.model_dump()
+        else:
+            record = dict(channel)
+        self._buffer.append(record)
+        self.count += 1
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def add_queries(self, username: str, queries: Sequence[str]):
+        """
+        Добавление запросов к полю queries уже записанного канала
+
+        Args:
+            username: юзернейм канала
+            queries: запросы, по которым канал найден повторно
+        """
+        extra = self._extra_queries.setdefault(username.lstrip('@').lower(), [])
+        for query in queries:
+            if query not in extra:
+                extra.append(query)
+
+    def flush(self):
+        """Запись накопленных каналов на диск"""
+        if not self._buffer:
+            return
+
+        with METRICS.time('write'):
+            self._write_buffer()
+        self._buffer = []
+
+    def _write_buffer(self):
+        if self.txt_path is not None and self._txt_file is None:
+            self._txt_file = open(self.txt_path, 'a', encoding='utf-8')
+
+        for record in self._buffer:
+            if self._segment_file is None:
+                self._open_segment()
+            self._segment_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._segment_count += 1
+
+            if self._txt_file is not None:
+                # Добавляем @ к юзернейму, если его нет
+                username = record.get('username')
+                if username and username != "unknown":
+                    if not username.startswith('@'):
+                        username = f"@{username}"
+                    self._txt_file.write(f"{username}\n")
+
+            if self.rotate_records and self._segment_count >= self.rotate_records:
+                self._close_segment()
+
+        if self._segment_file is not None:
+            self._segment_file.flush()
+        if self._txt_file is not None:
+            self._txt_file.flush()
+
+    def close(self):
+        """Запись оставшихся каналов, объединение запросов и закрытие файлов"""
+        self.flush()
+        self._close_segment()
+        if self._txt_file is not None:
+            self._txt_file.close()
+            self._txt_file = None
+        if self._extra_queries:
+            self._merge_queries()
+
+    def _merge_queries(self):
+        """Добавление запросов из add_queries в записанные сегменты (с атомарной заменой файлов)"""
+        for path in self.segments:
+            tmp_path = path + '.part'
+            with open(path, 'r', encoding='utf-8') as src, open(tmp_path, 'w', encoding='utf-8') as dst:
+                for line in src:
+                    if line.strip():
+                        record = json.loads(line)
+                        extra = self._extra_queries.get((record.get('username') or '').lstrip('@').lower())
+                        if extra:
+                            queries = list(record.get('queries') or ())
+                            record['queries'] = queries + [query for query in extra if query not in queries]
+                            line = json.dumps(record, ensure_ascii=False) + '\n'
+                    dst.write(line)
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.replace(tmp_path, path)
+        self._extra_queries = {}
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """Последовательное чтение всех записанных каналов из закрытых сегментов"""
+        for path in self.segments:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+    def export_json(self, filename: str):
+        """
+        Сборка записанных сегментов в JSON-массив прежнего формата (indent=4)
+
+        Файл собирается построчно, без загрузки всех каналов в память,
+        и атомарно заменяет filename после записи.
+
+        Args:
+            filename: путь к итоговому JSON-файлу
+        """
+        tmp_filename = filename + '.part'
+        with open(tmp_filename, 'w', encoding='utf-8') as f:
+            first = True
+            for record in self.records():
+                item = json.dumps(record, ensure_ascii=False, indent=4).replace('\n', '\n    ')
+                f.write(('[\n    ' if first else ',\n    ') + item)
+                first = False
+            f.write('[]' if first else '\n]')
+        os.replace(tmp_filename, filename)
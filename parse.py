@@ -1,24 +1,74 @@
 import json
 import time
-import requests
-from typing import List, Optional, Dict, Any
+import aiohttp
+from typing import Awaitable, Callable, List, Optional, Dict, Any, Tuple
 from pydantic import BaseModel, Field
-from bs4 import BeautifulSoup
-import re
 import os
-from telethon.sync import TelegramClient
-from telethon.tl.functions.channels import GetFullChannelRequest
+import argparse
 import asyncio
+import hashlib
 import logging
-from telethon_config import (
-    API_ID, API_HASH, SESSION_NAME, CHECK_COMMENTS, 
-    SKIP_CHANNELS_WITHOUT_COMMENTS, REQUEST_DELAY
+import urllib.parse
+import columnar_export
+import metrics
+import telethon_config
+from comments_cache import CommentsCache
+from channel_index import ChannelIndex
+from channel_record import ChannelRecord
+from crawl_state import CrawlState
+from dedup_index import DedupIndex
+from delta_snapshot import SnapshotStore
+from entity_cache import EntityCache
+from metrics import METRICS
+from html_extract import (
+    CHANNEL_FIELDS, NO_RESULTS_MARK, extract_cards, extract_error_message, parse_search_payload, set_backend
 )
+from output_sink import ChannelSink
+from parse_pool import ParsePool
+from partition_planner import PartitionPlanner
+from postprocess import filter_options, has_filters, select, write_records
+from rate_limit import AdaptiveRateController, CircuitBreaker, RateLimiter, TokenBucket
+from response_cache import CacheMiss, ResponseCache
+from tgstat_client import TgstatClient
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Telethon импортируется при первой проверке комментариев (load_telethon): импорт занимает
+# около 0.25 с, а запуски без проверки и процессы пула разбора он не нужен
+TelegramClient = None
+errors = None
+GetFullChannelRequest = None
+InputChannel = None
+InputPeerChannel = None
+
+# Ошибки проверки, которые не исчезнут при повторной попытке (кэшируются как отрицательный результат)
+PERMANENT_CHECK_ERRORS = (ValueError, TypeError)
+
+
+def load_telethon():
+    """Импорт Telethon при первом обращении (уже заданный TelegramClient не заменяется)"""
+    global TelegramClient, errors, GetFullChannelRequest, InputChannel, InputPeerChannel, PERMANENT_CHECK_ERRORS
+    if errors is not None:
+        return
+    from telethon import errors as telethon_errors
+    from telethon.sync import TelegramClient as telethon_client
+    from telethon.tl.functions.channels import GetFullChannelRequest
+    from telethon.tl.types import InputChannel, InputPeerChannel
+    
+    if TelegramClient is None:
+        TelegramClient = telethon_client
+    errors = telethon_errors
+    PERMANENT_CHECK_ERRORS = (
+        ValueError,
+        TypeError,
+        errors.UsernameNotOccupiedError,
+        errors.UsernameInvalidError,
+        errors.ChannelPrivateError,
+        errors.ChannelInvalidError,
+    )
+
 
 class Channel(BaseModel):
     """Модель Telegram канала"""
@@ -26,11 +76,14 @@ class Channel(BaseModel):
     username: str = Field(description="Юзернейм канала")
     subscribers_count: int = Field(description="Количество подписчиков")
     avg_post_reach: Optional[str] = Field(None, description="Средний охват поста")
+    avg_post_reach_value: Optional[int] = Field(None, description="Средний охват поста числом")
     citation_index: Optional[str] = Field(None, description="Индекс цитирования")
+    citation_index_value: Optional[float] = Field(None, description="Индекс цитирования числом")
     category: Optional[str] = Field(None, description="Категория канала")
     avatar_url: Optional[str] = Field(None, description="URL аватара канала")
     is_verified: bool = Field(False, description="Верифицирован ли канал")
     has_comments: Optional[bool] = Field(None, description="Открыты ли комментарии в канале")
+    queries: List[str] = Field(default_factory=list, description="Поисковые запросы, по которым найден канал")
 
 
 class SearchResponse(BaseModel):
@@ -46,80 +99,14 @@ class SuccessResponse(SearchResponse):
     
     def __init__(self, **data):
         super().__init__(**data)
-        self.parse_html()
+        # Каналы могут быть уже разобраны в процессе-обработчике (см. ParsePool)
+        if 'channels' not in data:
+            self.parse_html()
     
     def parse_html(self):
         """Парсинг HTML для извлечения информации о каналах"""
-        soup = BeautifulSoup(self.html, 'html.parser')
-        channel_cards = soup.find_all('div', class_='card-body py-2 position-relative')
-        
-        for card in channel_cards:
-            try:
-                # Извлекаем имя канала
-                name_element = card.find('div', class_='text-truncate font-16 text-dark mt-n1')
-                name = name_element.text.strip() if name_element else "Неизвестно"
-                
-                # Извлекаем юзернейм из ссылки
-                link_element = card.find('a', href=re.compile(r'/channel/[@\w]+/stat'))
-                username = "unknown"
-                if link_element and 'href' in link_element.attrs:
-                    match = re.search(r'/channel/([@\w]+)/stat', link_element['href'])
-                    if match:
-                        username = match.group(1)
-                
-                # Извлекаем количество подписчиков
-                subscribers_element = card.find('div', class_='col col-4 pt-1').find('h4')
-                subscribers_count = 0
-                if subscribers_element:
-                    subscribers_text = subscribers_element.text.strip().replace(' ', '')
-                    subscribers_count = int(subscribers_text)
-                
-                # Извлекаем охват поста
-                reach_elements = card.find_all('div', class_='col col-4 pt-1')
-                avg_post_reach = None
-                if len(reach_elements) > 1:
-                    reach_element = reach_elements[1].find('h4')
-                    if reach_element:
-                        avg_post_reach = reach_element.text.strip()
-                
-                # Извлекаем индекс цитирования
-                citation_index = None
-                if len(reach_elements) > 2:
-                    citation_element = reach_elements[2].find('h4')
-                    if citation_element:
-                        citation_index = citation_element.text.strip()
-                
-                # Извлекаем категорию
-                category_element = card.find('span', class_='border rounded bg-light px-1')
-                category = category_element.text.strip() if category_element else None
-                
-                # Извлекаем URL аватара
-                avatar_element = card.find('img', class_=re.compile(r'img-thumbnail'))
-                avatar_url = None
-                if avatar_element and 'src' in avatar_element.attrs:
-                    avatar_url = avatar_element['src']
-                    if avatar_url.startswith('//'):
-                        avatar_url = 'https:' + avatar_url
-                
-                # Проверяем верификацию канала
-                is_verified = bool(card.find('img', class_=re.compile(r'border-success')))
-                
-                # Создаем объект Channel и добавляем в список
-                channel = Channel(
-                    name=name,
-                    username=username,
-                    subscribers_count=subscribers_count,
-                    avg_post_reach=avg_post_reach,
-                    citation_index=citation_index,
-                    category=category,
-                    avatar_url=avatar_url,
-                    is_verified=is_verified
-                )
-                self.channels.append(channel)
-            except Exception as e:
-                # В случае ошибки при парсинге отдельного канала, продолжаем с следующим
-                print(f"Ошибка при парсинге канала: {e}")
-                continue
+        for record in extract_cards(self.html):
+            self.channels.append(Channel(**record))
 
 
 class ErrorResponse(SearchResponse):
@@ -128,14 +115,14 @@ class ErrorResponse(SearchResponse):
     
     def __init__(self, **data):
         super().__init__(**data)
-        self.parse_error_message()
+        if 'error_message' not in data:
+            self.parse_error_message()
     
     def parse_error_message(self):
         """Извлечение сообщения об ошибке из HTML"""
-        soup = BeautifulSoup(self.html, 'html.parser')
-        error_element = soup.find('p', class_='lead')
-        if error_element:
-            self.error_message = error_element.text.strip()
+        error_message = extract_error_message(self.html)
+        if error_message:
+            self.error_message = error_message
 
 
 def parse_response(data: Dict[str, Any]) -> SearchResponse:
@@ -151,118 +138,173 @@ def parse_response(data: Dict[str, Any]) -> SearchResponse:
     response = SearchResponse(**data)
     
     # Проверяем, содержит ли HTML сообщение об ошибке
-    if "No channel found" in response.html:
+    if NO_RESULTS_MARK in response.html:
         return ErrorResponse(**data)
     else:
         return SuccessResponse(**data)
 
 
-def build_payload(
-    view: str = "",
-    sort: str = "",
-    q: str = "",
-    inAbout: bool = False,
-    categories: str = "",
-    countries: str = "",
-    languages: str = "",
-    age: list[str] = [],
-    err: list[str] = [],
-    engagement_rate: int = 0,
-    channelType: str = "public",
-    male: int = 0,
-    female: int = 0,
-    participantsCountFrom: int = 1,
-    participantsCountTo: int = 1_000_000_000,
-    avgReachFrom: int = 0,
-    avgReachTo: int = 1_000_000_000,
-    avgReach24From: int = 0,
-    avgReach24To: int = 1_000_000_000,
-    ciFrom: int = 0,
-    ciTo: int = 1_000_000_000,
-    isVerified: bool = False,
-    isRknVerified: bool = False,
-    isStoriesAvailable: bool = False,
-    noRedLabel: bool = False,
-    noScam: bool = False,
-    noDead: bool = False,
-    page: int = 0,
-    offset: int = 0,
-):
-    if view == "":
-        view = "list"
-    if sort == "":
-        sort = "participants"
-    if q == "":
-        q = ""
-    if inAbout == False:
-        inAbout = "0"
-    if inAbout == True:
-        inAbout = "1"
-    if categories == "":
-        categories = ""
-    if countries == "":
-        countries = ""
-    if age == []:
-        age = [0, 120]
-    if err == []:
-        err = [0, 100]
-    if isVerified == False:
-        isVerified = "0"
-    if isVerified == True:
-        isVerified = "1"
-    if isRknVerified == False:
-        isRknVerified = "0"
-    if isRknVerified == True:
-        isRknVerified = "1"
-    if isStoriesAvailable == False:
-        isStoriesAvailable = "0"
-    if isStoriesAvailable == True:
-        isStoriesAvailable = "1"
-    if noRedLabel == False:
-        noRedLabel = "0"
-    if noRedLabel == True:
-        noRedLabel = "1"
-    if noScam == False:
-        noScam = "0"
-    if noScam == True:
-        noScam = "1"
-    if noDead == False:
-        noDead = "0"
-    if noDead == True:
-        noDead = "1"
-    age = '-'.join(map(str, age))
-    err = '-'.join(map(str, err))
-    
-    return f'_tgstat_csrk=lAS3AuR5Gtto6yhmkrcy6FPbl3c1zCk-EAS9icI42XTWZ-REgC19mByFYlbE_gKGNYnZAl2Gem4kY-rniBXqMQ%3D%3D&\
-        view={view}&\
-        sort={sort}&\
-        q={q}&\
-        inAbout={inAbout}&\
-        categories={categories}&\
-        countries={countries}&\
-        languages={languages}&\
-        channelType={channelType}&\
-        age={age}&\
-        err={err}&\
-        er={engagement_rate}&\
-        male={male}&\
-        female={female}&\
-        participantsCountFrom={participantsCountFrom}&\
-        participantsCountTo={participantsCountTo}&\
-        avgReachFrom={avgReachFrom}&\
-        avgReachTo={avgReachTo}&\
-        avgReach24From={avgReach24From}&\
-        avgReach24To={avgReach24To}&\
-        ciFrom={ciFrom}&\
-        ciTo={ciTo}&\
-        isVerified={isVerified}&\
-        isRknVerified={isRknVerified}&\
-        isStoriesAvailable={isStoriesAvailable}&\
-        noRedLabel={noRedLabel}&\
-        noScam={noScam}&\
-        noDead={noDead}&\
-        page={page}&\
-        offset={offset}'
+def response_from_parsed(parsed: Dict[str, Any]) -> SearchResponse:
+    """
+    Создание объекта ответа из результата разбора в процессе-обработчике
+    
+    Args:
+        parsed: результат parse_search_payload
+        
+    Returns:
+        SearchResponse: объект SuccessResponse или ErrorResponse (без исходного HTML)
+    """
+    data = {'status': parsed['status'], 'hasMore': parsed['hasMore'], 'html': ''}
+    
+    if parsed['no_results']:
+        error_message = parsed['error_message'] or ErrorResponse.model_fields['error_message'].default
+        return ErrorResponse(**data, error_message=error_message)
+    
+    channels = [Channel(**dict(zip(CHANNEL_FIELDS, values))) for values in parsed['channels']]
+    return SuccessResponse(**data, channels=channels)
+
+
+# CSRF-токен формы поиска tgstat (поле уже в URL-кодировке)
+SEARCH_TOKEN_FIELD = (
+    '_tgstat_csrk=lAS3AuR5Gtto6yhmkrcy6FPbl3c1zCk-EAS9icI42XTWZ-REgC19mByFYlbE_gKGNYnZAl2Gem4kY-rniBXqMQ%3D%3D'
+)
+
+
+def _flag(value: Any) -> str:
+    """Значение флага формы поиска: True/1 - '1', False/0 - '0', остальное как есть"""
+    if value == False:  # noqa: E712 - 0 и False равнозначны, как и в форме tgstat
+        return "0"
+    if value == True:  # noqa: E712
+        return "1"
+    return str(value)
+
+
+class PayloadTemplate:
+    """
+    Подготовленное тело запроса поиска для одного запроса и набора фильтров
+    
+    Все поля формы, кроме page и offset, один раз приводятся к строкам и кодируются
+    (application/x-www-form-urlencoded, UTF-8), поэтому тело страницы собирается
+    склейкой строк. Поля идут в фиксированном порядке, а незаданные параметры
+    заменяются значениями по умолчанию, так что тело и ключ каноничны: явно
+    переданное значение по умолчанию и его отсутствие дают один ключ.
+    
+        template = PayloadTemplate(**build_search_params('крипто', participantsCountFrom=1000))
+        data = await client.search(template.body(2, 30), template.page_key(2, 30))
+    
+    key - ключ запроса с фильтрами без учета страницы, page_key - ключ страницы
+    для кэша ответов и журнала запуска. CSRF-токен в ключи не входит.
+    """
+    
+    __slots__ = ('fields', 'key', '_digest')
+    
+    def __init__(
+        self,
+        view: str = "",
+        sort: str = "",
+        q: str = "",
+        inAbout: bool = False,
+        categories: str = "",
+        countries: str = "",
+        languages: str = "",
+        age: list[str] = [],
+        err: list[str] = [],
+        engagement_rate: int = 0,
+        channelType: str = "public",
+        male: int = 0,
+        female: int = 0,
+        participantsCountFrom: int = 1,
+        participantsCountTo: int = 1_000_000_000,
+        avgReachFrom: int = 0,
+        avgReachTo: int = 1_000_000_000,
+        avgReach24From: int = 0,
+        avgReach24To: int = 1_000_000_000,
+        ciFrom: int = 0,
+        ciTo: int = 1_000_000_000,
+        isVerified: bool = False,
+        isRknVerified: bool = False,
+        isStoriesAvailable: bool = False,
+        noRedLabel: bool = False,
+        noScam: bool = False,
+        noDead: bool = False,
+    ):
+        self.fields = urllib.parse.urlencode([
+            ('view', view or "list"),
+            ('sort', sort or "participants"),
+            ('q', q),
+            ('inAbout', _flag(inAbout)),
+            ('categories', categories),
+            ('countries', countries),
+            ('languages', languages),
+            ('channelType', channelType),
+            ('age', '-'.join(map(str, age or [0, 120]))),
+            ('err', '-'.join(map(str, err or [0, 100]))),
+            ('er', engagement_rate),
+            ('male', male),
+            ('female', female),
+            ('participantsCountFrom', participantsCountFrom),
+            ('participantsCountTo', participantsCountTo),
+            ('avgReachFrom', avgReachFrom),
+            ('avgReachTo', avgReachTo),
+            ('avgReach24From', avgReach24From),
+            ('avgReach24To', avgReach24To),
+            ('ciFrom', ciFrom),
+            ('ciTo', ciTo),
+            ('isVerified', _flag(isVerified)),
+            ('isRknVerified', _flag(isRknVerified)),
+            ('isStoriesAvailable', _flag(isStoriesAvailable)),
+            ('noRedLabel', _flag(noRedLabel)),
+            ('noScam', _flag(noScam)),
+            ('noDead', _flag(noDead)),
+        ])
+        self._digest = hashlib.sha256(self.fields.encode('ascii'))
+        self.key = self._digest.hexdigest()
+    
+    @classmethod
+    def split(cls, payload_params: Dict[str, Any]) -> Tuple['PayloadTemplate', int, int]:
+        """Шаблон, номер страницы и смещение из параметров build_payload"""
+        params = dict(payload_params)
+        page = params.pop('page', 0)
+        offset = params.pop('offset', 0)
+        return cls(**params), page, offset
+    
+    def body(self, page: int = 0, offset: int = 0) -> str:
+        """Тело запроса страницы"""
+        return f"{SEARCH_TOKEN_FIELD}&{self.fields}&page={int(page)}&offset={int(offset)}"
+    
+    def page_key(self, page: int = 0, offset: int = 0) -> str:
+        """Канонический ключ страницы для кэша ответов и журнала запуска"""
+        digest = self._digest.copy()
+        digest.update(f"&page={int(page)}&offset={int(offset)}".encode('ascii'))
+        return digest.hexdigest()
+
+
+def build_payload(page: int = 0, offset: int = 0, **params) -> str:
+    """
+    Тело запроса одной страницы поиска
+    
+    Для серии страниц одного запроса удобнее один раз создать PayloadTemplate.
+    
+    Args:
+        page: номер страницы
+        offset: смещение
+        **params: параметры формы поиска (см. PayloadTemplate)
+    """
+    return PayloadTemplate(**params).body(page, offset)
+
+
+def payload_cache_key(payload_params: Dict[str, Any]) -> str:
+    """
+    Канонический ключ параметров запроса для кэширования
+    
+    Args:
+        payload_params: параметры для build_payload (включая page и offset)
+        
+    Returns:
+        Хэш канонической формы тела запроса (см. PayloadTemplate.page_key)
+    """
+    template, page, offset = PayloadTemplate.split(payload_params)
+    return template.page_key(page, offset)
 
 
 def save_channels_to_file(channels: List[Channel], filename: str = "channels.json"):
@@ -318,7 +360,7 @@ def load_config(config_file: str = "search_config.json") -> Dict:
     if not os.path.exists(config_file):
         # Если файла нет, создаем его с параметрами по умолчанию
         default_config = {
-            "desc_query": "Список поисковых запросов для поиска каналов (обрабатываются последовательно)",
+            "desc_query": "Список поисковых запросов для поиска каналов (обрабатываются параллельно)",
             "query": ["Crypto", "Finance", "Blockchain"],
             
             "desc_start_offset": "Начальное смещение для пагинации (с какой позиции начинать поиск)",
@@ -333,6 +375,78 @@ def load_config(config_file: str = "search_config.json") -> Dict:
             "desc_delay_seconds": "Задержка между запросами в секундах (чтобы не перегружать сервер)",
             "delay_seconds": 1.5,
             
+            "desc_requests_per_second": "Общий бюджет запросов к tgstat в секунду для всех поисковых запросов (null - использовать delay_seconds)",
+            "requests_per_second": None,
+            
+            "desc_burst": "Сколько запросов можно выполнить подряд без ожидания при накопленном бюджете",
+            "burst": 1,
+            
+            "desc_query_priority": "Приоритеты поисковых запросов в общем бюджете: {\"запрос\": число}, больше - раньше (по умолчанию 0)",
+            "query_priority": {},
+            
+            "desc_concurrency": "Количество одновременно выполняемых запросов страниц (задержка delay_seconds между стартами запросов сохраняется)",
+            "concurrency": 3,
+            
+            "desc_html_parser": "Способ разбора HTML выдачи: auto (lxml, если установлен, иначе stream), lxml, stream или bs4 (эталонный, самый медленный)",
+            "html_parser": "auto",
+            
+            "desc_parse_workers": "Количество процессов для разбора HTML (null - по числу ядер, 0 - разбор в текущем процессе)",
+            "parse_workers": None,
+            
+            "desc_parse_queue_depth": "Сколько ответов может одновременно ожидать разбора (null - удвоенное число процессов); ограничивает расход памяти",
+            "parse_queue_depth": None,
+            
+            "desc_pool_size": "Максимальное количество открытых HTTP-соединений в общем пуле (keep-alive)",
+            "pool_size": 10,
+            
+            "desc_pool_per_host": "Ограничение количества соединений к одному хосту (0 - без ограничения)",
+            "pool_per_host": 0,
+            
+            "desc_request_connect_timeout": "Таймаут подключения к tgstat в секундах",
+            "request_connect_timeout": 10,
+            
+            "desc_request_read_timeout": "Таймаут чтения ответа tgstat в секундах",
+            "request_read_timeout": 30,
+            
+            "desc_request_total_timeout": "Общий таймаут запроса к tgstat в секундах, включая медленную передачу ответа (null - сумма таймаутов подключения и чтения)",
+            "request_total_timeout": None,
+            
+            "desc_request_retries": "Сколько раз повторять запрос при сетевой ошибке, таймауте или ответе 429/5xx",
+            "request_retries": 3,
+            
+            "desc_retry_backoff_base": "Задержка перед первым повтором в секундах (дальше удваивается, со случайным разбросом; не меньше Retry-After)",
+            "retry_backoff_base": 1.0,
+            
+            "desc_retry_backoff_max": "Максимальная задержка перед повтором в секундах",
+            "retry_backoff_max": 60,
+            
+            "desc_breaker_error_rate": "Доля ошибок среди последних breaker_window запросов, при которой все запросы к tgstat приостанавливаются",
+            "breaker_error_rate": 0.5,
+            
+            "desc_breaker_window": "Сколько последних запросов учитывается при подсчете доли ошибок",
+            "breaker_window": 20,
+            
+            "desc_breaker_cooldown": "Длительность паузы всех запросов при всплеске ошибок в секундах",
+            "breaker_cooldown": 60,
+            
+            "desc_retry_failed_pages": "Сколько повторных проходов делать по страницам, не загруженным после всех повторов",
+            "retry_failed_pages": 1,
+            
+            "desc_retry_pass_delay": "Пауза перед повторным проходом в секундах",
+            "retry_pass_delay": 10,
+            
+            "desc_metrics_port": "Порт HTTP-эндпоинта /metrics в формате Prometheus (null - не запускать)",
+            "metrics_port": None,
+            
+            "desc_metrics_host": "Адрес, на котором слушает эндпоинт метрик",
+            "metrics_host": "127.0.0.1",
+            
+            "desc_metrics_json_path": "Файл для снимков метрик в JSON (null - не записывать)",
+            "metrics_json_path": None,
+            
+            "desc_metrics_dump_interval": "Период записи снимков метрик в секундах (0 - только в конце запуска)",
+            "metrics_dump_interval": 30,
+            
             "desc_categories": "Фильтр по категориям каналов (пустая строка - все категории)",
             "categories": "",
             
@@ -342,6 +456,54 @@ def load_config(config_file: str = "search_config.json") -> Dict:
             "desc_languages": "Фильтр по языкам (пустая строка - все языки)",
             "languages": "",
             
+            "desc_cache_enabled": "Сохранять ответы tgstat в локальный кэш и использовать их при повторных запусках",
+            "cache_enabled": True,
+            
+            "desc_cache_path": "Путь к файлу кэша ответов (SQLite)",
+            "cache_path": "cache/responses.sqlite",
+            
+            "desc_cache_ttl_seconds": "Время жизни ответа в кэше в секундах",
+            "cache_ttl_seconds": 21600,
+            
+            "desc_cache_max_mb": "Максимальный размер кэша в мегабайтах (давно не использованные ответы удаляются)",
+            "cache_max_mb": 500,
+            
+            "desc_offline": "Офлайн-режим: брать ответы только из кэша, не обращаясь к tgstat",
+            "offline": False,
+            
+            "desc_dedup_capacity": "Ожидаемое количество уникальных каналов за запуск (размер индекса дедупликации)",
+            "dedup_capacity": 1000000,
+            
+            "desc_check_queue_size": "Сколько найденных каналов может ожидать проверки комментариев; пока очередь заполнена, обработка выдачи приостанавливается",
+            "check_queue_size": 1000,
+            
+            "desc_partition_enabled": "Обходить каждый запрос по интервалам подписчиков, чтобы получить больше результатов, чем tgstat отдает по одному запросу",
+            "partition_enabled": False,
+            
+            "desc_partition_max_results": "Сколько результатов tgstat отдает по одному запросу: интервал с таким числом каналов делится пополам",
+            "partition_max_results": 1000,
+            
+            "desc_partition_min_results": "Соседние интервалы, в которых вместе меньше каналов, объединяются в плане для следующих запусков",
+            "partition_min_results": 100,
+            
+            "desc_partition_plan_path": "Файл с сохраненными планами интервалов (SQLite)",
+            "partition_plan_path": "cache/partitions.sqlite",
+            
+            "desc_delta_mode": "Дельта-режим: сравнивать выдачу с прошлым запуском, останавливать обход на неизменившихся каналах и проверять только новые и изменившиеся",
+            "delta_mode": False,
+            
+            "desc_delta_snapshot_path": "Файл снимка прошлого запуска для дельта-режима (SQLite)",
+            "delta_snapshot_path": "cache/snapshot.sqlite",
+            
+            "desc_delta_stop_after": "Сколько неизменившихся каналов подряд завершают обход запроса в дельта-режиме",
+            "delta_stop_after": 60,
+            
+            "desc_sort": "Сортировка выдачи tgstat (пустая строка - по умолчанию; в дельта-режиме по умолчанию participants)",
+            "sort": "",
+            
+            "desc_state_path": "Файл журнала запусков для продолжения прерванного запуска (python parse.py --resume)",
+            "state_path": "cache/crawl_state.sqlite",
+            
             "desc_subscribers_min": "Минимальное количество подписчиков для фильтрации",
             "subscribers_min": 1000,
             
@@ -351,6 +513,42 @@ def load_config(config_file: str = "search_config.json") -> Dict:
             "desc_is_verified": "Фильтр по верифицированным каналам (true - только верифицированные)",
             "is_verified": False,
             
+            "desc_result_min_avg_post_reach": "Отбор результатов: минимальный средний охват поста (null - без ограничения)",
+            "result_min_avg_post_reach": None,
+            
+            "desc_result_min_citation_index": "Отбор результатов: минимальный индекс цитирования (null - без ограничения)",
+            "result_min_citation_index": None,
+            
+            "desc_result_min_reach_ratio": "Отбор результатов: минимальное отношение охвата к числу подписчиков, например 0.1 (null - без ограничения)",
+            "result_min_reach_ratio": None,
+            
+            "desc_result_sort_by": "Сортировка отобранных каналов по убыванию: subscribers_count, avg_post_reach, citation_index или reach_ratio (null - без сортировки)",
+            "result_sort_by": None,
+            
+            "desc_result_top_per_category": "Сколько каналов оставить в каждой категории (0 - все)",
+            "result_top_per_category": 0,
+            
+            "desc_output_batch_size": "Сколько каналов накапливать перед записью в выходные файлы",
+            "output_batch_size": 100,
+            
+            "desc_output_rotate_records": "Количество каналов в одном NDJSON-файле (0 - один файл на запуск)",
+            "output_rotate_records": 0,
+            
+            "desc_output_legacy_json": "Собирать в конце запуска JSON-массив channels_*.json прежнего формата",
+            "output_legacy_json": True,
+            
+            "desc_output_columnar_format": "Колоночный экспорт результатов: parquet, arrow или null (выключен); требует pyarrow",
+            "output_columnar_format": None,
+            
+            "desc_output_columnar_dir": "Каталог набора данных для колоночного экспорта (каждый запуск - отдельная партиция run=...)",
+            "output_columnar_dir": "output/dataset",
+            
+            "desc_index_enabled": "Добавлять результаты каждого запуска в локальный индекс каналов (поиск: python channel_index.py search)",
+            "index_enabled": True,
+            
+            "desc_index_path": "Файл локального индекса каналов",
+            "index_path": "cache/channel_index.sqlite",
+            
             "desc_output_json": "Имя JSON-файла для сохранения полной информации о каналах (можно использовать {query} для подстановки)",
             "output_json": "{query}_channels.json",
             
@@ -376,45 +574,18 @@ def load_config(config_file: str = "search_config.json") -> Dict:
     return filtered_config
 
 
-def search_all_pages(
-    query: str = "Auto",
-    start_offset: int = 30,
-    verbose: bool = True,
-    **additional_params
-) -> List[Channel]:
+def build_search_params(query: str, **additional_params) -> Dict[str, Any]:
     """
+    Преобразование параметров из конфигурации в параметры build_payload
+    
     Args:
         query: поисковый запрос
-        start_offset: начальное смещение для поиска
-        offset_step: размер шага для смещения (обычно равен количеству результатов на странице)
-        max_pages: игнорируется, функция всегда обрабатывает только первую страницу
-        delay_seconds: задержка между запросами в секундах (не используется)
-        verbose: выводить ли информацию о процессе поиска
-        additional_params: дополнительные параметры для build_payload
+        additional_params: параметры фильтрации из конфигурации
         
     Returns:
-        Список объектов Channel с первой страницы
-    """
-    url = "https://tgstat.com/channels/search"
-    
-    headers = {
-        'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-        'Accept': '*/*',
-        'Sec-Fetch-Site': 'same-origin',
-        'Accept-Language': 'en-US,en;q=0.9',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'Sec-Fetch-Mode': 'cors',
-        'Origin': 'https://tgstat.com',
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/18.3.1 Safari/605.1.15',
-        'Referer': 'https://tgstat.com/channels/search',
-        'X-Requested-With': 'XMLHttpRequest',
-    }
-    
-    # Обработка дополнительных параметров
-    payload_params = {
-        'q': query,
-        'offset': start_offset
-    }
+        Словарь параметров для build_payload (без page/offset)
+    """
+    payload_params = {'q': query}
     
     # Добавляем параметры для фильтрации по количеству подписчиков, если они указаны
     if 'subscribers_min' in additional_params:
@@ -433,63 +604,397 @@ def search_all_pages(
     # Добавляем другие фильтры
     if 'is_verified' in additional_params:
         payload_params['isVerified'] = additional_params['is_verified']
+    if additional_params.get('sort'):
+        payload_params['sort'] = additional_params['sort']
     
-    # Список для хранения найденных каналов
-    all_channels = []
+    return payload_params
+
+
+async def fetch_search_parsed(
+    client: TgstatClient,
+    template: PayloadTemplate,
+    page: int = 0,
+    offset: int = 0,
+    verbose: bool = True,
+    parse_pool: Optional[ParsePool] = None,
+    priority: int = 0
+) -> Optional[Dict[str, Any]]:
+    """
+    Загрузка одной страницы результатов поиска и ее разбор в компактный вид
     
-    # Текущее смещение
-    current_offset = start_offset
+    Args:
+        client: общий HTTP-клиент tgstat
+        template: подготовленное тело запроса с фильтрами
+        page: номер страницы
+        offset: смещение
+        verbose: выводить ли информацию об ошибках
+        parse_pool: пул процессов для разбора (None - разбор в отдельном потоке)
+        priority: приоритет повторов запроса в общем бюджете
+        
+    Returns:
+        Результат parse_search_payload, None если запрос завершился ошибкой
+        
+    Raises:
+        CacheMiss: в офлайн-режиме, если ответа нет в кэше (повтор тут не поможет)
+    """
+    try:
+        # Выполняем запрос (или берем ответ из кэша)
+        data = await client.search(template.body(page, offset), template.page_key(page, offset), priority)
+        
+        # Парсим ответ вне цикла событий, чтобы не блокировать остальные запросы
+        with METRICS.time('parse'):
+            if parse_pool is not None:
+                return await parse_pool.parse(data)
+            return await asyncio.to_thread(parse_search_payload, data)
     
-    # Создаем параметры запроса
-    payload = build_payload(**payload_params)
+    except CacheMiss:
+        raise
+    except aiohttp.ClientError as e:
+        if verbose:
+            print(f"Ошибка при выполнении запроса: {e}")
+    except asyncio.TimeoutError:
+        if verbose:
+            print("Превышено время ожидания ответа tgstat")
+    except Exception as e:
+        if verbose:
+            print(f"Неожиданная ошибка: {e}")
+    
+    return None
+
+
+async def fetch_search_page(
+    client: TgstatClient,
+    payload_params: Dict[str, Any],
+    verbose: bool = True,
+    parse_pool: Optional[ParsePool] = None
+) -> Optional[SearchResponse]:
+    """
+    Загрузка и разбор одной страницы результатов поиска
     
+    Args:
+        client: общий HTTP-клиент tgstat
+        payload_params: параметры для build_payload, включая page и offset
+        verbose: выводить ли информацию об ошибках
+        parse_pool: пул процессов для разбора (None - разбор в отдельном потоке)
+        
+    Returns:
+        SuccessResponse или ErrorResponse, None если запрос завершился ошибкой
+    """
+    template, page, offset = PayloadTemplate.split(payload_params)
     try:
-        # Выполняем запрос
-        response = requests.post(url, data=payload, headers=headers)
-        response.raise_for_status()
+        parsed = await fetch_search_parsed(client, template, page, offset, verbose, parse_pool)
+    except CacheMiss:
+        if verbose:
+            print("Ответа нет в кэше (офлайн-режим)")
+        return None
+    if parsed is None:
+        return None
+    return response_from_parsed(parsed)
+
+
+async def search_query_pages(
+    client: TgstatClient,
+    query: str,
+    start_offset: int = 0,
+    offset_step: int = 30,
+    max_pages: Optional[int] = None,
+    concurrency: int = 1,
+    rate_limiter: Optional[TokenBucket] = None,
+    priority: int = 0,
+    parse_pool: Optional[ParsePool] = None,
+    crawl_state: Optional[CrawlState] = None,
+    snapshot: Optional[SnapshotStore] = None,
+    delta_stop_after: int = 0,
+    failed_offsets: Optional[List[int]] = None,
+    truncated: Optional[List[int]] = None,
+    on_page: Optional[Callable[[List[ChannelRecord]], Awaitable[None]]] = None,
+    verbose: bool = True,
+    **additional_params
+) -> List[ChannelRecord]:
+    """
+    Постраничный обход результатов поиска по одному запросу
+    
+    Страницы запрашиваются параллельно (не более concurrency одновременно),
+    старты запросов разносятся общим ограничителем частоты. Обход прекращается
+    после max_pages страниц, на первой странице с hasMore = false или (в дельта-режиме)
+    после delta_stop_after подряд идущих каналов, не изменившихся с прошлого снимка.
+    
+    Args:
+        client: общий HTTP-клиент tgstat
+        query: поисковый запрос
+        start_offset: начальное смещение для поиска
+        offset_step: размер шага для смещения (количество результатов на странице)
+        max_pages: максимальное количество страниц (None - без ограничений)
+        concurrency: количество одновременно выполняемых запросов страниц
+        rate_limiter: общий ограничитель частоты запросов
+        priority: приоритет запросов этого поиска в общем бюджете (больше - раньше)
+        parse_pool: пул процессов для разбора ответов (None - разбор в отдельном потоке)
+        crawl_state: журнал запуска (обработанные страницы берутся из него без запроса)
+        snapshot: снимок прошлого запуска для дельта-режима (в него записывается граница обхода)
+        delta_stop_after: сколько неизменившихся каналов подряд завершают обход (0 - не останавливаться)
+        failed_offsets: список, в который добавляются смещения страниц, не загруженных после всех повторов
+            (промах кэша в офлайн-режиме сбоем не считается и просто завершает обход)
+        truncated: список, в который добавляется смещение следующей страницы, если обход остановлен
+            на max_pages, а выдача продолжается (hasMore = true)
+        on_page: корутина, которой передаются каналы каждой страницы сразу после ее обработки
+            (без дельта-режима); пока она не завершилась, воркер не запрашивает следующую страницу
+        verbose: выводить ли информацию о процессе поиска
+        additional_params: дополнительные параметры для build_payload
         
-        # Парсим ответ
-        data = response.json()
-        parsed_response = parse_response(data)
+    Returns:
+        Список записей ChannelRecord со всех обработанных страниц в порядке страниц
+    """
+    # Поля запроса кодируются один раз, для страниц меняются только page и offset
+    template = PayloadTemplate(**build_search_params(query, **additional_params))
+    if rate_limiter is None:
+        rate_limiter = RateLimiter()
+    
+    # Каналы, найденные на каждой странице (ключ - номер страницы от начала обхода)
+    pages: Dict[int, List[ChannelRecord]] = {}
+    
+    # Номер следующей страницы для запроса и граница обхода (не включительно)
+    next_page = 0
+    stop_page = max_pages
+    
+    # Номер страницы, на которой выдача закончилась (hasMore = false)
+    last_page = None
+    
+    def unchanged_stop_page() -> Optional[int]:
+        """Граница обхода после серии неизменившихся каналов (по страницам без пропусков от начала)"""
+        streak = 0
+        page = 0
+        while page in pages:
+            for channel in pages[page]:
+                streak = streak + 1 if snapshot.is_unchanged(channel) else 0
+                if streak >= delta_stop_after:
+                    return page + 1
+            page += 1
+        return None
+    
+    async def worker():
+        nonlocal next_page, stop_page, last_page
         
-        # Обрабатываем результаты
-        if isinstance(parsed_response, SuccessResponse):
-            all_channels.extend(parsed_response.channels)
+        while stop_page is None or next_page < stop_page:
+            page = next_page
+            next_page += 1
             
-            if len(parsed_response.channels) > 0 and verbose:
-                print(f"  Последний канал в выборке: {parsed_response.channels[-1].name}")
-        else:
-            # Если ответ содержит ошибку или нет результатов
-            if verbose:
-                if isinstance(parsed_response, ErrorResponse):
-                    print(f"  Ошибка: {parsed_response.error_message}")
+            offset = start_offset + page * offset_step
+            page_number = offset // offset_step if offset_step else page
+            page_key = template.page_key(page_number, offset)
+            
+            # Страница уже обработана в прерванном запуске - берем ее из журнала
+            journaled = crawl_state.get_page(page_key) if crawl_state is not None else None
+            if journaled is not None:
+                has_more, records = journaled
+                parsed = {'hasMore': has_more, 'no_results': False, 'error_message': None}
+                channels = [ChannelRecord.from_dict(record) for record in records]
+            else:
+                await rate_limiter.acquire(priority)
+                
+                # Пока ждали своей очереди, другая страница могла оказаться последней
+                if stop_page is not None and page >= stop_page:
+                    return
+                
+                try:
+                    parsed = await fetch_search_parsed(
+                        client, template, page_number, offset, verbose, parse_pool, priority
+                    )
+                except CacheMiss:
+                    # Офлайн-режим: страницы нет в кэше, повторять ее бессмысленно,
+                    # поэтому она не считается сбоем и обход запроса на ней заканчивается
+                    if verbose:
+                        print(f"  [{query}] Страница {page + 1} (offset {offset}): ответа нет в кэше (офлайн-режим), обход остановлен")
+                    if stop_page is None or page < stop_page:
+                        stop_page = page
+                    return
+                channels = []
+                if parsed is None and failed_offsets is not None:
+                    failed_offsets.append(offset)
+                if parsed is not None:
+                    channels = [ChannelRecord(*values) for values in parsed['channels']]
+                    
+                    # Записываем обработанную страницу в журнал
+                    if crawl_state is not None:
+                        crawl_state.put_page(
+                            page_key, query, offset,
+                            bool(parsed['hasMore']) and not parsed['no_results'],
+                            [channel.to_dict() for channel in channels]
+                        )
+            
+            if parsed is not None and (parsed['no_results'] or not parsed['hasMore']):
+                last_page = page if last_page is None else min(last_page, page)
+            
+            if parsed is not None and not parsed['no_results']:
+                pages[page] = channels
+                if on_page is not None and channels:
+                    await on_page(channels)
+                if verbose:
+                    print(f"  [{query}] Страница {page + 1} (offset {offset}): найдено каналов: {len(channels)}")
+                    if channels:
+                        print(f"  [{query}] Последний канал в выборке: {channels[-1].name}")
+                
+                # Дельта-режим: дальше идут каналы, не изменившиеся с прошлого запуска
+                if snapshot is not None and delta_stop_after > 0:
+                    delta_stop = unchanged_stop_page()
+                    if delta_stop is not None and (stop_page is None or delta_stop < stop_page):
+                        if verbose:
+                            print(f"  [{query}] {delta_stop_after} каналов подряд не изменились, обход остановлен")
+                        stop_page = delta_stop
+                
+                if parsed['hasMore']:
+                    continue
+            elif verbose:
+                # Если ответ содержит ошибку или нет результатов
+                if parsed is not None:
+                    error_message = parsed['error_message'] or ErrorResponse.model_fields['error_message'].default
+                    print(f"  [{query}] Страница {page + 1} (offset {offset}): {error_message}")
                 else:
-                    print("  Неизвестный формат ответа")
+                    print(f"  [{query}] Страница {page + 1} (offset {offset}): не удалось получить результаты")
             
-    except requests.exceptions.RequestException as e:
-        if verbose:
-            print(f"Ошибка при выполнении запроса: {e}")
-    except Exception as e:
-        if verbose:
-            print(f"Неожиданная ошибка: {e}")
+            # Дальше этой страницы результатов нет
+            if stop_page is None or page + 1 < stop_page:
+                stop_page = page + 1
+    
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    
+    # Собираем результаты в порядке страниц, отбрасывая страницы за границей обхода
+    all_channels = []
+    for page in sorted(pages):
+        if stop_page is None or page < stop_page:
+            all_channels.extend(pages[page])
+    
+    # Страницы за концом выдачи повторять не нужно
+    if failed_offsets:
+        failed_offsets[:] = [
+            offset for offset in failed_offsets
+            if stop_page is None or (offset - start_offset) // max(1, offset_step) < stop_page
+        ]
+    
+    # Обход уперся в max_pages, хотя последняя страница сообщила, что результаты есть еще
+    if truncated is not None and max_pages and stop_page == max_pages and last_page is None \
+            and max_pages - 1 in pages:
+        truncated.append(start_offset + max_pages * offset_step)
+    
+    # Запоминаем, какой диапазон подписчиков покрыт обходом
+    if snapshot is not None:
+        exhausted = last_page is not None and (stop_page is None or last_page < stop_page)
+        if exhausted and start_offset == 0:
+            # Выдача пройдена целиком - покрыт весь диапазон фильтра подписчиков
+            snapshot.mark_crawled(
+                query,
+                additional_params.get('subscribers_min', float('-inf')),
+                additional_params.get('subscribers_max', float('inf'))
+            )
+        elif all_channels:
+            counts = [channel.subscribers_count for channel in all_channels]
+            snapshot.mark_crawled(query, min(counts), max(counts))
     
     return all_channels
 
 
-async def check_channel_comments(client, channel_username: str, delay: float = REQUEST_DELAY) -> bool:
+def search_all_pages(
+    query: str = "Auto",
+    start_offset: int = 30,
+    offset_step: int = 30,
+    max_pages: Optional[int] = None,
+    delay_seconds: float = 0,
+    concurrency: int = 1,
+    verbose: bool = True,
+    **additional_params
+) -> List[Channel]:
+    """
+    Args:
+        query: поисковый запрос
+        start_offset: начальное смещение для поиска
+        offset_step: размер шага для смещения (обычно равен количеству результатов на странице)
+        max_pages: максимальное количество страниц для обработки (None - без ограничений)
+        delay_seconds: минимальный интервал между стартами запросов в секундах
+        concurrency: количество одновременно выполняемых запросов страниц
+        verbose: выводить ли информацию о процессе поиска
+        additional_params: дополнительные параметры для build_payload
+        
+    Returns:
+        Список объектов Channel со всех обработанных страниц
+    """
+    async def run():
+        async with TgstatClient(pool_size=max(1, concurrency)) as client:
+            records = await search_query_pages(
+                client,
+                query=query,
+                start_offset=start_offset,
+                offset_step=offset_step,
+                max_pages=max_pages,
+                concurrency=concurrency,
+                rate_limiter=RateLimiter(delay_seconds),
+                verbose=verbose,
+                **additional_params
+            )
+        return [Channel(**record.to_dict()) for record in records]
+    
+    return asyncio.run(run())
+
+
+async def resolve_input_channel(client, channel_username: str, entity_cache: Optional[EntityCache] = None):
+    """
+    Получение InputChannel для юзернейма канала
+    
+    Сначала используется постоянное хранилище entity_cache, затем кэш сущностей
+    сессии Telethon (get_input_entity), и только для незнакомых каналов
+    выполняется запрос ResolveUsername.
+    
+    Args:
+        client: экземпляр TelegramClient
+        channel_username: юзернейм канала без @
+        entity_cache: хранилище username -> (id, access_hash) этой сессии
+    
+    Returns:
+        Кортеж (InputChannel, взят ли он из entity_cache)
+    
+    Raises:
+        TypeError: если юзернейм принадлежит не каналу
+    """
+    if entity_cache is not None:
+        cached = entity_cache.get(channel_username)
+        METRICS.inc('tgstat_cache_requests_total', cache='entities', result='miss' if cached is None else 'hit')
+        if cached is not None:
+            return InputChannel(*cached), True
+    
+    with METRICS.time('resolve'):
+        entity = await client.get_input_entity(f"@{channel_username}")
+    if not isinstance(entity, InputPeerChannel):
+        raise TypeError(f"@{channel_username} не является каналом")
+    
+    if entity_cache is not None:
+        entity_cache.put(channel_username, entity.channel_id, entity.access_hash)
+    return InputChannel(entity.channel_id, entity.access_hash), False
+
+
+async def check_channel_comments(
+    client,
+    channel_username: str,
+    delay: Optional[float] = None,
+    cache: Optional[CommentsCache] = None,
+    rate_controller: Optional[AdaptiveRateController] = None,
+    entity_cache: Optional[EntityCache] = None
+) -> bool:
     """
     Проверяет, включены ли комментарии в телеграм канале
     
     Args:
         client: экземпляр TelegramClient 
         channel_username: юзернейм канала (с @ или без)
-        delay: задержка перед выполнением запроса (предотвращает флуд)
+        delay: задержка перед выполнением запроса (предотвращает флуд; None - request_delay из настроек Telethon)
+        cache: кэш результатов проверки (при актуальной записи запрос не выполняется)
+        rate_controller: общий адаптивный ограничитель (вместо фиксированной задержки delay)
+        entity_cache: хранилище username -> (id, access_hash) для сессии клиента
     
     Returns:
         bool: True если комментарии открыты, False если закрыты, None в случае ошибки
+    
+    Raises:
+        FloodWaitError: Telegram требует паузы; решение о повторе принимает вызывающий код
     """
-    # Добавляем задержку для предотвращения флуда API
-    await asyncio.sleep(delay)
+    load_telethon()
     
     # Убеждаемся, что юзернейм не начинается с @
     if channel_username.startswith('@'):
@@ -500,93 +1005,839 @@ async def check_channel_comments(client, channel_username: str, delay: float = R
         logger.warning(f"Пропуск проверки: невалидный юзернейм '{channel_username}'")
         return None
     
+    # Берем результат из кэша, если он еще актуален
+    if cache is not None:
+        cached = cache.get(channel_username)
+        METRICS.inc('tgstat_cache_requests_total', cache='comments', result='miss' if cached is None else 'hit')
+        if cached is not None:
+            logger.info(f"Канал @{channel_username}: результат проверки взят из кэша")
+            return cached.has_comments
+    
+    # Добавляем задержку для предотвращения флуда API
+    if rate_controller is not None:
+        await rate_controller.acquire()
+    else:
+        await asyncio.sleep(telethon_config.get_settings().request_delay if delay is None else delay)
+    
     try:
         logger.info(f"Проверка комментариев для канала @{channel_username}")
         
-        # Получаем сущность канала
-        channel_entity = await client.get_entity(f"@{channel_username}")
+        # Получаем сущность канала (для известных каналов - без запроса к Telegram)
+        input_channel, from_cache = await resolve_input_channel(client, channel_username, entity_cache)
         
         # Получаем полную информацию о канале
-        full_channel = await client(GetFullChannelRequest(channel=channel_entity))
+        try:
+            with METRICS.time('get_full_channel'):
+                full_channel = await client(GetFullChannelRequest(channel=input_channel))
+        except errors.ChannelInvalidError:
+            if not from_cache:
+                raise
+            # Сохраненный access_hash больше не действителен - разрешаем юзернейм заново
+            entity_cache.discard(channel_username)
+            input_channel, _ = await resolve_input_channel(client, channel_username, entity_cache)
+            with METRICS.time('get_full_channel'):
+                full_channel = await client(GetFullChannelRequest(channel=input_channel))
         
         # Проверяем наличие linked_chat_id
-        has_comments = full_channel.full_chat.linked_chat_id is not None
+        linked_chat_id = full_channel.full_chat.linked_chat_id
+        has_comments = linked_chat_id is not None
+        
+        if cache is not None and cache.ttl > 0:
+            cache.put(channel_username, linked_chat_id=linked_chat_id)
         
         logger.info(f"Канал @{channel_username} {'имеет' if has_comments else 'не имеет'} открытые комментарии")
+        if rate_controller is not None:
+            rate_controller.on_success()
         return has_comments
     
+    except errors.FloodWaitError:
+        raise
+    
+    except PERMANENT_CHECK_ERRORS as e:
+        # Канал не существует или недоступен - запоминаем, чтобы не проверять повторно
+        logger.warning(f"Канал @{channel_username} недоступен: {e}")
+        if cache is not None and cache.negative_ttl > 0:
+            cache.put(channel_username, error=f"{type(e).__name__}: {e}")
+        return None
+    
     except Exception as e:
+        logger.warning(f"Ошибка при проверке канала @{channel_username}: {type(e).__name__}: {e}")
         return None
 
 
-async def check_channels_comments(channels: List[Channel], config: Dict) -> List[Channel]:
+class CommentChecker:
+    """
+    Проверка комментариев для потока каналов
+    
+    Каналы передаются через put по мере того, как их находит поиск, и сразу
+    разбираются обработчиками всех сессий Telethon, поэтому проверка идет
+    параллельно с поиском. Очередь ограничена queue_size каналами: когда она
+    заполнена, put ждет освобождения места, и поиск не уходит далеко вперед
+    проверки. Каналы с уже известным результатом (из снимка или журнала
+    запуска) проходят без запросов к Telegram.
+    
+    Если проверка отключена или ни одна сессия не запустилась, каналы
+    передаются в on_result без изменений.
+    
+        async with CommentChecker(config, on_result=sink.write) as checker:
+            for channel in channels:
+                await checker.put(channel)
+            await checker.join()
+    """
+    
+    def __init__(
+        self,
+        config: Dict,
+        on_result: Optional[Callable[[Channel], None]] = None,
+        crawl_state: Optional[CrawlState] = None,
+        keep_results: bool = False
+    ):
+        """
+        Args:
+            config: конфигурация с параметрами поиска (check_queue_size)
+            on_result: вызывается для каждого канала, попавшего в результат, сразу после его проверки
+            crawl_state: журнал запуска (завершенные проверки берутся из него без запроса)
+            keep_results: сохранять ли каналы результата для join (иначе только считаются)
+        """
+        self.settings = telethon_config.get_settings()
+        self.on_result = on_result
+        self.crawl_state = crawl_state
+        self.keep_results = keep_results
+        self.enabled = False
+        # Каналов передано на проверку, проверено и попало в результат
+        self.total = 0
+        self.checked = 0
+        self.kept = 0
+        self._results: List[Tuple[int, Channel]] = []
+        self._slots = asyncio.Semaphore(max(1, config.get('check_queue_size', 1000)))
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._clients = []
+        self._workers: List[asyncio.Task] = []
+        self._cache = None
+    
+    async def __aenter__(self):
+        await self.start()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+    
+    async def start(self) -> bool:
+        """
+        Запуск сессий Telethon и обработчиков очереди
+        
+        Returns:
+            True, если проверка комментариев будет выполняться
+        """
+        # Проверяем, включена ли проверка комментариев
+        if not self.settings.check_comments:
+            logger.info("Проверка комментариев отключена в конфигурации")
+            return False
+        
+        # Оставляем только сессии с указанными API-ключами
+        sessions = [session for session in self.settings.sessions if session['api_id'] and session['api_hash']]
+        if not sessions:
+            logger.error("API ID или API Hash для Telegram не указаны в конфигурации telethon_settings.json")
+            return False
+        
+        load_telethon()
+        
+        # Кэш результатов предыдущих проверок
+        self._cache = CommentsCache(
+            self.settings.comments_cache_path,
+            ttl=self.settings.comments_cache_ttl,
+            negative_ttl=self.settings.comments_negative_cache_ttl
+        )
+        
+        # Запускаем клиенты по очереди (при первом входе каждый может запросить авторизацию)
+        for session in sessions:
+            # flood_sleep_threshold=0: Telethon не ждет FloodWait молча внутри запроса, а передает
+            # его воркеру - пауза попадает в контроллер частоты сессии, а канал уходит в общую очередь
+            client = TelegramClient(
+                session['session_name'], session['api_id'], session['api_hash'], flood_sleep_threshold=0
+            )
+            try:
+                await client.start()
+            except Exception as e:
+                logger.error(f"Не удалось запустить сессию {session['session_name']}: {e}")
+                continue
+            
+            # У каждой сессии свои лимиты Telegram, поэтому и свой ограничитель частоты
+            rate_controller = AdaptiveRateController(
+                interval=self.settings.request_delay,
+                min_interval=self.settings.min_request_delay,
+                max_interval=self.settings.max_request_delay
+            )
+            entity_cache = EntityCache(
+                self.settings.entity_cache_path, session['session_name'], ttl=self.settings.entity_cache_ttl
+            )
+            self._clients.append((session['session_name'], client, rate_controller, entity_cache))
+            logger.info(f"Telethon клиент {session['session_name']} запущен успешно, "
+                        f"известных каналов: {len(entity_cache)}")
+        
+        if not self._clients:
+            logger.error("Ни одна сессия Telethon не запущена, проверка комментариев пропущена")
+            self._cache.close()
+            self._cache = None
+            return False
+        
+        # Общая очередь: свободные обработчики любой сессии забирают из нее следующий канал
+        self._workers = [
+            asyncio.ensure_future(self._worker(*session_state))
+            for session_state in self._clients
+            for _ in range(max(1, self.settings.max_concurrent_checks))
+        ]
+        self.enabled = True
+        return True
+    
+    @property
+    def queued(self) -> int:
+        """Каналов в очереди и в процессе проверки"""
+        return self.total - self.checked
+    
+    def _finish(self, i: int, channel: Channel, has_comments: Optional[bool]):
+        # Обновляем поле has_comments
+        channel.has_comments = has_comments
+        self.checked += 1
+        
+        # Оставляем канал, если не пропускаем каналы без комментариев
+        # или если у канала есть комментарии
+        if not self.settings.skip_channels_without_comments or has_comments:
+            self.kept += 1
+            if self.keep_results:
+                self._results.append((i, channel))
+            if self.on_result is not None:
+                self.on_result(channel)
+    
+    async def put(self, channel: Channel):
+        """Передача канала на проверку (ждет, пока в очереди не освободится место)"""
+        i = self.total
+        self.total += 1
+        
+        # Проверка не выполняется - канал передается дальше без изменений
+        if not self.enabled:
+            self.checked += 1
+            self.kept += 1
+            if self.keep_results:
+                self._results.append((i, channel))
+            if self.on_result is not None:
+                self.on_result(channel)
+            return
+        
+        # Результат уже известен (канал не изменился с прошлого снимка)
+        if channel.has_comments is not None:
+            self._finish(i, channel, channel.has_comments)
+            return
+        
+        # Проверка уже завершена в прерванном запуске - берем результат из журнала
+        if self.crawl_state is not None:
+            done, has_comments = self.crawl_state.get_check(channel.username)
+            if done:
+                self._finish(i, channel, has_comments)
+                return
+        
+        await self._slots.acquire()
+        self._queue.put_nowait((i, channel, 0))
+    
+    async def _worker(
+        self,
+        session_name: str,
+        client,
+        rate_controller: AdaptiveRateController,
+        entity_cache: EntityCache
+    ):
+        while True:
+            # Пока сессия на паузе после FloodWait, каналы разбирают другие сессии
+            paused = rate_controller.paused_for()
+            if paused > 0:
+                await asyncio.sleep(paused)
+                continue
+            
+            item = await self._queue.get()
+            try:
+                if item is None:
+                    return
+                i, channel, attempt = item
+                logger.info(f"[{session_name}] Обработка канала {i+1}: {channel.username}")
+                
+                try:
+                    has_comments = await check_channel_comments(
+                        client, channel.username, self.settings.request_delay, self._cache, rate_controller, entity_cache
+                    )
+                except errors.FloodWaitError as e:
+                    logger.warning(f"[{session_name}] FloodWait {e.seconds} с при проверке {channel.username} "
+                                   f"(попытка {attempt + 1}/{self.settings.flood_wait_retries + 1})")
+                    rate_controller.on_flood_wait(e.seconds)
+                    METRICS.inc('tgstat_flood_waits_total', session=session_name)
+                    METRICS.inc('tgstat_flood_wait_seconds_total', e.seconds, session=session_name)
+                    
+                    # Возвращаем канал в очередь: его может проверить другая сессия
+                    if attempt < self.settings.flood_wait_retries:
+                        self._queue.put_nowait((i, channel, attempt + 1))
+                        continue
+                    logger.error(f"Канал {channel.username} не проверен: превышено число повторов после FloodWait")
+                    has_comments = None
+                else:
+                    # Неудачные проверки не журналируются и при продолжении выполняются заново
+                    if self.crawl_state is not None and has_comments is not None:
+                        self.crawl_state.put_check(channel.username, has_comments)
+                
+                self._finish(i, channel, has_comments)
+                self._slots.release()
+            finally:
+                self._queue.task_done()
+    
+    async def join(self) -> List[Channel]:
+        """
+        Ожидание проверки всех переданных каналов
+        
+        Returns:
+            Каналы, попавшие в результат, в порядке передачи (пустой список, если keep_results не задан)
+        """
+        if self.enabled and self._workers:
+            # Ошибка в обработчике не должна оставить ожидание висеть
+            drained = asyncio.ensure_future(self._queue.join())
+            await asyncio.wait([drained, *self._workers], return_when=asyncio.FIRST_COMPLETED)
+            for worker in self._workers:
+                if worker.done() and not worker.cancelled() and worker.exception() is not None:
+                    drained.cancel()
+                    raise worker.exception()
+            await drained
+            
+            logger.info(f"Проверка комментариев завершена. Всего каналов: {self.total}, "
+                        f"после фильтрации: {self.kept}, "
+                        f"взято из кэша: {self._cache.hits}")
+            for session_name, _, rate_controller, entity_cache in self._clients:
+                logger.info(f"Сессия {session_name}: FloodWait {rate_controller.flood_waits} "
+                            f"({rate_controller.flood_wait_seconds:.0f} с), "
+                            f"каналов без ResolveUsername: {entity_cache.hits}")
+        
+        return [channel for _, channel in sorted(self._results, key=lambda result: result[0])]
+    
+    async def close(self):
+        """Остановка обработчиков и отключение клиентов"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        
+        # Закрываем клиенты
+        for session_name, client, _, entity_cache in self._clients:
+            await client.disconnect()
+            entity_cache.close()
+            logger.info(f"Telethon клиент {session_name} отключен")
+        self._clients = []
+        if self._cache is not None:
+            self._cache.close()
+            self._cache = None
+        self.enabled = False
+
+
+async def check_channels_comments(
+    channels: List[Channel],
+    config: Dict,
+    on_result: Optional[Callable[[Channel], None]] = None,
+    crawl_state: Optional[CrawlState] = None
+) -> List[Channel]:
     """
     Проверяет наличие открытых комментариев для списка каналов
     
+    Каналы, у которых has_comments уже заполнено, повторно не проверяются.
+    
     Args:
-        channels: список объектов Channel для проверки
+        channels: список объектов Channel (или записей ChannelRecord) для проверки
         config: конфигурация с параметрами поиска
+        on_result: вызывается для каждого канала, попавшего в результат, сразу после его проверки
+        crawl_state: журнал запуска (завершенные проверки берутся из него без запроса)
     
     Returns:
         List[Channel]: список каналов с заполненным полем has_comments, 
-        при SKIP_CHANNELS_WITHOUT_COMMENTS=True возвращаются только каналы с открытыми комментариями
+        при skip_channels_without_comments=True возвращаются только каналы с открытыми комментариями
     """
-    # Проверяем, включена ли проверка комментариев
-    if not CHECK_COMMENTS:
-        logger.info("Проверка комментариев отключена в конфигурации")
-        return channels
+    async with CommentChecker(config, on_result, crawl_state, keep_results=True) as checker:
+        for channel in channels:
+            await checker.put(channel)
+        return await checker.join()
+
+
+def create_request_budget(config: Dict) -> TokenBucket:
+    """
+    Создание глобального бюджета запросов к tgstat из конфигурации
     
-    # Проверяем наличие API-ключей
-    if not API_ID or not API_HASH:
-        logger.error("API ID или API Hash для Telegram не указаны в конфигурации telethon_settings.json")
-        return channels
+    Если задан requests_per_second, используется корзина токенов с этой скоростью
+    и запасом burst. Иначе бюджет выводится из delay_seconds (один запрос
+    за delay_seconds секунд).
     
-    # Создаем клиент Telethon
-    client = TelegramClient(SESSION_NAME, API_ID, API_HASH)
+    Args:
+        config: конфигурация с параметрами поиска
+        
+    Returns:
+        TokenBucket, общий для всех поисковых запросов
+    """
+    if config.get('requests_per_second'):
+        return TokenBucket(rate=config['requests_per_second'], burst=config.get('burst', 1))
+    return RateLimiter(config.get('delay_seconds', 0))
+
+
+async def search_queries(
+    client: TgstatClient,
+    queries: List[str],
+    config: Dict,
+    parse_pool: Optional[ParsePool] = None,
+    crawl_state: Optional[CrawlState] = None,
+    snapshot: Optional[SnapshotStore] = None,
+    planner: Optional[PartitionPlanner] = None,
+    rate_limiter: Optional[TokenBucket] = None
+):
+    """
+    Одновременный поиск по всем запросам в рамках общего бюджета запросов
     
-    try:
-        # Запускаем клиент
-        await client.start()
-        logger.info("Telethon клиент запущен успешно")
+    Каждый запрос выполняется отдельной задачей, все задачи делят один
+    TokenBucket. Приоритет запроса берется из query_priority (по умолчанию 0),
+    поэтому страницы приоритетных запросов получают токены раньше.
+    
+    Если задан planner, диапазон подписчиков каждого запроса разбивается на
+    интервалы, которые обходятся параллельно как независимые задачи.
+    Насыщенный интервал (выдача уперлась в ограничение tgstat или в max_pages)
+    делится пополам и обходится заново по частям.
+    
+    Страницы, не загруженные после всех повторов, после основного прохода
+    запрашиваются еще раз (retry_failed_pages проходов) - обход продолжается
+    с первой незагруженной страницы. Оставшиеся неудачи записываются в crawl_state.
+    
+    Args:
+        client: общий HTTP-клиент tgstat
+        queries: список поисковых запросов
+        config: конфигурация с параметрами поиска
+        parse_pool: пул процессов для разбора ответов
+        crawl_state: журнал запуска для продолжения после сбоя
+        snapshot: снимок прошлого запуска (дельта-режим)
+        planner: планировщик интервалов подписчиков (None - запрос обходится целиком)
+        rate_limiter: общий бюджет запросов (None - создается из конфигурации)
+        
+    Yields:
+        Кортежи (query, channels) с каналами каждой обработанной страницы по мере
+        их появления (в дельта-режиме - с каналами каждого завершенного обхода).
+        Канал может встретиться повторно: в пересекающихся интервалах подписчиков
+        или в других запросах
+    """
+    if rate_limiter is None:
+        rate_limiter = create_request_budget(config)
+    priorities = config.get('query_priority') or {}
+    
+    # Параметры обходов, которые нужно продолжить с незагруженной страницы
+    retry_units: List[Dict[str, Any]] = []
+    
+    # Каналы передаются потребителю сразу после обработки каждой страницы. В дельта-режиме
+    # граница обхода может отсечь уже обработанные страницы, поэтому каналы передаются
+    # после завершения обхода. Очередь ограничена check_queue_size каналов (в страницах):
+    # пока потребитель не успевает (например, заполнена очередь проверки комментариев),
+    # обход приостанавливается
+    stream = snapshot is None
+    results: asyncio.Queue = asyncio.Queue(
+        maxsize=max(1, config.get('check_queue_size', 1000) // max(1, config.get('offset_step', 30)))
+    )
+    
+    async def crawl_unit(params: Dict[str, Any], truncated: Optional[List[int]] = None) -> List[ChannelRecord]:
+        """Обход одной единицы (запрос или интервал подписчиков) с учетом незагруженных страниц"""
+        failed: List[int] = []
         
-        # Список для хранения результатов
-        checked_channels = []
+        async def on_page(channels: List[ChannelRecord]):
+            await results.put((params['query'], channels))
         
-        # Всего каналов для проверки
-        total_channels = len(channels)
+        channels = await search_query_pages(
+            client, **params, failed_offsets=failed, truncated=truncated, on_page=on_page if stream else None
+        )
+        if not stream and channels:
+            await results.put((params['query'], channels))
+        if failed:
+            offset = min(failed)
+            retry_params = {**params, 'start_offset': offset}
+            if params.get('max_pages'):
+                done = (offset - params['start_offset']) // max(1, params.get('offset_step', 30))
+                retry_params['max_pages'] = params['max_pages'] - done
+            retry_units.append(retry_params)
+        return channels
+    
+    async def run_query(query: str):
+        print(f"Поиск по запросу: {query}")
         
-        # Проверяем каждый канал
-        for i, channel in enumerate(channels):
-            logger.info(f"Обработка канала {i+1}/{total_channels}: {channel.username}")
-            
-            # Проверяем наличие комментариев
-            has_comments = await check_channel_comments(client, channel.username, REQUEST_DELAY)
-            
-            # Обновляем поле has_comments
-            channel.has_comments = has_comments
+        # Создаем базовые параметры поиска из конфигурации
+        search_params = {
+            'query': query,
+            'start_offset': config['start_offset'],
+            'rate_limiter': rate_limiter,
+            'priority': priorities.get(query, 0),
+            'parse_pool': parse_pool,
+            'crawl_state': crawl_state,
+            'verbose': True
+        }
+        
+        # Добавляем дополнительные параметры, если они есть в конфигурации
+        for param in ['offset_step', 'max_pages', 'concurrency',
+                     'categories', 'countries', 'languages', 
+                     'subscribers_min', 'subscribers_max', 'is_verified', 'sort']:
+            if param in config:
+                search_params[param] = config[param]
+        
+        # Дельта-режим опирается на выдачу, отсортированную по подписчикам
+        if snapshot is not None:
+            search_params['snapshot'] = snapshot
+            search_params['delta_stop_after'] = config.get('delta_stop_after', 60)
+            search_params['sort'] = config.get('sort') or 'participants'
+        
+        if planner is None:
+            channels = await crawl_unit(search_params)
+            print(f"Обработка запроса '{query}' завершена. Найдено каналов: {len(channels)}")
+            return
+        
+        # Юзернеймы каналов всех интервалов запроса (интервалы насыщенного родителя и его частей пересекаются)
+        found = set()
+        
+        async def crawl_bucket(bucket):
+            low, high = bucket
+            truncated: List[int] = []
+            channels = await crawl_unit({**search_params, 'subscribers_min': low, 'subscribers_max': high}, truncated)
+            found.update(channel.username.lstrip('@').lower() for channel in channels)
             
-            # Добавляем канал в результаты, если не пропускаем каналы без комментариев
-            # или если у канала есть комментарии
-            if not SKIP_CHANNELS_WITHOUT_COMMENTS or has_comments:
-                checked_channels.append(channel)
+            halves = planner.split(bucket) if planner.is_saturated(len(channels), bool(truncated)) else None
+            if halves is None:
+                planner.record(query, bucket, len(channels))
+                return
+            print(f"  [{query}] Интервал подписчиков {low}-{high} насыщен ({len(channels)} каналов), делим пополам")
+            await asyncio.gather(*(crawl_bucket(half) for half in halves))
         
-        logger.info(f"Проверка комментариев завершена. Всего каналов: {total_channels}, "
-                   f"после фильтрации: {len(checked_channels)}")
+        buckets = planner.plan(
+            query,
+            config.get('subscribers_min', 0),
+            config.get('subscribers_max', 1_000_000_000)
+        )
+        print(f"  [{query}] Интервалов подписчиков: {len(buckets)}")
+        await asyncio.gather(*(crawl_bucket(bucket) for bucket in buckets))
+        planner.save(query)
         
-        return checked_channels
+        print(f"Обработка запроса '{query}' завершена. Найдено каналов: {len(found)}")
+    
+    tasks: List[asyncio.Task] = []
+    
+    async def drain(coros):
+        """Передача каналов из очереди результатов, пока не завершатся все задачи coros"""
+        running = [asyncio.ensure_future(coro) for coro in coros]
+        tasks.extend(running)
+        getter = None
+        try:
+            while True:
+                if getter is None:
+                    if results.empty() and all(task.done() for task in running):
+                        break
+                    getter = asyncio.ensure_future(results.get())
+                
+                await asyncio.wait([getter] + [task for task in running if not task.done()],
+                                   return_when=asyncio.FIRST_COMPLETED)
+                
+                # Ошибка в задаче прерывает обход, как и раньше
+                for task in running:
+                    if task.done() and not task.cancelled() and task.exception() is not None:
+                        raise task.exception()
+                
+                if getter.done():
+                    item = getter.result()
+                    getter = None
+                    yield item
+                elif results.empty() and all(task.done() for task in running):
+                    # Все задачи завершились, новых каналов не будет
+                    break
+        finally:
+            if getter is not None:
+                getter.cancel()
+    
+    try:
+        async for item in drain(run_query(query) for query in queries):
+            yield item
+        
+        # Повторные проходы по страницам, не загруженным с первой попытки
+        for _ in range(config.get('retry_failed_pages', 1)):
+            if not retry_units:
+                break
+            units = list(retry_units)
+            retry_units.clear()
+            print(f"Повторный проход: обходов с незагруженными страницами: {len(units)}")
+            await asyncio.sleep(config.get('retry_pass_delay', 10))
+            
+            async for item in drain(crawl_unit(params) for params in units):
+                yield item
         
+        # Оставшиеся неудачи сохраняем: запуск можно будет продолжить через --resume
+        for params in retry_units:
+            print(f"  [{params['query']}] Страница с offset {params['start_offset']} не загружена")
+            if crawl_state is not None:
+                crawl_state.put_failure(params['query'], params['start_offset'])
     finally:
-        # Закрываем клиент
-        await client.disconnect()
-        logger.info("Telethon клиент отключен")
+        # Если потребитель прервал обход, не оставляем висящих задач
+        for task in tasks:
+            task.cancel()
+
+
+async def run_pipeline(
+    config: Dict,
+    queries: List[str],
+    sink: ChannelSink,
+    crawl_state: Optional[CrawlState] = None,
+    snapshot: Optional[SnapshotStore] = None,
+    diff_sink: Optional[ChannelSink] = None
+) -> int:
+    """
+    Параллельный поиск каналов по всем запросам и проверка комментариев в одном цикле событий
+    
+    Каналы передаются на проверку комментариев сразу после разбора страницы,
+    поэтому поиск и проверка идут одновременно. Каналы вне диапазона
+    подписчиков отбрасываются до проверки. Канал, найденный по нескольким
+    запросам, попадает в результат и на проверку один раз, а запросы
+    собираются в его поле queries при закрытии sink. Каналы записываются
+    в sink сразу после проверки (без проверки комментариев - сразу после разбора).
+    
+    В дельта-режиме (задан snapshot) каналы, не изменившиеся с прошлого
+    запуска, не проверяются повторно, каналы ниже границы обхода переносятся
+    из снимка, а изменения записываются в diff_sink.
+    
+    Args:
+        config: конфигурация с параметрами поиска
+        queries: список поисковых запросов
+        sink: потоковая запись результатов
+        crawl_state: журнал запуска для продолжения после сбоя
+        snapshot: снимок прошлого запуска (дельта-режим)
+        diff_sink: запись изменений относительно снимка
+    
+    Returns:
+        int: количество каналов, попавших в результат
+    """
+    # Уже встреченные юзернеймы: канал из нескольких запросов обрабатывается один раз,
+    # а запросы, по которым он нашелся повторно, sink добавляет к записи при закрытии
+    seen = DedupIndex(capacity=config.get('dedup_capacity', 1_000_000))
+    
+    # Дельта-режим: все каналы результата по юзернейму (для обновления снимка) и счетчики изменений
+    current: Dict[str, ChannelRecord] = {}
+    delta_counts = {'added': 0, 'changed': 0, 'removed': 0, 'carried': 0}
+    
+    def write_diff(change: str, username: str, subscribers_count: int, previous: Optional[int] = None):
+        delta_counts[change] += 1
+        if diff_sink is not None:
+            diff_sink.write({
+                'change': change,
+                'username': username,
+                'subscribers_count': subscribers_count,
+                'previous_subscribers_count': previous,
+            })
+    
+    # Фильтр подписчиков применяется до проверки: выдача tgstat может выходить за границы фильтра
+    subscribers_min = config.get('subscribers_min')
+    subscribers_max = config.get('subscribers_max')
+    out_of_range = 0
+    
+    def in_range(channel: ChannelRecord) -> bool:
+        """Попадает ли канал в диапазон подписчиков (0 - число подписчиков не разобрано)"""
+        count = channel.subscribers_count
+        if not count:
+            return True
+        return ((subscribers_min is None or count >= subscribers_min) and
+                (subscribers_max is None or count <= subscribers_max))
+    
+    checker = CommentChecker(config, on_result=sink.write, crawl_state=crawl_state)
+    
+    async def accept(channel: ChannelRecord):
+        """Передача нового (не встречавшегося в этом запуске) канала на проверку или в вывод"""
+        if snapshot is not None and channel.username != "unknown":
+            current[channel.username.lstrip('@').lower()] = channel
+        if checker.settings.check_comments:
+            # Ждет, если очередь проверки заполнена
+            await checker.put(channel)
+        else:
+            # Проверка не нужна - сразу записываем каналы
+            sink.write(channel)
+    
+    # Словарь для статистики
+    channels_by_query = {}
+    
+    # Выбираем способ разбора HTML выдачи
+    set_backend(config.get('html_parser', 'auto'))
+    
+    # Постоянный кэш ответов tgstat
+    cache = None
+    if config.get('cache_enabled', True) or config.get('offline'):
+        cache = ResponseCache(
+            config.get('cache_path', 'cache/responses.sqlite'),
+            ttl=config.get('cache_ttl_seconds', 6 * 3600),
+            max_bytes=int(config.get('cache_max_mb', 500) * 1024 * 1024),
+            offline=config.get('offline', False)
+        )
+        if cache.offline:
+            print("Офлайн-режим: ответы берутся только из кэша")
+    
+    # Разбиение запросов по интервалам подписчиков
+    planner = None
+    if config.get('partition_enabled'):
+        planner = PartitionPlanner(
+            config.get('partition_plan_path', 'cache/partitions.sqlite'),
+            max_results=config.get('partition_max_results', 1000),
+            min_results=config.get('partition_min_results', 100)
+        )
+    
+    # Общий бюджет запросов к tgstat и размыкатель, приостанавливающий его при всплеске ошибок
+    rate_limiter = create_request_budget(config)
+    breaker = CircuitBreaker(
+        rate_limiter,
+        error_rate=config.get('breaker_error_rate', 0.5),
+        window=config.get('breaker_window', 20),
+        cooldown=config.get('breaker_cooldown', 60)
+    )
+    
+    # Сессии Telethon запускаются до поиска: авторизация не прерывает вывод обхода,
+    # а проверка начинается с первыми найденными каналами
+    async with checker:
+        async with TgstatClient(
+            pool_size=config.get('pool_size', 10),
+            pool_per_host=config.get('pool_per_host', 0),
+            cache=cache,
+            connect_timeout=config.get('request_connect_timeout', 10),
+            read_timeout=config.get('request_read_timeout', 30),
+            total_timeout=config.get('request_total_timeout'),
+            retries=config.get('request_retries', 3),
+            backoff_base=config.get('retry_backoff_base', 1.0),
+            backoff_max=config.get('retry_backoff_max', 60),
+            rate_limiter=rate_limiter,
+            breaker=breaker
+        ) as client, ParsePool(
+            workers=config.get('parse_workers'),
+            queue_depth=config.get('parse_queue_depth'),
+            backend=config.get('html_parser', 'auto')
+        ) as parse_pool:
+            # Каналы поступают по мере обработки страниц
+            async for query, channels in search_queries(
+                client, queries, config, parse_pool, crawl_state, snapshot, planner, rate_limiter
+            ):
+                if snapshot is not None:
+                    snapshot.observe(channels)
+                
+                for channel in channels:
+                    if not in_range(channel):
+                        out_of_range += 1
+                        continue
+                    
+                    key = channel.username.lstrip('@').lower()
+                    # Каналы без юзернейма сопоставить нельзя - они не объединяются
+                    if channel.username != "unknown" and not seen.add(key):
+                        sink.add_queries(channel.username, (query,))
+                        if key in current and query not in current[key].queries:
+                            current[key].queries += (query,)
+                        continue
+                    
+                    channel.queries = (query,)
+                    
+                    # Сравнение с прошлым снимком
+                    if snapshot is not None and channel.username != "unknown":
+                        entry = snapshot.get(channel.username)
+                        if entry is None:
+                            write_diff('added', channel.username, channel.subscribers_count)
+                        elif entry.subscribers_count != channel.subscribers_count:
+                            write_diff('changed', channel.username, channel.subscribers_count, entry.subscribers_count)
+                        else:
+                            # Канал не изменился - результат проверки комментариев берем из снимка
+                            channel.has_comments = entry.has_comments
+                    
+                    await accept(channel)
+                
+                # Сохраняем статистику по текущему запросу
+                channels_by_query[query] = channels_by_query.get(query, 0) + len(channels)
+        
+        if client.retried or breaker.opens:
+            print(f"Повторов запросов к tgstat: {client.retried}, пауз из-за всплеска ошибок: {breaker.opens}")
+        
+        if cache is not None:
+            print(f"Кэш ответов: попаданий {cache.hits}, промахов {cache.misses}")
+            cache.close()
+        
+        if planner is not None:
+            print(f"Насыщенных интервалов подписчиков разделено: {planner.splits}")
+            planner.close()
+        
+        if out_of_range:
+            print(f"Каналов вне диапазона подписчиков пропущено: {out_of_range}")
+        if seen.duplicates:
+            print(f"Повторно найденных каналов пропущено: {seen.duplicates}")
+        
+        # Каналы снимка, которые не встретились в этом запуске
+        removed = []
+        if snapshot is not None:
+            carried, removed = snapshot.carry_over()
+            for record in carried:
+                channel = ChannelRecord.from_dict(record)
+                if not in_range(channel):
+                    out_of_range += 1
+                    continue
+                if seen.add(channel.username.lstrip('@').lower()):
+                    delta_counts['carried'] += 1
+                    await accept(channel)
+            for username, entry in removed:
+                write_diff('removed', f"@{username}", entry.subscribers_count)
+            
+            print(f"Изменения с прошлого запуска: новых {delta_counts['added']}, "
+                  f"изменившихся {delta_counts['changed']}, удаленных {delta_counts['removed']}, "
+                  f"перенесено из снимка без обхода {delta_counts['carried']}")
+        
+        # Дожидаемся проверки каналов, оставшихся в очереди
+        if checker.enabled:
+            print("\n" + "="*50)
+            print("ПРОВЕРКА ОТКРЫТЫХ КОММЕНТАРИЕВ")
+            print("="*50)
+            print(f"Проверено во время поиска: {checker.checked}, осталось в очереди: {checker.queued}")
+            
+            await checker.join()
+            
+            if checker.settings.skip_channels_without_comments:
+                print(f"Каналы без комментариев пропущены. Осталось каналов: {checker.kept}")
+    
+    # Снимок обновляется всеми каналами результата, включая отсеянные фильтром комментариев
+    if snapshot is not None:
+        snapshot.save(current.values(), [username for username, _ in removed])
+    
+    return sink.count
 
 
-def main():
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Разбор аргументов командной строки"""
+    parser = argparse.ArgumentParser(description="Поиск Telegram-каналов через tgstat")
+    parser.add_argument(
+        '--resume', nargs='?', const='last', metavar='RUN_ID',
+        help="продолжить прерванный запуск (по умолчанию последний незавершенный)"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
     """Запуск поиска с конфигурацией из JSON-файла"""
+    args = parse_args(argv)
     
     # Загружаем конфигурацию из файла
     config = load_config()
     
+    # Журнал выполненной работы: позволяет продолжить запуск после сбоя
+    crawl_state = CrawlState(config.get('state_path', 'cache/crawl_state.sqlite'))
+    run_id = None
+    if args.resume:
+        resumed_config = crawl_state.resume_run(None if args.resume == 'last' else args.resume)
+        if resumed_config is None:
+            print("Незавершенный запуск не найден, начинаем новый")
+        else:
+            # Продолжаем с той же конфигурацией, с которой запуск был начат
+            config = resumed_config
+            run_id = crawl_state.run_id
+            print(f"Продолжение запуска {run_id}")
+    
+    # Параметры отбора результатов и экспорта проверяем до начала обхода
+    result_options = filter_options(config)
+    if config.get('output_columnar_format') and not columnar_export.is_available():
+        print("pyarrow не установлен (pip install pyarrow), колоночный экспорт будет пропущен")
+    
     # Проверяем, является ли query списком
     queries = config['query']
     if not isinstance(queries, list):
@@ -600,62 +1851,97 @@ def main():
     
     # Генерируем уникальное имя файла на основе текущей даты и времени
     timestamp = time.strftime("%Y%m%d_%H%M%S")
+    if run_id is None:
+        run_id = timestamp
+        crawl_state.start_run(run_id, config)
+    output_ndjson_file = os.path.join(output_dir, f"channels_{timestamp}.ndjson")
     output_json_file = os.path.join(output_dir, f"channels_{timestamp}.json")
     output_txt_file = os.path.join(output_dir, f"usernames_{timestamp}.txt")
     
-    # Список для хранения всех найденных каналов
-    all_channels = []
+    # Каналы и юзернеймы дописываются в файлы по мере получения результатов
+    sink = ChannelSink(
+        output_ndjson_file,
+        output_txt_file,
+        batch_size=config.get('output_batch_size', 100),
+        rotate_records=config.get('output_rotate_records', 0)
+    )
     
-    # Словарь для статистики
-    channels_by_query = {}
+    # Дельта-режим: сравнение с результатами прошлого запуска
+    snapshot = None
+    diff_sink = None
+    if config.get('delta_mode'):
+        snapshot = SnapshotStore(config.get('delta_snapshot_path', 'cache/snapshot.sqlite'))
+        diff_sink = ChannelSink(os.path.join(output_dir, f"diff_{timestamp}.ndjson"))
+        print(f"Дельта-режим: каналов в прошлом снимке: {len(snapshot)}")
     
-    # Обрабатываем каждый запрос последовательно
-    for query in queries:
-        print(f"\n{'='*50}")
-        print(f"Поиск по запросу: {query}")
-        print(f"{'='*50}")
-        
-        # Создаем базовые параметры поиска из конфигурации
-        search_params = {
-            'query': query,
-            'start_offset': config['start_offset'],
-            'verbose': True
-        }
-        
-        # Добавляем дополнительные параметры, если они есть в конфигурации
-        for param in ['categories', 'countries', 'languages', 
-                     'subscribers_min', 'subscribers_max', 'is_verified']:
-            if param in config:
-                search_params[param] = config[param]
-        
-        # Выполняем поиск для текущего запроса
-        channels = search_all_pages(**search_params)
-        
-        # Сохраняем найденные каналы в общий список
-        all_channels.extend(channels)
-        
-        # Сохраняем статистику по текущему запросу
-        channels_by_query[query] = len(channels)
-        
-        print(f"Обработка запроса '{query}' завершена. Найдено каналов: {len(channels)}")
+    # Поиск и проверка комментариев выполняются в одном цикле событий, метрики экспортируются на время работы
+    async def run() -> int:
+        async with metrics.exporters(
+            port=config.get('metrics_port'),
+            host=config.get('metrics_host', '127.0.0.1'),
+            json_path=config.get('metrics_json_path'),
+            interval=config.get('metrics_dump_interval', 30)
+        ):
+            return await run_pipeline(config, queries, sink, crawl_state, snapshot, diff_sink)
     
-    # Проверяем наличие открытых комментариев, если это требуется
-    if CHECK_COMMENTS:
-        print("\n" + "="*50)
-        print("ПРОВЕРКА ОТКРЫТЫХ КОММЕНТАРИЕВ")
-        print("="*50)
-        
-        # Запускаем асинхронную функцию проверки комментариев
-        all_channels = asyncio.run(check_channels_comments(all_channels, config))
-        
-        if SKIP_CHANNELS_WITHOUT_COMMENTS:
-            print(f"Каналы без комментариев пропущены. Осталось каналов: {len(all_channels)}")
+    try:
+        total_channels = asyncio.run(run())
+    finally:
+        sink.close()
+        if snapshot is not None:
+            diff_sink.close()
+            snapshot.close()
     
-    # Сохраняем все каналы в один JSON-файл
-    save_channels_to_file(all_channels, output_json_file)
+    # Запуск с незагруженными страницами остается незавершенным, чтобы его можно было продолжить
+    failures = crawl_state.failures()
+    if failures:
+        print(f"Не загружено страниц: {len(failures)}. Продолжить запуск: python parse.py --resume {run_id}")
+    else:
+        crawl_state.finish_run()
+    if crawl_state.replayed_pages or crawl_state.replayed_checks:
+        print(f"Взято из журнала прерванного запуска: страниц {crawl_state.replayed_pages}, "
+              f"проверок {crawl_state.replayed_checks}")
+    crawl_state.close()
+    
+    output_files = sink.segments + [output_txt_file]
+    if diff_sink is not None:
+        output_files += diff_sink.segments
+    
+    # Отбор и сортировка результатов по параметрам result_*
+    if has_filters(result_options):
+        output_filtered_file = os.path.join(output_dir, f"channels_{timestamp}_filtered.ndjson")
+        selected = write_records(select(list(sink.records()), result_options), output_filtered_file)
+        output_files.append(output_filtered_file)
+        print(f"Отобрано каналов: {selected} из {sink.count}")
     
-    # Сохраняем все юзернеймы в один TXT-файл
-    save_usernames_to_txt(all_channels, output_txt_file)
+    # Локальный индекс каналов всех запусков: поиск по найденному без обращения к tgstat
+    if config.get('index_enabled', True):
+        index = ChannelIndex(config.get('index_path', 'cache/channel_index.sqlite'))
+        try:
+            index.update(sink.records())
+            print(f"Локальный индекс обновлен, каналов в индексе: {len(index)}")
+        finally:
+            index.close()
+    
+    # Собираем JSON-массив прежнего формата, если он нужен
+    if config.get('output_legacy_json', True):
+        sink.export_json(output_json_file)
+        output_files.append(output_json_file)
+        print(f"Данные сохранены в файл {output_json_file}")
+    
+    # Колоночный экспорт: одна партиция на запуск в общем наборе данных
+    columnar_format = config.get('output_columnar_format')
+    if columnar_format:
+        columnar_file = columnar_export.export_columnar(
+            sink.records(),
+            config.get('output_columnar_dir', 'output/dataset'),
+            run_id,
+            Channel,
+            fmt=columnar_format
+        )
+        if columnar_file is not None:
+            output_files.append(columnar_file)
+            print(f"Данные сохранены в файл {columnar_file}")
     
     # Выводим общую статистику по всем запросам
     print("\n" + "="*50)
@@ -663,9 +1949,18 @@ def main():
     print("="*50)
     
     print(f"Всего обработано запросов: {len(queries)}")
-    print(f"Общее количество найденных каналов: {len(all_channels)}")
-    print(f"Результаты сохранены в файлы: {output_json_file} и {output_txt_file}")
+    print(f"Общее количество найденных каналов: {total_channels}")
+    print(f"Результаты сохранены в файлы: {', '.join(output_files)}")
+    
+    # Где было потрачено время: по этапам конвейера
+    summary = METRICS.summary_lines()
+    if summary:
+        print("\nВремя по этапам:")
+        for line in summary:
+            print(f"  {line}")
+    if config.get('metrics_json_path'):
+        print(f"Метрики сохранены в файл {config['metrics_json_path']}")
 
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,75 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+
+from html_extract import parse_search_payload, resolve_backend
+
+
+class ParsePool:
+    """
+    Пул процессов для разбора ответов поиска.
+
+    Сетевые запросы выполняются в цикле событий, а разбор HTML - в отдельных
+    процессах, поэтому загрузка следующих страниц не ждет разбора предыдущих
+    и разбор использует все ядра. Количество одновременно разбираемых ответов
+    ограничено queue_depth: корутина, получившая страницу, ждет свободного
+    места и не запрашивает новую, поэтому в памяти одновременно находится
+    не больше queue_depth сырых ответов.
+
+        async with ParsePool(workers=4) as parse_pool:
+            parsed = await parse_pool.parse(data)
+    """
+
+    def __init__(self, workers: Optional[int] = None, queue_depth: Optional[int] = None, backend: Optional[str] = None):
+        """
+        Args:
+            workers: количество процессов (None - по числу ядер, 0 - разбор в потоке текущего процесса)
+            queue_depth: максимум ответов в разборе одновременно (None - удвоенное число процессов)
+            backend: имя бэкенда разбора HTML (None - бэкенд по умолчанию)
+        """
+        self.workers = (os.cpu_count() or 1) if workers is None else max(0, workers)
+        self.queue_depth = queue_depth or max(1, self.workers) * 2
+        self.backend = resolve_backend(backend)
+        self._executor = None
+        self._slots = None
+
+    async def __aenter__(self):
+        self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def open(self):
+        """Запуск процессов-обработчиков"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.queue_depth)
+        if self._executor is None and self.workers > 0:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    async def close(self):
+        """Остановка процессов-обработчиков"""
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.to_thread(executor.shutdown, True, cancel_futures=True)
+
+    async def parse(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Разбор JSON ответа поиска
+
+        Args:
+            data: JSON-данные ответа API
+
+        Returns:
+            Результат parse_search_payload
+        """
+        if self._slots is None:
+            self.open()
+
+        async with self._slots:
+            if self._executor is None:
+                return await asyncio.to_thread(parse_search_payload, data, self.backend)
+
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, parse_search_payload, data, self.backend)
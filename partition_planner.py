@@ -0,0 +1,153 @@
+import math
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+Bucket = Tuple[int, int]
+
+
+class PartitionPlanner:
+    """
+    Разбиение диапазона подписчиков запроса на независимые интервалы.
+
+    tgstat отдает по одному запросу ограниченное число результатов, поэтому
+    большой запрос обходится по интервалам participantsCountFrom/To. Интервал,
+    выдача которого упирается в max_results или обход которого остановлен
+    ограничением числа страниц, считается насыщенным и делится
+    пополам (по логарифмической шкале - распределение подписчиков сильно
+    смещено к малым каналам). После запуска соседние интервалы, в которых
+    вместе меньше min_results каналов, объединяются. Итоговый план
+    сохраняется, и следующий запуск сразу начинает с него.
+    """
+
+    def __init__(self, path: str, max_results: int = 1000, min_results: int = 100):
+        """
+        Args:
+            path: путь к файлу базы SQLite с планами
+            max_results: сколько результатов отдает tgstat по одному запросу
+            min_results: интервалы с меньшим числом каналов объединяются с соседними
+        """
+        self.path = path
+        self.max_results = max_results
+        self.min_results = min_results
+        self.splits = 0
+        # Число каналов в каждом обойденном ненасыщенном интервале по запросам
+        self._counts: Dict[str, Dict[Bucket, int]] = {}
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            " query TEXT NOT NULL,"
+            " low INTEGER NOT NULL,"
+            " high INTEGER NOT NULL,"
+            " count INTEGER NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (query, low))"
+        )
+        self._db.commit()
+
+    def plan(self, query: str, low: int, high: int) -> List[Bucket]:
+        """
+        Интервалы для обхода запроса
+
+        Сохраненный план обрезается по [low, high], непокрытые края
+        добавляются отдельными интервалами.
+
+        Args:
+            query: поисковый запрос
+            low: нижняя граница подписчиков (включительно)
+            high: верхняя граница подписчиков (включительно)
+        """
+        rows = self._db.execute(
+            "SELECT low, high FROM buckets WHERE query = ? AND high >= ? AND low <= ? ORDER BY low",
+            (query, low, high)
+        ).fetchall()
+
+        buckets = []
+        position = low
+        for bucket_low, bucket_high in rows:
+            bucket_low, bucket_high = max(bucket_low, position), min(bucket_high, high)
+            if bucket_low > bucket_high:
+                continue
+            if bucket_low > position:
+                buckets.append((position, bucket_low - 1))
+            buckets.append((bucket_low, bucket_high))
+            position = bucket_high + 1
+        if position <= high:
+            buckets.append((position, high))
+        return buckets
+
+    def is_saturated(self, count: int, truncated: bool = False) -> bool:
+        """
+        Уперлась ли выдача интервала в ограничение tgstat или в ограничение обхода
+
+        Args:
+            count: сколько каналов получено по интервалу
+            truncated: обход остановлен на max_pages, хотя выдача продолжается
+        """
+        return truncated or (self.max_results > 0 and count >= self.max_results)
+
+    def split(self, bucket: Bucket) -> Optional[Tuple[Bucket, Bucket]]:
+        """
+        Деление интервала пополам по логарифмической шкале
+
+        Returns:
+            Два интервала или None, если интервал делить некуда
+        """
+        low, high = bucket
+        if high <= low:
+            return None
+
+        middle = int(math.sqrt(max(low, 1) * high))
+        if not low <= middle < high:
+            middle = (low + high) // 2
+        self.splits += 1
+        return (low, middle), (middle + 1, high)
+
+    def record(self, query: str, bucket: Bucket, count: int):
+        """Учет обойденного интервала, который больше не делится"""
+        self._counts.setdefault(query, {})[bucket] = count
+
+    def save(self, query: str):
+        """
+        Сохранение плана запроса: соседние разреженные интервалы объединяются
+
+        Объединяются только интервалы без разрывов между ними и только пока
+        их общее число каналов меньше min_results.
+        """
+        counts = self._counts.pop(query, {})
+        merged: List[List[int]] = []
+        for (low, high), count in sorted(counts.items()):
+            if merged:
+                previous = merged[-1]
+                if previous[1] + 1 == low and previous[2] + count < self.min_results:
+                    previous[1] = high
+                    previous[2] += count
+                    continue
+            merged.append([low, high, count])
+
+        if not merged:
+            return
+
+        now = time.time()
+        # Заменяем старые интервалы в обойденном диапазоне
+        self._db.execute(
+            "DELETE FROM buckets WHERE query = ? AND high >= ? AND low <= ?",
+            (query, merged[0][0], merged[-1][1])
+        )
+        self._db.executemany(
+            "INSERT OR REPLACE INTO buckets (query, low, high, count, updated_at) VALUES (?, ?, ?, ?, ?)",
+            [(query, low, high, count, now) for low, high, count in merged]
+        )
+        self._db.commit()
+
+    def close(self):
+        """Закрытие базы"""
+        self._db.close()
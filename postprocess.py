@@ -0,0 +1,260 @@
+import argparse
+import json
+import math
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# numpy - необязательная зависимость; импортируется при первом отборе (_load_numpy),
+# так как результаты отбираются только при заданных параметрах result_*
+np = None
+_numpy_loaded = False
+
+# Ключи, по которым можно сортировать результаты
+SORT_KEYS = ('subscribers_count', 'avg_post_reach', 'citation_index', 'reach_ratio')
+
+# Параметры отбора в конфигурации и их значения по умолчанию (None - не применяется)
+FILTER_DEFAULTS = {
+    'result_min_avg_post_reach': None,
+    'result_min_citation_index': None,
+    'result_min_reach_ratio': None,
+    'result_sort_by': None,
+    'result_top_per_category': 0,
+}
+
+
+def _load_numpy():
+    """Импорт numpy при первом обращении (None, если numpy не установлен)"""
+    global np, _numpy_loaded
+    if not _numpy_loaded:
+        _numpy_loaded = True
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        np = numpy
+    return np
+
+
+def filter_options(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Параметры отбора результатов из конфигурации
+
+    Raises:
+        ValueError: если result_sort_by не входит в SORT_KEYS
+    """
+    options = {key: config.get(key, default) for key, default in FILTER_DEFAULTS.items()}
+    if options['result_sort_by'] is not None and options['result_sort_by'] not in SORT_KEYS:
+        raise ValueError(f"Неизвестный ключ сортировки result_sort_by: {options['result_sort_by']} "
+                         f"(допустимы: {', '.join(SORT_KEYS)})")
+    return options
+
+
+def has_filters(options: Dict[str, Any]) -> bool:
+    """Задан ли хотя бы один параметр отбора или сортировки"""
+    return any(options[key] for key in FILTER_DEFAULTS)
+
+
+def read_records(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Чтение каналов из результата запуска
+
+    Args:
+        path: путь к NDJSON (channels_*.ndjson) или JSON-массиву (channels_*.json)
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.json'):
+            yield from json.load(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def load_columns(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Загрузка метрик каналов в столбцы
+
+    Отсутствующие метрики представлены NaN. Категории кодируются целыми
+    числами. При наличии numpy столбцы - массивы numpy, иначе списки.
+
+    Returns:
+        Словарь столбцов subscribers_count, avg_post_reach, citation_index,
+        reach_ratio и category
+    """
+    _load_numpy()
+
+    def metric(record: Dict[str, Any], key: str) -> float:
+        value = record.get(key)
+        return math.nan if value is None else float(value)
+
+    subscribers = [float(record.get('subscribers_count') or 0) for record in records]
+    reach = [metric(record, 'avg_post_reach_value') for record in records]
+    citation = [metric(record, 'citation_index_value') for record in records]
+
+    category_codes: Dict[Optional[str], int] = {}
+    categories = [category_codes.setdefault(record.get('category'), len(category_codes)) for record in records]
+
+    if np is not None:
+        subscribers = np.array(subscribers, dtype=np.float64)
+        reach = np.array(reach, dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where(subscribers > 0, reach / subscribers, np.nan)
+        return {
+            'subscribers_count': subscribers,
+            'avg_post_reach': reach,
+            'citation_index': np.array(citation, dtype=np.float64),
+            'reach_ratio': ratio,
+            'category': np.array(categories, dtype=np.int64),
+        }
+
+    return {
+        'subscribers_count': subscribers,
+        'avg_post_reach': reach,
+        'citation_index': citation,
+        'reach_ratio': [r / s if s > 0 else math.nan for r, s in zip(reach, subscribers)],
+        'category': categories,
+    }
+
+
+def _select_numpy(columns: Dict[str, Any], options: Dict[str, Any]) -> List[int]:
+    mask = np.ones(len(columns['category']), dtype=bool)
+    # Сравнение с NaN ложно, поэтому каналы без метрики отбрасываются заданным порогом
+    if options['result_min_avg_post_reach'] is not None:
+        mask &= columns['avg_post_reach'] >= options['result_min_avg_post_reach']
+    if options['result_min_citation_index'] is not None:
+        mask &= columns['citation_index'] >= options['result_min_citation_index']
+    if options['result_min_reach_ratio'] is not None:
+        mask &= columns['reach_ratio'] >= options['result_min_reach_ratio']
+    indices = np.flatnonzero(mask)
+
+    sort_by = options['result_sort_by']
+    if sort_by is not None:
+        # По убыванию, каналы без значения - в конце
+        indices = indices[np.argsort(-columns[sort_by][indices], kind='stable')]
+
+    top = options['result_top_per_category']
+    if top and len(indices):
+        # Группируем по категории, сохраняя порядок внутри группы, и нумеруем каналы в группе
+        order = np.argsort(columns['category'][indices], kind='stable')
+        grouped = columns['category'][indices][order]
+        starts = np.flatnonzero(np.r_[True, grouped[1:] != grouped[:-1]])
+        sizes = np.diff(np.r_[starts, len(grouped)])
+        rank = np.arange(len(grouped)) - np.repeat(starts, sizes)
+        keep = np.zeros(len(indices), dtype=bool)
+        keep[order[rank < top]] = True
+        indices = indices[keep]
+
+    return indices.tolist()
+
+
+def _select_python(columns: Dict[str, Any], options: Dict[str, Any]) -> List[int]:
+    thresholds = [
+        (columns['avg_post_reach'], options['result_min_avg_post_reach']),
+        (columns['citation_index'], options['result_min_citation_index']),
+        (columns['reach_ratio'], options['result_min_reach_ratio']),
+    ]
+    thresholds = [(column, minimum) for column, minimum in thresholds if minimum is not None]
+    indices = [
+        i for i in range(len(columns['category']))
+        if all(column[i] >= minimum for column, minimum in thresholds)
+    ]
+
+    sort_by = options['result_sort_by']
+    if sort_by is not None:
+        column = columns[sort_by]
+        indices.sort(key=lambda i: (math.isnan(column[i]), -column[i] if not math.isnan(column[i]) else 0))
+
+    top = options['result_top_per_category']
+    if top:
+        taken: Dict[int, int] = {}
+        kept = []
+        for i in indices:
+            category = columns['category'][i]
+            if taken.get(category, 0) < top:
+                taken[category] = taken.get(category, 0) + 1
+                kept.append(i)
+        indices = kept
+
+    return indices
+
+
+def select(records: List[Dict[str, Any]], options: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Отбор и сортировка каналов по параметрам result_* из конфигурации
+
+    Пороги result_min_* отбрасывают каналы с меньшим значением метрики
+    (и каналы, у которых метрики нет). result_sort_by сортирует по убыванию.
+    result_top_per_category оставляет первые N каналов каждой категории
+    в порядке сортировки (или в исходном порядке, если сортировка не задана).
+
+    Args:
+        records: каналы в виде словарей с полями Channel
+        options: результат filter_options
+
+    Returns:
+        Отобранные каналы в итоговом порядке
+    """
+    if not records:
+        return []
+    columns = load_columns(records)
+    indices = _select_numpy(columns, options) if np is not None else _select_python(columns, options)
+    return [records[i] for i in indices]
+
+
+def write_records(records: Iterable[Dict[str, Any]], path: str) -> int:
+    """Запись каналов в NDJSON, возвращает количество записанных каналов"""
+    count = 0
+    tmp_path = path + '.part'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+def postprocess_file(path: str, config: Dict[str, Any], output_path: Optional[str] = None) -> Optional[str]:
+    """
+    Отбор каналов из файла результатов запуска
+
+    Args:
+        path: NDJSON или JSON с каналами
+        config: конфигурация с параметрами result_*
+        output_path: итоговый NDJSON (по умолчанию - рядом с исходным, с суффиксом _filtered)
+
+    Returns:
+        Путь к итоговому файлу или None, если параметры отбора не заданы
+    """
+    options = filter_options(config)
+    if not has_filters(options):
+        return None
+
+    if output_path is None:
+        base, _ = os.path.splitext(path)
+        output_path = f"{base}_filtered.ndjson"
+
+    records = list(read_records(path))
+    selected = select(records, options)
+    write_records(selected, output_path)
+    print(f"Отобрано каналов: {len(selected)} из {len(records)}, результат сохранен в {output_path}")
+    return output_path
+
+
+def main(argv: Optional[List[str]] = None):
+    """Отбор каналов из результатов прошлых запусков с параметрами из search_config.json"""
+    parser = argparse.ArgumentParser(description="Отбор и сортировка каналов из результатов запуска")
+    parser.add_argument('paths', nargs='+', help="файлы channels_*.ndjson или channels_*.json")
+    parser.add_argument('-c', '--config', default='search_config.json', help="файл конфигурации")
+    args = parser.parse_args(argv)
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    for path in args.paths:
+        if postprocess_file(path, config) is None:
+            print("Параметры отбора result_* в конфигурации не заданы")
+            return
+
+
+if __name__ == '__main__':
+    main()
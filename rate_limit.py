@@ -0,0 +1,237 @@
+import asyncio
+import collections
+import heapq
+import itertools
+
+
+class TokenBucket:
+    """
+    Глобальный бюджет запросов в виде корзины токенов с приоритетами.
+
+    Токены пополняются со скоростью rate в секунду (не больше burst накопленных).
+    Каждый запрос забирает один токен. Если токенов нет, ожидающие обслуживаются
+    в порядке приоритета (больше priority - раньше), при равном приоритете -
+    в порядке поступления. rate <= 0 означает отсутствие ограничения.
+
+    Выдачу токенов можно приостановить (pause), например при всплеске ошибок.
+    """
+
+    def __init__(self, rate: float = 0.0, burst: int = 1):
+        self.rate = float(rate or 0)
+        self.burst = max(1, int(burst or 1))
+        self._tokens = float(self.burst)
+        self._updated = None
+        self._paused_until = 0.0
+        self._waiters = []
+        self._counter = itertools.count()
+        self._dispatcher = None
+
+    async def acquire(self, priority: int = 0):
+        """
+        Ожидание токена для очередного запроса
+
+        Args:
+            priority: приоритет запроса (больше - раньше)
+        """
+        if self.rate <= 0:
+            paused = self.paused_for()
+            if paused > 0:
+                await asyncio.sleep(paused)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (-priority, next(self._counter), future))
+
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+        await future
+
+    def pause(self, seconds: float):
+        """
+        Приостановка выдачи токенов
+
+        После паузы накопленный запас не используется: запросы возобновляются
+        с базовой скоростью, без пачки из burst запросов.
+
+        Args:
+            seconds: длительность паузы
+        """
+        loop = asyncio.get_running_loop()
+        self._paused_until = max(self._paused_until, loop.time() + seconds)
+        self._tokens = 0.0
+        self._updated = None
+
+    def paused_for(self) -> float:
+        """Сколько секунд еще продлится пауза (0 - паузы нет)"""
+        return max(0.0, self._paused_until - asyncio.get_running_loop().time())
+
+    def _refill(self, now: float):
+        """Пополнение токенов за время, прошедшее с последнего обновления"""
+        if self._updated is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def _dispatch(self):
+        """Выдача токенов ожидающим по мере их пополнения"""
+        loop = asyncio.get_running_loop()
+
+        while self._waiters:
+            paused = self._paused_until - loop.time()
+            if paused > 0:
+                await asyncio.sleep(paused)
+                continue
+
+            self._refill(loop.time())
+
+            if self._tokens >= 1:
+                _, _, future = heapq.heappop(self._waiters)
+                # Ожидающий мог быть отменен, пока стоял в очереди
+                if future.done():
+                    continue
+                self._tokens -= 1
+                future.set_result(None)
+            else:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class RateLimiter(TokenBucket):
+    """
+    Общий ограничитель частоты запросов.
+
+    Гарантирует, что между стартами двух соседних запросов проходит не меньше
+    interval секунд, независимо от того, сколько корутин одновременно
+    ожидают разрешения.
+    """
+
+    def __init__(self, interval: float = 0.0):
+        interval = max(0.0, float(interval or 0))
+        super().__init__(rate=1 / interval if interval > 0 else 0, burst=1)
+        self.interval = interval
+
+
+class AdaptiveRateController:
+    """
+    Адаптивный ограничитель частоты запросов к Telegram.
+
+    Интервал между стартами запросов меняется по схеме AIMD: после серии
+    успешных запросов он плавно уменьшается (до min_interval), а при
+    FloodWaitError все запросы приостанавливаются на указанное Telegram время,
+    и интервал увеличивается в backoff раз (до max_interval).
+    """
+
+    def __init__(
+        self,
+        interval: float = 1.0,
+        min_interval: float = 0.0,
+        max_interval: float = 60.0,
+        backoff: float = 2.0,
+        ramp_factor: float = 0.9,
+        ramp_up_after: int = 10
+    ):
+        """
+        Args:
+            interval: начальный интервал между запросами в секундах
+            min_interval: минимальный интервал (максимальная скорость)
+            max_interval: максимальный интервал после замедлений
+            backoff: во сколько раз увеличивать интервал при FloodWait
+            ramp_factor: множитель интервала при ускорении
+            ramp_up_after: сколько успешных запросов подряд нужно для ускорения
+        """
+        self.min_interval = max(0.0, min_interval)
+        self.max_interval = max(self.min_interval, max_interval)
+        self.interval = min(max(interval, self.min_interval), self.max_interval)
+        self.backoff = backoff
+        self.ramp_factor = ramp_factor
+        self.ramp_up_after = ramp_up_after
+        self.flood_waits = 0
+        self.flood_wait_seconds = 0.0
+        self._successes = 0
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Ожидание очередного слота для запроса с учетом паузы после FloodWait"""
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                # Пауза могла начаться, пока мы ждали слота
+                wait = max(self._next_slot, self._paused_until) - now
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            self._next_slot = now + self.interval
+
+    def paused_for(self) -> float:
+        """Сколько секунд еще продлится пауза после FloodWait (0 - паузы нет)"""
+        return max(0.0, self._paused_until - asyncio.get_running_loop().time())
+
+    def on_success(self):
+        """Учет успешного запроса: после серии успехов интервал уменьшается"""
+        self._successes += 1
+        if self._successes >= self.ramp_up_after:
+            self._successes = 0
+            self.interval = max(self.min_interval, self.interval * self.ramp_factor)
+
+    def on_flood_wait(self, seconds: float):
+        """
+        Учет FloodWaitError: пауза для всех запросов и увеличение интервала
+
+        Args:
+            seconds: время ожидания, которое потребовал Telegram
+        """
+        loop = asyncio.get_running_loop()
+        self._successes = 0
+        self.flood_waits += 1
+        self.flood_wait_seconds += seconds
+        self._paused_until = max(self._paused_until, loop.time() + seconds)
+        self.interval = min(self.max_interval, max(self.interval, self.min_interval, 0.1) * self.backoff)
+
+
+class CircuitBreaker:
+    """
+    Размыкатель цепи для запросов к tgstat.
+
+    Хранит исходы последних window запросов. Если доля ошибок среди них
+    достигает error_rate (и запросов не меньше min_requests), цепь
+    размыкается: общий бюджет запросов приостанавливается на cooldown секунд,
+    чтобы не добивать перегруженный или блокирующий нас сервер, а окно
+    статистики начинается заново.
+    """
+
+    def __init__(
+        self,
+        bucket: TokenBucket,
+        error_rate: float = 0.5,
+        window: int = 20,
+        min_requests: int = 5,
+        cooldown: float = 60.0
+    ):
+        """
+        Args:
+            bucket: общий бюджет запросов, который приостанавливается при размыкании
+            error_rate: доля ошибок, при которой цепь размыкается
+            window: сколько последних запросов учитывается
+            min_requests: минимальное число запросов в окне для решения
+            cooldown: длительность паузы в секундах
+        """
+        self.bucket = bucket
+        self.error_rate = error_rate
+        self.min_requests = max(1, min_requests)
+        self.cooldown = cooldown
+        self.opens = 0
+        self._outcomes = collections.deque(maxlen=max(1, window))
+
+    def record(self, ok: bool):
+        """Учет исхода очередного запроса"""
+        self._outcomes.append(ok)
+        if len(self._outcomes) < self.min_requests:
+            return
+
+        errors = self._outcomes.count(False)
+        if errors / len(self._outcomes) >= self.error_rate:
+            self.opens += 1
+            self._outcomes.clear()
+            self.bucket.pause(self.cooldown)
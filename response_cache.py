@@ -0,0 +1,127 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CacheMiss(Exception):
+    """Ответа нет в кэше, а сетевые запросы запрещены (офлайн-режим)"""
+
+
+class ResponseCache:
+    """
+    Постоянный кэш сырых ответов поиска tgstat в SQLite.
+
+    Ключ - канонический ключ страницы (PayloadTemplate.page_key). Записи старше ttl
+    считаются устаревшими, общий размер кэша ограничен max_bytes: при
+    превышении удаляются записи, к которым дольше всего не обращались (LRU).
+    В офлайн-режиме кэш отдает записи любой давности.
+    """
+
+    def __init__(self, path: str, ttl: float = 6 * 3600, max_bytes: int = 500 * 1024 * 1024, offline: bool = False):
+        """
+        Args:
+            path: путь к файлу базы SQLite
+            ttl: время жизни записи в секундах
+            max_bytes: максимальный суммарный размер сохраненных ответов
+            offline: режим воспроизведения только из кэша
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " body TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._db.commit()
+
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Получение ответа из кэша
+
+        Args:
+            key: канонический ключ параметров запроса
+
+        Returns:
+            JSON-данные ответа или None, если записи нет или она устарела
+        """
+        row = self._db.execute("SELECT body, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+
+        if row is None or (not self.offline and now - row[1] > self.ttl):
+            self.misses += 1
+            return None
+
+        self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        self._db.commit()
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, data: Dict[str, Any]):
+        """
+        Сохранение ответа в кэш
+
+        Args:
+            key: канонический ключ параметров запроса
+            data: JSON-данные ответа
+        """
+        body = json.dumps(data, ensure_ascii=False)
+        size = len(body.encode('utf-8'))
+        now = time.time()
+
+        previous = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        if previous is not None:
+            self._total_bytes -= previous[0]
+
+        self._db.execute(
+            "INSERT OR REPLACE INTO responses (key, body, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, body, size, now, now)
+        )
+        self._total_bytes += size
+        self._evict()
+        self._db.commit()
+
+    def _evict(self):
+        """Удаление давно не использованных записей при превышении размера кэша"""
+        if self._total_bytes <= self.max_bytes:
+            return
+
+        evicted = 0
+        while self._total_bytes > self.max_bytes:
+            rows = self._db.execute("SELECT key, size FROM responses ORDER BY accessed_at LIMIT 100").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_bytes -= size
+                evicted += 1
+
+        logger.info(f"Из кэша ответов удалено записей: {evicted}")
+
+    def close(self):
+        """Закрытие базы кэша"""
+        self._db.close()
@@ -12,10 +12,20 @@ DEFAULT_CONFIG = {
     "api_id": 0,  # API ID (получите на my.telegram.org/apps)
     "api_hash": "",  # API Hash (получите на my.telegram.org/apps)
     "session_name": "tg_session",  # Имя файла сессии Telethon
+    "sessions": [],  # Дополнительные аккаунты: [{"session_name": ..., "api_id": ..., "api_hash": ...}]
     "check_comments": True,  # Проверять ли наличие открытых комментариев
     "skip_channels_without_comments": True,  # Пропускать ли каналы без комментариев
     "connection_retries": 5,  # Количество попыток подключения при ошибке
-    "request_delay": 1.5  # Задержка между запросами в секундах
+    "request_delay": 1.5,  # Задержка между запросами в секундах
+    "comments_cache_path": "cache/comments.sqlite",  # Файл кэша результатов проверки комментариев
+    "comments_cache_ttl": 604800,  # Время жизни успешной проверки в секундах (0 - не кэшировать)
+    "comments_negative_cache_ttl": 86400,  # Время жизни ошибки проверки в секундах (0 - не кэшировать)
+    "max_concurrent_checks": 4,  # Сколько каналов проверяется одновременно
+    "min_request_delay": 0.3,  # Минимальная задержка между запросами при ускорении
+    "max_request_delay": 30,  # Максимальная задержка между запросами после FloodWait
+    "flood_wait_retries": 3,  # Сколько раз повторять проверку канала после FloodWait
+    "entity_cache_path": "cache/entities.sqlite",  # Файл хранилища username -> (id, access_hash)
+    "entity_cache_ttl": 2592000  # Время жизни сохраненной сущности канала в секундах
 }
 
 
@@ -44,7 +54,7 @@ def load_telethon_config() -> dict:
         logger.info(f"Загружена конфигурация Telethon из файла {TELETHON_CONFIG_FILE}")
         
         # Проверяем наличие API ID и Hash
-        if not config.get('api_id') or not config.get('api_hash'):
+        if not any(session['api_id'] and session['api_hash'] for session in get_sessions(config)):
             logger.warning("API ID или API Hash для Telegram не указаны в конфигурации")
         
         return config
@@ -53,6 +63,41 @@ def load_telethon_config() -> dict:
         return DEFAULT_CONFIG
 
 
+def get_sessions(config: dict) -> list:
+    """
+    Список сессий Telethon для проверки комментариев
+    
+    Если в конфигурации задан список sessions, используется он (недостающие
+    api_id и api_hash берутся из основных настроек). Иначе используется одна
+    сессия из session_name, api_id и api_hash.
+    
+    Args:
+        config: Словарь с настройками
+        
+    Returns:
+        list: Список словарей с ключами session_name, api_id, api_hash
+    """
+    api_id = config.get('api_id', DEFAULT_CONFIG['api_id'])
+    api_hash = config.get('api_hash', DEFAULT_CONFIG['api_hash'])
+    
+    sessions = []
+    for i, session in enumerate(config.get('sessions') or []):
+        sessions.append({
+            'session_name': session.get('session_name', f"tg_session_{i + 1}"),
+            'api_id': session.get('api_id', api_id),
+            'api_hash': session.get('api_hash', api_hash),
+        })
+    
+    if not sessions:
+        sessions.append({
+            'session_name': config.get('session_name', DEFAULT_CONFIG['session_name']),
+            'api_id': api_id,
+            'api_hash': api_hash,
+        })
+    
+    return sessions
+
+
 def save_telethon_config(config: dict) -> bool:
     """
     Сохраняет конфигурацию Telethon в файл
@@ -74,14 +119,95 @@ def save_telethon_config(config: dict) -> bool:
         return False
 
 
-# Загружаем конфигурацию при импорте модуля
-telethon_config = load_telethon_config()
+class TelethonSettings:
+    """
+    Настройки проверки комментариев через Telethon
+
+    Значения, не указанные в конфигурации, берутся из DEFAULT_CONFIG.
+    """
+
+    def __init__(self, config: dict):
+        """
+        Args:
+            config: Словарь с настройками (содержимое telethon_settings.json)
+        """
+        def get(key):
+            return config.get(key, DEFAULT_CONFIG[key])
+
+        self.config = config
+        self.api_id = get('api_id')
+        self.api_hash = get('api_hash')
+        self.session_name = get('session_name')
+        self.sessions = get_sessions(config)
+        self.check_comments = get('check_comments')
+        self.skip_channels_without_comments = get('skip_channels_without_comments')
+        self.connection_retries = get('connection_retries')
+        self.request_delay = get('request_delay')
+        self.comments_cache_path = get('comments_cache_path')
+        self.comments_cache_ttl = get('comments_cache_ttl')
+        self.comments_negative_cache_ttl = get('comments_negative_cache_ttl')
+        self.max_concurrent_checks = get('max_concurrent_checks')
+        self.min_request_delay = get('min_request_delay')
+        self.max_request_delay = get('max_request_delay')
+        self.flood_wait_retries = get('flood_wait_retries')
+        self.entity_cache_path = get('entity_cache_path')
+        self.entity_cache_ttl = get('entity_cache_ttl')
+
+
+# Настройки текущего процесса (загружаются при первом обращении)
+_settings = None
+
+
+def get_settings() -> TelethonSettings:
+    """
+    Настройки Telethon текущего процесса
+
+    Файл telethon_settings.json читается (и при отсутствии создается) при первом
+    вызове, а не при импорте модуля.
+    """
+    global _settings
+    if _settings is None:
+        _settings = TelethonSettings(load_telethon_config())
+    return _settings
+
+
+def use_settings(config: dict) -> TelethonSettings:
+    """
+    Замена настроек текущего процесса без чтения файла (например, в бенчмарках)
+
+    Args:
+        config: Словарь с настройками (недостающие значения берутся из DEFAULT_CONFIG)
+    """
+    global _settings
+    _settings = TelethonSettings(config)
+    return _settings
+
+
+# Прежние константы модуля (API_ID, SESSIONS и т.д.) вычисляются при первом обращении
+_LEGACY_NAMES = {
+    'API_ID': 'api_id',
+    'API_HASH': 'api_hash',
+    'SESSION_NAME': 'session_name',
+    'SESSIONS': 'sessions',
+    'CHECK_COMMENTS': 'check_comments',
+    'SKIP_CHANNELS_WITHOUT_COMMENTS': 'skip_channels_without_comments',
+    'CONNECTION_RETRIES': 'connection_retries',
+    'REQUEST_DELAY': 'request_delay',
+    'COMMENTS_CACHE_PATH': 'comments_cache_path',
+    'COMMENTS_CACHE_TTL': 'comments_cache_ttl',
+    'COMMENTS_NEGATIVE_CACHE_TTL': 'comments_negative_cache_ttl',
+    'MAX_CONCURRENT_CHECKS': 'max_concurrent_checks',
+    'MIN_REQUEST_DELAY': 'min_request_delay',
+    'MAX_REQUEST_DELAY': 'max_request_delay',
+    'FLOOD_WAIT_RETRIES': 'flood_wait_retries',
+    'ENTITY_CACHE_PATH': 'entity_cache_path',
+    'ENTITY_CACHE_TTL': 'entity_cache_ttl',
+}
+
 
-# Экспортируем настройки для удобного импорта
-API_ID = telethon_config.get('api_id', DEFAULT_CONFIG['api_id'])
-API_HASH = telethon_config.get('api_hash', DEFAULT_CONFIG['api_hash'])
-SESSION_NAME = telethon_config.get('session_name', DEFAULT_CONFIG['session_name'])
-CHECK_COMMENTS = telethon_config.get('check_comments', DEFAULT_CONFIG['check_comments'])
-SKIP_CHANNELS_WITHOUT_COMMENTS = telethon_config.get('skip_channels_without_comments', DEFAULT_CONFIG['skip_channels_without_comments'])
-CONNECTION_RETRIES = telethon_config.get('connection_retries', DEFAULT_CONFIG['connection_retries'])
-REQUEST_DELAY = telethon_config.get('request_delay', DEFAULT_CONFIG['request_delay']) 
\ No newline at end of file
+def __getattr__(name: str):
+    if name in _LEGACY_NAMES:
+        return getattr(get_settings(), _LEGACY_NAMES[name])
+    if name == 'telethon_config':
+        return get_settings().config
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
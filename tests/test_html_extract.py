@@ -0,0 +1,118 @@
+import os
+
+import pytest
+
+import html_extract
+from html_extract import BACKENDS, CHANNEL_FIELDS, parse_search_payload
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Сохраненные страницы выдачи tgstat: обычная выдача и карточки с пропусками
+PAGES = ('search_page.html', 'edge_cases.html')
+
+FAST_BACKENDS = [
+    'stream',
+    pytest.param('lxml', marks=pytest.mark.skipif(html_extract.lxml is None, reason="lxml не установлен")),
+]
+
+
+def load_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def records_by_username(html: str, backend: str):
+    return {record['username']: record for record in BACKENDS[backend](html)}
+
+
+@pytest.mark.parametrize('page', PAGES)
+@pytest.mark.parametrize('backend', FAST_BACKENDS)
+def test_backend_matches_bs4(page, backend):
+    html = load_fixture(page)
+    expected = BACKENDS['bs4'](html)
+    actual = BACKENDS[backend](html)
+
+    assert [record['username'] for record in actual] == [record['username'] for record in expected]
+    for expected_record, actual_record in zip(expected, actual):
+        for field in CHANNEL_FIELDS:
+            assert actual_record[field] == expected_record[field], (expected_record['username'], field)
+
+
+@pytest.mark.parametrize('backend', ['bs4'] + FAST_BACKENDS)
+def test_search_page_values(backend):
+    records = records_by_username(load_fixture('search_page.html'), backend)
+
+    rian = records['@rian_ru']
+    assert rian['name'] == "РИА Новости"
+    assert rian['subscribers_count'] == 3_245_678
+    assert rian['avg_post_reach'] == "1.2m"
+    assert rian['avg_post_reach_value'] == 1_200_000
+    assert rian['citation_index_value'] == pytest.approx(2345.7)
+    assert rian['category'] == "Новости и СМИ"
+    assert rian['avatar_url'] == "https://static10.tgstat.ru/channels/_100/a5/a5c5b8d3d7a4b1f2.jpg"
+    assert rian['is_verified'] is True
+
+    crypto = records['@crypto_daily']
+    assert crypto['name'] == "Крипта & биржи daily"
+    assert crypto['avg_post_reach_value'] == 12_300
+    assert crypto['citation_index_value'] == pytest.approx(7.5)
+    assert crypto['is_verified'] is False
+
+    football = records['@footballnews']
+    assert football['name'] == "Футбол | Новости"
+    assert football['citation_index'] == "-"
+    assert football['citation_index_value'] is None
+
+
+@pytest.mark.parametrize('backend', ['bs4'] + FAST_BACKENDS)
+def test_edge_cases(backend):
+    records = records_by_username(load_fixture('edge_cases.html'), backend)
+
+    no_avatar = records['@no_avatar']
+    assert no_avatar['avatar_url'] is None
+    assert no_avatar['avg_post_reach_value'] == 1_500
+
+    no_reach = records['@no_reach']
+    assert no_reach['subscribers_count'] == 1_234_567
+    assert no_reach['avg_post_reach'] is None
+    assert no_reach['avg_post_reach_value'] is None
+    assert no_reach['citation_index'] is None
+    assert no_reach['category'] is None
+
+    empty_reach = records['@empty_reach']
+    assert empty_reach['avg_post_reach'] is None
+    assert empty_reach['citation_index_value'] == pytest.approx(2_100_000)
+
+    private = records['unknown']
+    assert private['name'] == "Приватный канал"
+    assert private['avatar_url'] is None
+
+
+@pytest.mark.parametrize('backend', ['bs4'] + FAST_BACKENDS)
+def test_no_results(backend):
+    parsed = parse_search_payload({'status': 'ok', 'hasMore': False, 'html': load_fixture('no_results.html')}, backend)
+    assert parsed['no_results']
+    assert parsed['channels'] == []
+    assert parsed['error_message'] == "No channel found for the specified parameters"
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("1,234", 1234),
+    ("1 234", 1234),
+    ("1\u00a0234", 1234),
+    ("1,234,567", 1_234_567),
+    ("7,5", 7.5),
+    ("12,34", 12.34),
+    ("12.3k", 12_300),
+    ("12,3k", 12_300),
+    ("1.2M", 1_200_000),
+    ("5 тыс", 5_000),
+    ("-", None),
+    ("", None),
+    (None, None),
+])
+def test_parse_metric(text, expected):
+    if expected is None:
+        assert html_extract.parse_metric(text) is None
+    else:
+        assert html_extract.parse_metric(text) == pytest.approx(expected)
@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+import parse
+from fake_tgstat import FakeTgstatServer
+from response_cache import ResponseCache
+from tgstat_client import TgstatClient
+
+
+def crawl(url: str, cache: ResponseCache, max_pages):
+    """Обход одного запроса через кэш ответов: юзернеймы найденных каналов"""
+    config = {
+        'start_offset': 0,
+        'offset_step': 30,
+        'max_pages': max_pages,
+        'concurrency': 2,
+        'delay_seconds': 0,
+        'retry_failed_pages': 1,
+        'retry_pass_delay': 5,
+    }
+
+    async def run():
+        found = []
+        async with TgstatClient(url=url, cache=cache, retries=0) as client:
+            async for _, channels in parse.search_queries(client, ['bench'], config):
+                found.extend(channel.username for channel in channels)
+        return found
+
+    return asyncio.run(run())
+
+
+def test_cache_miss_stops_query_without_retry_pass(tmp_path):
+    path = str(tmp_path / 'responses.sqlite')
+    with FakeTgstatServer(total=300, latency=0) as server:
+        cache = ResponseCache(path)
+        assert len(crawl(server.url, cache, max_pages=2)) == 60
+        cache.close()
+
+        cache = ResponseCache(path, offline=True)
+        started = time.monotonic()
+        found = crawl(server.url, cache, max_pages=None)
+        elapsed = time.monotonic() - started
+        cache.close()
+
+    # Третьей страницы нет в кэше: обход заканчивается на ней без повторного прохода и его паузы
+    assert len(found) == 60
+    assert server.requests == 2
+    assert elapsed < 5
@@ -0,0 +1,56 @@
+import asyncio
+
+import parse
+from fake_tgstat import FakeTgstatServer
+from partition_planner import PartitionPlanner
+from tgstat_client import TgstatClient
+
+
+def crawl(server: FakeTgstatServer, planner: PartitionPlanner, max_pages: int):
+    """Обход одного запроса по интервалам подписчиков: юзернеймы найденных каналов"""
+    config = {
+        'start_offset': 0,
+        'offset_step': 30,
+        'max_pages': max_pages,
+        'concurrency': 2,
+        'delay_seconds': 0,
+        'retry_pass_delay': 0,
+    }
+
+    async def run():
+        found = set()
+        async with TgstatClient(url=server.url, retries=0) as client:
+            async for _, channels in parse.search_queries(client, ['bench'], config, planner=planner):
+                found.update(channel.username for channel in channels)
+        return found
+
+    return asyncio.run(run())
+
+
+def test_is_saturated():
+    planner = PartitionPlanner(':memory:', max_results=1000)
+    assert not planner.is_saturated(150)
+    assert planner.is_saturated(150, truncated=True)
+    assert planner.is_saturated(1000)
+    planner.close()
+
+
+def test_split_when_crawl_stops_at_max_pages(tmp_path):
+    planner = PartitionPlanner(str(tmp_path / 'partitions.sqlite'), max_results=1000)
+    with FakeTgstatServer(total=3000, latency=0) as server:
+        found = crawl(server, planner, max_pages=5)
+
+    # Без деления обход остановился бы на 5 страницах по 30 каналов
+    assert planner.splits > 0
+    assert len(found) == 3000
+    planner.close()
+
+
+def test_no_split_when_results_end_before_max_pages(tmp_path):
+    planner = PartitionPlanner(str(tmp_path / 'partitions.sqlite'), max_results=1000)
+    with FakeTgstatServer(total=100, latency=0) as server:
+        found = crawl(server, planner, max_pages=5)
+
+    assert planner.splits == 0
+    assert len(found) == 100
+    planner.close()
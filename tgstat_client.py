@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+from metrics import METRICS
+from rate_limit import CircuitBreaker, TokenBucket
+from response_cache import CacheMiss, ResponseCache
+
+logger = logging.getLogger(__name__)
+
+
+SEARCH_URL = "https://tgstat.com/channels/search"
+
+SEARCH_HEADERS = {
+    'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
+    'Accept': '*/*',
+    'Sec-Fetch-Site': 'same-origin',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Sec-Fetch-Mode': 'cors',
+    'Origin': 'https://tgstat.com',
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/18.3.1 Safari/605.1.15',
+    'Referer': 'https://tgstat.com/channels/search',
+    'X-Requested-With': 'XMLHttpRequest',
+}
+
+# Статусы, при которых запрос имеет смысл повторить
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Разбор заголовка Retry-After
+
+    Returns:
+        Задержка в секундах или None, если заголовка нет или он не распознан
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class TgstatClient:
+    """
+    Асинхронный HTTP-клиент для tgstat с общим пулом соединений.
+
+    Одна сессия aiohttp переиспользуется для всех запросов поиска, поэтому
+    соединения (и TLS-рукопожатия) не создаются заново на каждую страницу.
+
+    Каждый запрос ограничен таймаутами на подключение и чтение, а также общим
+    таймаутом: sock_read отсчитывается заново после каждой порции данных, и без
+    общего ограничения медленно отдающий сервер держал бы соединение пула. Сетевые
+    ошибки, таймауты и ответы 429/5xx повторяются до retries раз с
+    экспоненциальной задержкой со случайным разбросом (не меньше Retry-After).
+    Повторы берут токены из общего бюджета rate_limiter, а исходы всех
+    попыток учитываются размыкателем breaker.
+
+    Используется как асинхронный контекстный менеджер:
+
+        async with TgstatClient(pool_size=10) as client:
+            data = await client.search(payload)
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 10,
+        pool_per_host: int = 0,
+        url: str = None,
+        cache: Optional[ResponseCache] = None,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 30.0,
+        total_timeout: Optional[float] = None,
+        retries: int = 3,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        rate_limiter: Optional[TokenBucket] = None,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        """
+        Args:
+            pool_size: максимальное количество открытых соединений в пуле
+            pool_per_host: ограничение соединений на один хост (0 - без ограничения)
+            url: адрес эндпоинта поиска (по умолчанию SEARCH_URL)
+            cache: постоянный кэш ответов (None - без кэширования)
+            connect_timeout: таймаут подключения в секундах
+            read_timeout: таймаут чтения ответа в секундах (между порциями данных)
+            total_timeout: общий таймаут запроса в секундах (None - connect_timeout + read_timeout)
+            retries: количество повторов неудачного запроса
+            backoff_base: задержка перед первым повтором в секундах (дальше удваивается)
+            backoff_max: максимальная задержка перед повтором
+            rate_limiter: общий бюджет запросов, из которого берутся токены для повторов
+            breaker: размыкатель цепи, учитывающий исходы запросов
+        """
+        self.pool_size = pool_size
+        self.pool_per_host = pool_per_host
+        self.url = url or SEARCH_URL
+        self.cache = cache
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout if total_timeout else connect_timeout + read_timeout
+        self.retries = max(0, retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = rate_limiter
+        self.breaker = breaker
+        self.retried = 0
+        self._session = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        """Создание сессии и пула соединений"""
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.pool_per_host)
+            timeout = aiohttp.ClientTimeout(
+                total=self.total_timeout, sock_connect=self.connect_timeout, sock_read=self.read_timeout
+            )
+            self._session = aiohttp.ClientSession(connector=connector, headers=SEARCH_HEADERS, timeout=timeout)
+
+    async def close(self):
+        """Закрытие сессии и всех соединений пула"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        """Задержка перед повтором: экспонента с разбросом от половины до полного значения"""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    async def _post(self, payload: str) -> Dict[str, Any]:
+        """Одна попытка запроса"""
+        with METRICS.time('fetch'):
+            async with self._session.post(self.url, data=payload.encode('utf-8')) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
+
+    async def search(self, payload: str, cache_key: Optional[str] = None, priority: int = 0) -> Dict[str, Any]:
+        """
+        Выполнение запроса поиска
+
+        Args:
+            payload: тело запроса (PayloadTemplate.body)
+            cache_key: канонический ключ параметров для кэша ответов
+            priority: приоритет повторов в общем бюджете запросов
+
+        Returns:
+            JSON-данные ответа
+
+        Raises:
+            aiohttp.ClientError: при сетевой ошибке или неуспешном статусе ответа (после всех повторов)
+            asyncio.TimeoutError: если ответ не получен за отведенное время (после всех повторов)
+            CacheMiss: в офлайн-режиме, если ответа нет в кэше
+        """
+        use_cache = self.cache is not None and cache_key is not None
+        if use_cache:
+            data = self.cache.get(cache_key)
+            METRICS.inc('tgstat_cache_requests_total', cache='responses', result='miss' if data is None else 'hit')
+            if data is not None:
+                return data
+            if self.cache.offline:
+                raise CacheMiss(cache_key)
+
+        if self._session is None:
+            await self.open()
+
+        attempt = 0
+        while True:
+            try:
+                data = await self._post(payload)
+                if self.breaker is not None:
+                    self.breaker.record(True)
+                break
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                if self.breaker is not None:
+                    self.breaker.record(False)
+
+                # Ошибки клиента (кроме 429) повторять бессмысленно
+                retry_after = None
+                reason = type(e).__name__
+                if isinstance(e, aiohttp.ClientResponseError):
+                    if e.status not in RETRY_STATUSES:
+                        raise
+                    retry_after = parse_retry_after((e.headers or {}).get('Retry-After'))
+                    reason = f"статус {e.status}"
+                if attempt >= self.retries:
+                    raise
+
+                delay = self._backoff(attempt, retry_after)
+                attempt += 1
+                self.retried += 1
+                METRICS.inc('tgstat_http_retries_total')
+                logger.warning(f"Ошибка запроса к tgstat ({reason}), повтор {attempt}/{self.retries} через {delay:.1f} с")
+                await asyncio.sleep(delay)
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.acquire(priority)
+
+        if use_cache:
+            self.cache.put(cache_key, data)
+        return data